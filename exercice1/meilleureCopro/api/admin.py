@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import RealEstateListing
+from .models import AreaSketch, AreaStatistics, ImportJob, MonthlyStatistics, RealEstateListing
 
 @admin.register(RealEstateListing)
 class RealEstateListingAdmin(admin.ModelAdmin):
@@ -11,4 +11,37 @@ class RealEstateListingAdmin(admin.ModelAdmin):
     )
     search_fields = ('reference_id', 'city', 'dept_code', 'property_type')
     list_filter = ('property_type', 'dept_code', 'city')
-    ordering = ('-id',)
\ No newline at end of file
+    ordering = ('-id',)
+
+
+@admin.register(AreaStatistics)
+class AreaStatisticsAdmin(admin.ModelAdmin):
+    list_display = (
+        'query_type', 'query_value', 'count', 'mean_price', 'mean_fees',
+        'mean_fees_per_sqm', 'updated_at'
+    )
+    search_fields = ('query_value',)
+    list_filter = ('query_type',)
+    ordering = ('query_type', 'query_value')
+
+
+@admin.register(MonthlyStatistics)
+class MonthlyStatisticsAdmin(admin.ModelAdmin):
+    list_display = ('query_type', 'query_value', 'month', 'count', 'mean_price', 'mean_fees_per_sqm', 'updated_at')
+    search_fields = ('query_value',)
+    list_filter = ('query_type',)
+    ordering = ('query_type', 'query_value', 'month')
+
+
+@admin.register(AreaSketch)
+class AreaSketchAdmin(admin.ModelAdmin):
+    list_display = ('dept_code', 'postal_code', 'city', 'count', 'updated_at')
+    search_fields = ('dept_code', 'postal_code', 'city')
+    ordering = ('dept_code', 'postal_code', 'city')
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'rows_done', 'rows_total', 'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    ordering = ('-id',)
@@ -0,0 +1,308 @@
+import logging
+
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, F, Window
+from django.db.models.functions import RowNumber
+
+from .areas import filter_areas, filter_listings, normalize_area_value
+from .cache import invalidate_statistics
+from .filters import filter_attributes, group_keys, group_order
+from .metrics import span
+from .models import AreaStatistics, RealEstateListing
+from .sketches import sketch_area_statistics
+from .snapshot import INDEXED_AREAS, SNAPSHOT_COLUMNS, get_snapshot, record_write, write_snapshot
+from .spatial import SPATIAL_QUERY_TYPES
+from .statistics import (
+    METRICS, QUANTILES, STATISTIC_COLUMNS, STATISTIC_FIELDS, compute_histogram, compute_statistics, interpolate,
+    quantile_neighbours, statistics_from_rows, to_float_array,
+)
+
+logger = logging.getLogger(__name__)
+
+AREA_COLUMNS = {
+    'department': 'dept_code',
+    'postal_code': 'postal_code',
+    'city': 'city_key',
+}
+
+
+def compute_area_statistics(query_type, query_value):
+    """Compute (count, statistics) of an area from its listings, count being 0 when it has none."""
+    with span('fetch'):
+        rows = list(
+            filter_listings(query_type, query_value)
+            .order_by('id')
+            .values_list(*STATISTIC_COLUMNS)
+        )
+    if not rows:
+        return 0, None
+    return len(rows), statistics_from_rows(rows)
+
+
+def sql_area_statistics(query_type, query_value):
+    """
+    Compute (count, statistics) of an area inside the database: one query for
+    the counts and means, then one query per metric fetching only the sorted
+    values the quantiles interpolate (ROW_NUMBER window). The quantiles are
+    exact and follow ``np.quantile``; means may differ from the NumPy backend
+    by floating point rounding.
+    """
+    listings = filter_listings(query_type, query_value)
+    aggregates = listings.aggregate(
+        count=Count('id'),
+        **{f'count_{metric}': Count(column) for metric, column in zip(METRICS, STATISTIC_COLUMNS)},
+        **{f'mean_{metric}': Avg(column) for metric, column in zip(METRICS, STATISTIC_COLUMNS)},
+    )
+    if not aggregates['count']:
+        return 0, None
+
+    stats = {}
+    for metric, column in zip(METRICS, STATISTIC_COLUMNS):
+        count = aggregates[f'count_{metric}']
+        stats[f'mean_{metric}'] = float(aggregates[f'mean_{metric}']) if count else 0.0
+        low, high = _sql_quantiles(listings, column, count)
+        stats[f'quantile_10_{metric}'] = low
+        stats[f'quantile_90_{metric}'] = high
+    return aggregates['count'], {field: stats[field] for field in STATISTIC_FIELDS}
+
+
+def _sql_quantiles(listings, column, count):
+    """QUANTILES of the non-missing values of a column, 0.0 when there are none."""
+    if not count:
+        return tuple(0.0 for _ in QUANTILES)
+    neighbours = [quantile_neighbours(count, quantile) for quantile in QUANTILES]
+    ranks = {rank + 1 for lower, upper, _ in neighbours for rank in (lower, upper)}
+    values = dict(
+        listings.filter(**{f'{column}__isnull': False})
+        .annotate(rank=Window(RowNumber(), order_by=F(column).asc()))
+        .filter(rank__in=ranks)
+        .values_list('rank', column)
+    )
+    return tuple(
+        interpolate(float(values[lower + 1]), float(values[upper + 1]), weight)
+        for lower, upper, weight in neighbours
+    )
+
+
+def snapshot_area_statistics(query_type, query_value):
+    """
+    Compute (count, statistics) of an area from the memory-mapped snapshot of
+    STATISTICS_SNAPSHOT_DIR, falling back to the NumPy backend for cities,
+    when there is no current snapshot or when the area is missing from it.
+    """
+    snapshot = current_snapshot(query_type, query_value)
+    if snapshot is None:
+        return compute_area_statistics(query_type, query_value)
+    return snapshot.area_statistics(query_type, query_value)
+
+
+def current_snapshot(query_type, query_value):
+    """
+    Snapshot of STATISTICS_SNAPSHOT_DIR when it was exported after the last
+    listing write and holds listings of the area, None otherwise: listings
+    written since its export (BienIci and incremental imports) and areas
+    created since are only in the database.
+    """
+    if query_type not in INDEXED_AREAS or not settings.STATISTICS_SNAPSHOT_DIR:
+        return None
+    snapshot = get_snapshot(settings.STATISTICS_SNAPSHOT_DIR)
+    if snapshot is None or not snapshot.is_current() or not snapshot.has_listings(query_type, query_value):
+        return None
+    return snapshot
+
+
+def record_listing_write():
+    """
+    Mark the snapshot of STATISTICS_SNAPSHOT_DIR stale once the current
+    transaction commits, so that no export can have missed the write.
+    """
+    if settings.STATISTICS_SNAPSHOT_DIR:
+        transaction.on_commit(lambda: record_write(settings.STATISTICS_SNAPSHOT_DIR))
+
+
+def area_histogram(query_type, query_value, metric, bins):
+    """
+    Compute (count, histogram) of a metric over the listings of an area in one
+    pass, reading the snapshot when it is current and holds the area. Count
+    is 0 when the area has no listing.
+    """
+    column = dict(zip(METRICS, STATISTIC_COLUMNS))[metric]
+    snapshot = current_snapshot(query_type, query_value)
+    if snapshot is not None:
+        values = np.asarray(snapshot.area_columns(query_type, query_value, (column,))[0], dtype=float)
+    else:
+        with span('fetch'):
+            values = to_float_array(filter_listings(query_type, query_value).values_list(column, flat=True))
+    if not len(values):
+        return 0, None
+    with span('histogram', metric=metric):
+        return len(values), compute_histogram(values, bins)
+
+
+def export_snapshot(directory):
+    """Write the statistic columns of every listing as a new snapshot in ``directory``, returns the row count."""
+    return write_snapshot(directory, RealEstateListing.objects.order_by('id').values_list(*SNAPSHOT_COLUMNS))
+
+
+# Backends computing (count, statistics) of an area, selected with STATISTICS_BACKEND
+STATISTICS_BACKENDS = {
+    'numpy': compute_area_statistics,
+    'sql': sql_area_statistics,
+    'sketch': sketch_area_statistics,
+    'snapshot': snapshot_area_statistics,
+}
+# Backends only indexing departments, postal codes and cities
+AREA_ONLY_BACKENDS = {'sketch'}
+
+
+def area_statistics(query_type, query_value, backend=None):
+    """Compute (count, statistics) of an area with the given backend, STATISTICS_BACKEND by default."""
+    backend = backend or settings.STATISTICS_BACKEND
+    if backend not in STATISTICS_BACKENDS:
+        raise ValueError(f"Unknown statistics backend: {backend}")
+    if query_type in SPATIAL_QUERY_TYPES and backend in AREA_ONLY_BACKENDS:
+        backend = 'numpy'
+    return STATISTICS_BACKENDS[backend](query_type, query_value)
+
+
+def grouped_statistics(query_type, keys, prices, surfaces, fees, fees_per_sqm):
+    """
+    Compute the statistics of every group of listings sharing the same
+    normalized area key. Rows keep their relative order within a group so that
+    the results are identical to a per-area computation.
+    Yields (query_value, count, statistics).
+    """
+    keys = [normalize_area_value(query_type, key) or '' for key in keys]
+    yield from group_statistics(keys, prices, surfaces, fees, fees_per_sqm)
+
+
+def group_statistics(keys, prices, surfaces, fees, fees_per_sqm):
+    """
+    Compute the statistics of every group of rows sharing the same key, rows
+    with an empty key being left out. Yields (key, count, statistics) in key
+    order.
+    """
+    keys = np.array(keys, dtype=object)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    boundaries = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+    starts = np.concatenate(([0], boundaries)) if len(keys) else np.array([], dtype=int)
+    ends = np.concatenate((boundaries, [len(keys)])) if len(keys) else np.array([], dtype=int)
+
+    for start, end in zip(starts, ends):
+        key = sorted_keys[start]
+        if not key:
+            continue
+        idx = order[start:end]
+        yield key, len(idx), compute_statistics(prices[idx], surfaces[idx], fees[idx], fees_per_sqm[idx])
+
+
+def filtered_statistics(query_type, query_value, filters, group_by=None):
+    """
+    Compute the statistics of the listings of an area matching the attribute
+    filters in one query, and of each of their groups when ``group_by`` is
+    given. Returns (count, statistics, groups), groups being a list of
+    (group, count, statistics).
+    """
+    listings = filter_attributes(filter_listings(query_type, query_value), filters)
+    columns = (group_by,) if group_by else ()
+    with span('fetch'):
+        rows = list(listings.order_by('id').values_list(*columns, *STATISTIC_COLUMNS))
+    if not rows:
+        return 0, None, []
+
+    with span('arrays'):
+        values = list(zip(*rows))
+        prices, surfaces, fees, fees_per_sqm = (to_float_array(column) for column in values[len(columns):])
+    stats = compute_statistics(prices, surfaces, fees, fees_per_sqm, timed=True)
+    groups = []
+    if group_by:
+        with span('group'):
+            groups = sorted(
+                group_statistics(group_keys(group_by, values[0]), prices, surfaces, fees, fees_per_sqm),
+                key=lambda group: group_order(group_by, group[0]),
+            )
+    return len(rows), stats, groups
+
+
+def load_statistics_columns(queryset=None):
+    """Fetch the area keys and statistic columns of the listings as NumPy arrays."""
+    if queryset is None:
+        queryset = RealEstateListing.objects.all()
+    rows = list(queryset.order_by('id').values_list('dept_code', 'postal_code', 'city_key', *STATISTIC_COLUMNS))
+    dept_codes, postal_codes, cities, prices, surfaces, fees, fees_per_sqm = zip(*rows) if rows else ((),) * 7
+    return {
+        'department': dept_codes,
+        'postal_code': postal_codes,
+        'city': cities,
+        'price': to_float_array(prices),
+        'surface': to_float_array(surfaces),
+        'fees': to_float_array(fees),
+        'fees_per_sqm': to_float_array(fees_per_sqm),
+    }
+
+
+def batch_area_statistics(areas):
+    """
+    Compute (count, statistics) of many normalized areas with a single scan of
+    their listings, grouped in NumPy. Returns a dict keyed by area, areas
+    without listings being left out.
+    """
+    areas = set(areas)
+    if not areas:
+        return {}
+    columns = load_statistics_columns(filter_areas(areas))
+    results = {}
+    for query_type in {query_type for query_type, _ in areas}:
+        for query_value, count, stats in grouped_statistics(
+            query_type, columns[query_type], columns['price'], columns['surface'],
+            columns['fees'], columns['fees_per_sqm']
+        ):
+            if (query_type, query_value) in areas:
+                results[(query_type, query_value)] = (count, stats)
+    return results
+
+
+def rebuild_area_statistics():
+    """Recompute the statistics of every department, postal code and city from scratch."""
+    columns = load_statistics_columns()
+    area_statistics = []
+    for query_type in AREA_COLUMNS:
+        for query_value, count, stats in grouped_statistics(
+            query_type, columns[query_type], columns['price'], columns['surface'],
+            columns['fees'], columns['fees_per_sqm']
+        ):
+            area_statistics.append(
+                AreaStatistics(query_type=query_type, query_value=query_value, count=count, **stats)
+            )
+
+    with transaction.atomic():
+        AreaStatistics.objects.all().delete()
+        AreaStatistics.objects.bulk_create(area_statistics, batch_size=5000)
+        record_listing_write()
+
+    logger.info(f"Rebuilt statistics of {len(area_statistics)} areas")
+    return len(area_statistics)
+
+
+def refresh_area_statistics(areas):
+    """
+    Recompute the statistics of the given normalized (query_type, query_value)
+    areas and evict them from the statistics cache.
+    """
+    for query_type, query_value in areas:
+        count, stats = compute_area_statistics(query_type, query_value)
+        if not count:
+            AreaStatistics.objects.filter(query_type=query_type, query_value=query_value).delete()
+            continue
+        AreaStatistics.objects.update_or_create(
+            query_type=query_type,
+            query_value=query_value,
+            defaults={'count': count, **stats},
+        )
+    if areas:
+        record_listing_write()
+    invalidate_statistics(areas)
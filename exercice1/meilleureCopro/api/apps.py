@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def ensure_spatial_index(using, **kwargs):
+    """Recreate the listing R*Tree triggers when a migration rebuilt the listing table, which drops them."""
+    from django.db import connections
+    from .spatial import RTREE_TABLE, create_spatial_index
+
+    connection = connections[using]
+    if RTREE_TABLE in connection.introspection.table_names():
+        create_spatial_index(connection)
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        post_migrate.connect(ensure_spatial_index, sender=self)
@@ -0,0 +1,72 @@
+from django.db.models import Q
+
+from .models import RealEstateListing
+from .spatial import SPATIAL_QUERY_TYPES, filter_spatial, normalize_spatial_value
+from .utils import city_key
+
+
+def normalize_area_value(query_type, value):
+    """
+    Canonical form of a department, city or postal code, as stored in the
+    precomputed tables, or of a radius or bounding box. Returns None when the
+    value cannot match any listing.
+    """
+    if value is None:
+        return None
+    if query_type == 'city':
+        return city_key(value) or None
+    if query_type in SPATIAL_QUERY_TYPES:
+        return normalize_spatial_value(query_type, value)
+    try:
+        return str(int(value))
+    except (ValueError, TypeError):
+        return None
+
+
+def filter_listings(query_type, value, queryset=None):
+    """Listings of the given area, using the raw (non normalized) query value."""
+    if queryset is None:
+        queryset = RealEstateListing.objects.all()
+
+    normalized = normalize_area_value(query_type, value)
+    if normalized is None:
+        return queryset.none()
+
+    if query_type == 'department':
+        return queryset.filter(dept_code=normalized)
+    elif query_type == 'city':
+        return queryset.filter(city_key=normalized)
+    elif query_type == 'postal_code':
+        return queryset.filter(postal_code=normalized)
+    elif query_type in SPATIAL_QUERY_TYPES:
+        return filter_spatial(query_type, normalized, queryset)
+    raise ValueError(f"Unknown query type: {query_type}")
+
+
+def filter_areas(areas, queryset=None):
+    """Listings belonging to any of the given normalized (query_type, query_value) areas."""
+    if queryset is None:
+        queryset = RealEstateListing.objects.all()
+
+    values = {}
+    for query_type, query_value in areas:
+        values.setdefault(query_type, set()).add(query_value)
+
+    condition = Q(pk__in=[])
+    if 'department' in values:
+        condition |= Q(dept_code__in=[int(value) for value in values['department']])
+    if 'postal_code' in values:
+        condition |= Q(postal_code__in=[int(value) for value in values['postal_code']])
+    if 'city' in values:
+        condition |= Q(city_key__in=values['city'])
+    return queryset.filter(condition)
+
+
+def listing_areas(dept_code, postal_code, city):
+    """Normalized (query_type, query_value) pairs of every area a listing belongs to."""
+    areas = set()
+    for query_type, value in (('department', dept_code), ('postal_code', postal_code), ('city', city)):
+        normalized = normalize_area_value(query_type, value)
+        if normalized is not None:
+            areas.add((query_type, normalized))
+    return areas
@@ -0,0 +1,175 @@
+"""
+Asynchronous BienIci ingestion.
+
+Listings are fetched from the BienIci ``realEstateAd.json`` endpoint with a
+pooled keep-alive HTTP client, a bounded number of concurrent requests, a
+timeout per request and retries with exponential backoff, then upserted in
+bulk.
+"""
+import asyncio
+import logging
+
+import httpx
+
+from django.conf import settings
+from django.db import transaction
+
+from .ingestion import content_hash
+from .surface import derived_surface_columns, parse_surface
+from .upsert import refresh_upserted_areas, upsert_listing_rows
+from .utils import city_key, parse_publication_date
+
+logger = logging.getLogger(__name__)
+
+PROPERTY_TYPES = {
+    'APARTMENT': 'APARTMENT',
+}
+
+# Responses worth retrying, other errors are returned at once
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class BienIciError(Exception):
+    """A listing could not be fetched from BienIci."""
+
+
+def listing_id(url):
+    """BienIci listing id of a listing URL."""
+    return url.rstrip('/').split('/')[-1]
+
+
+def map_property_type(bienici_type):
+    """Map BienIci property type to our model choices."""
+    return PROPERTY_TYPES.get(bienici_type, 'OTHER')
+
+
+async def _fetch(client, semaphore, url, retries, backoff):
+    for attempt in range(retries + 1):
+        try:
+            async with semaphore:
+                response = await client.get(settings.BIENICI_API_URL, params={'id': listing_id(url)})
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                response.raise_for_status()
+                return response.json()
+            error = f"HTTP {response.status_code}"
+        except httpx.HTTPStatusError as e:
+            raise BienIciError(f"HTTP {e.response.status_code} for {url}") from e
+        except ValueError as e:
+            raise BienIciError(f"Invalid JSON for {url}") from e
+        except httpx.TransportError as e:
+            if attempt == retries:
+                raise BienIciError(f"{e.__class__.__name__} for {url}: {e}") from e
+            error = e.__class__.__name__
+        delay = backoff * 2 ** attempt
+        logger.warning(f"Fetching {url} failed ({error}), retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+async def fetch_listings_async(urls, concurrency=None, timeout=None, retries=None, backoff=None):
+    """
+    Fetch the BienIci data of the listing URLs concurrently. Returns a list of
+    (url, data, error) in the order of ``urls``, error being None on success.
+    """
+    concurrency = concurrency or settings.BIENICI_CONCURRENCY
+    retries = settings.BIENICI_RETRIES if retries is None else retries
+    backoff = settings.BIENICI_BACKOFF if backoff is None else backoff
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(
+        limits=limits, timeout=timeout or settings.BIENICI_TIMEOUT, follow_redirects=True
+    ) as client:
+        results = await asyncio.gather(
+            *(_fetch(client, semaphore, url, retries, backoff) for url in urls), return_exceptions=True
+        )
+
+    fetched = []
+    for url, result in zip(urls, results):
+        if isinstance(result, BienIciError):
+            fetched.append((url, None, str(result)))
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            fetched.append((url, result, None))
+    return fetched
+
+
+def fetch_listings(urls, **options):
+    """Synchronous wrapper of fetch_listings_async, for views and commands."""
+    return asyncio.run(fetch_listings_async(urls, **options))
+
+
+def fetch_listing(url):
+    """Fetch the BienIci data of a single listing URL, raising BienIciError on failure."""
+    (_, data, error), = fetch_listings([url])
+    if error:
+        raise BienIciError(error)
+    return data
+
+
+def listing_row(data, url):
+    """RealEstateListing keyword arguments of a BienIci listing, content hash and derived columns included."""
+    try:
+        postal_code = int(data.get('postalCode', ''))
+        dept_code = postal_code // 1000
+    except (ValueError, TypeError):
+        postal_code = dept_code = None
+
+    coordinates = data.get('coordinates') or {}
+    row = {
+        'reference_id': data.get('reference', ''),
+        'ad_url': url,
+        'postal_code': postal_code,
+        'dept_code': dept_code,
+        'city': data.get('city', ''),
+        'price': data.get('price', 0),
+        'surface': parse_surface(data.get('surfaceArea')),
+        'condominium_expenses': (data.get('fees') or {}).get('yearly', 0),
+        'description': data.get('description', ''),
+        'floor': data.get('floor', None),
+        'construction_year': data.get('constructionYear', None),
+        'property_type': map_property_type(data.get('propertyType', '')),
+        'latitude': coordinates.get('lat', None),
+        'longitude': coordinates.get('lng', None),
+        'publication_start_date': data.get('publicationDate', None),
+    }
+    row['content_hash'] = content_hash(row)
+
+    (row['primary_surface'],), (row['fees_per_sqm'],) = derived_surface_columns(
+        [row['surface']], [row['condominium_expenses']]
+    )
+    row['city_key'] = city_key(row['city'])
+    row['publication_date'] = parse_publication_date(row['publication_start_date'])
+    return row
+
+
+def import_bienici_listings(urls, **options):
+    """
+    Fetch the BienIci listings of the URLs and upsert them in bulk, refreshing
+    the statistics and sketches of the areas they changed.
+    Returns a summary dict: created, updated and unchanged counts, and errors
+    as a list of {'url', 'error'}.
+    """
+    rows, errors = {}, []
+    for url, data, error in fetch_listings(urls, **options):
+        if error is None and not data.get('reference'):
+            error = f"No reference in the BienIci data of {url}"
+        if error:
+            errors.append({'url': url, 'error': error})
+            continue
+        row = listing_row(data, url)
+        # The same listing given twice is imported once
+        rows[row['reference_id']] = row
+    rows = list(rows.values())
+
+    with transaction.atomic():
+        result = upsert_listing_rows(rows)
+    refresh_upserted_areas(result.changed_cells, result.areas, result.area_months)
+
+    logger.info(f"Imported {len(rows)} BienIci listings, {len(errors)} errors")
+    return {
+        'created': result.created,
+        'updated': result.updated,
+        'unchanged': result.unchanged,
+        'errors': errors,
+    }
@@ -0,0 +1,73 @@
+from urllib.parse import quote
+
+from django.core.cache import caches
+
+STATISTICS_CACHE = 'statistics'
+
+# Histograms kept per area, for the most recent metric and bins combinations
+MAX_CACHED_HISTOGRAMS = 16
+
+
+def statistics_cache_key(query_type, query_value):
+    """Cache key of a normalized (query_type, query_value) area."""
+    return f"stats:{query_type}:{quote(query_value)}"
+
+
+def get_cached_statistics(query_type, query_value):
+    """Return the cached (count, statistics) of a normalized area, or None."""
+    return caches[STATISTICS_CACHE].get(statistics_cache_key(query_type, query_value))
+
+
+def get_many_cached_statistics(areas):
+    """Return the cached (count, statistics) of the normalized areas found in the cache, keyed by area."""
+    keys = {statistics_cache_key(query_type, query_value): (query_type, query_value) for query_type, query_value in areas}
+    return {keys[key]: value for key, value in caches[STATISTICS_CACHE].get_many(keys).items()}
+
+
+def cache_statistics(query_type, query_value, count, stats):
+    caches[STATISTICS_CACHE].set(statistics_cache_key(query_type, query_value), (count, stats))
+
+
+def cache_many_statistics(statistics):
+    """Cache {(query_type, query_value): (count, statistics)} of normalized areas."""
+    caches[STATISTICS_CACHE].set_many({
+        statistics_cache_key(query_type, query_value): value
+        for (query_type, query_value), value in statistics.items()
+    })
+
+
+def histogram_cache_key(query_type, query_value):
+    """Cache key of the histograms of a normalized (query_type, query_value) area."""
+    return f"hist:{query_type}:{quote(query_value)}"
+
+
+def get_cached_histogram(query_type, query_value, params):
+    """Return the cached (count, histogram) of a normalized area for the given params, or None."""
+    histograms = caches[STATISTICS_CACHE].get(histogram_cache_key(query_type, query_value)) or {}
+    return histograms.get(params)
+
+
+def cache_histogram(query_type, query_value, params, count, histogram):
+    """
+    Cache the (count, histogram) of a normalized area for hashable params.
+    Every histogram of an area shares one cache entry, evicted with its
+    statistics.
+    """
+    key = histogram_cache_key(query_type, query_value)
+    histograms = caches[STATISTICS_CACHE].get(key) or {}
+    histograms.pop(params, None)
+    histograms[params] = (count, histogram)
+    while len(histograms) > MAX_CACHED_HISTOGRAMS:
+        del histograms[next(iter(histograms))]
+    caches[STATISTICS_CACHE].set(key, histograms)
+
+
+def invalidate_statistics(areas):
+    """Evict the cached statistics and histograms of the given normalized (query_type, query_value) areas."""
+    keys = [
+        key
+        for query_type, query_value in areas
+        for key in (statistics_cache_key(query_type, query_value), histogram_cache_key(query_type, query_value))
+    ]
+    if keys:
+        caches[STATISTICS_CACHE].delete_many(keys)
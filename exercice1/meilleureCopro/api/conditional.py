@@ -0,0 +1,37 @@
+"""
+HTTP validators of the statistics responses.
+
+The data version of a department, postal code or city is the ``updated_at``
+of its AreaStatistics row: the write paths (import_listings and the BienIci
+imports, both through api.upsert) refresh the statistics of the areas whose
+listings changed, saving their rows again. Statistics served from a current
+snapshot are versioned by the snapshot itself, no write having happened
+since its export. A strong ETag hashes this version with everything else
+shaping the response, so that a conditional request is answered by a 304
+after at most one indexed lookup, before any statistics are read or
+computed.
+"""
+import hashlib
+import os
+
+# Bumped when the representation of the statistics changes, changing every ETag
+RESPONSE_VERSION = 1
+
+
+def area_validators(area):
+    """(version, last modification timestamp) of the statistics of the AreaStatistics ``area``."""
+    return (area.query_type, area.query_value, area.updated_at.isoformat()), area.updated_at.timestamp()
+
+
+def snapshot_validators(snapshot):
+    """(version, last modification timestamp) of the statistics served from ``snapshot``."""
+    return ('snapshot', os.path.basename(snapshot.path)), snapshot.exported_at
+
+
+def statistics_etag(version, *parts):
+    """
+    Strong ETag of a statistics response of data ``version``, ``parts``
+    being the request parameters and media type it depends on.
+    """
+    key = repr((RESPONSE_VERSION, version, parts))
+    return f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
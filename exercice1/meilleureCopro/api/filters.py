@@ -0,0 +1,74 @@
+"""
+Listing attribute filters and group-bys of the statistics endpoint.
+
+Filters narrow the listings of an area on the fields driving condominium
+expenses; a group-by splits them by one of those fields, numeric fields being
+grouped in buckets.
+"""
+import numpy as np
+
+# Query parameter: ORM lookup
+LISTING_FILTERS = {
+    'property_type': 'property_type',
+    'elevator': 'elevator',
+    'caretaker': 'caretaker',
+    'heating_mode': 'heating_mode',
+    'energy_classification': 'energy_classification',
+    'construction_year_min': 'construction_year__gte',
+    'construction_year_max': 'construction_year__lte',
+    'lot_count_min': 'lot_count__gte',
+    'lot_count_max': 'lot_count__lte',
+}
+
+ENERGY_CLASSIFICATIONS = ('A', 'B', 'C', 'D', 'E', 'F', 'G')
+
+# Lower bounds of the buckets of the numeric group-bys. Construction periods
+# follow the French building regulations (first thermal regulation in 1974,
+# RT 2000, RT 2012).
+GROUP_BY_BUCKETS = {
+    'construction_year': (0, 1949, 1975, 1990, 2001, 2013),
+    'lot_count': (0, 10, 50, 100, 200),
+}
+GROUP_BY_FIELDS = (
+    'property_type', 'elevator', 'caretaker', 'heating_mode', 'energy_classification',
+    'construction_year', 'lot_count',
+)
+# Group of the listings whose group-by field is missing
+UNKNOWN_GROUP = 'unknown'
+
+
+def filter_attributes(queryset, filters):
+    """Listings of ``queryset`` matching the LISTING_FILTERS query parameters, None values being ignored."""
+    lookups = {
+        LISTING_FILTERS[name]: value for name, value in filters.items() if value is not None
+    }
+    return queryset.filter(**lookups) if lookups else queryset
+
+
+def _bucket_labels(bounds):
+    labels = [f'{low}-{high - 1}' for low, high in zip(bounds, bounds[1:])]
+    return labels + [f'{bounds[-1]}+']
+
+
+def group_order(field, label):
+    """Sort key of a group label: buckets in increasing order, the unknown group last."""
+    if field in GROUP_BY_BUCKETS and label != UNKNOWN_GROUP:
+        return 0, _bucket_labels(GROUP_BY_BUCKETS[field]).index(label), label
+    return int(label == UNKNOWN_GROUP), 0, label
+
+
+def group_keys(field, values):
+    """Group labels of the values of a group-by field, as an object array."""
+    if field in GROUP_BY_BUCKETS:
+        bounds = GROUP_BY_BUCKETS[field]
+        numbers = np.array([np.nan if value is None else value for value in values], dtype=float)
+        labels = np.array(_bucket_labels(bounds) + [UNKNOWN_GROUP], dtype=object)
+        indexes = np.searchsorted(bounds, numbers, side='right') - 1
+        # Missing values and values below the first bound are unknown
+        indexes[np.isnan(numbers) | (indexes < 0)] = len(bounds)
+        return labels[indexes]
+    if field in ('elevator', 'caretaker'):
+        return np.array(
+            [UNKNOWN_GROUP if value is None else str(value).lower() for value in values], dtype=object
+        )
+    return np.array([UNKNOWN_GROUP if value in (None, '') else value for value in values], dtype=object)
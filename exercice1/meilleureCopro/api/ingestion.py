@@ -0,0 +1,293 @@
+"""
+Streaming import pipeline of the listings CSV dataset.
+
+The CSV is read straight from the tarball, converted to RealEstateListing
+keyword arguments with column-wise operations in a process pool, and written
+by a single writer thread. This module must stay importable without the
+Django app registry so that pool workers can load it.
+"""
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import queue
+import tarfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from django.db import connections
+
+from .metrics import StageThroughput
+from .surface import derived_surface_columns, parse_surface_column
+from .utils import city_key, parse_publication_date
+
+logger = logging.getLogger(__name__)
+
+# (model field, CSV column, conversion)
+LISTING_COLUMNS = (
+    ('reference_id', 'REFERENCE_NUMBER', 'text'),
+    ('ad_url', 'AD_URLS', 'text'),
+    ('property_type', 'PROPERTY_TYPE', 'property_type'),
+    ('dept_code', 'DEPT_CODE', 'int'),
+    ('postal_code', 'ZIP_CODE', 'int'),
+    ('city', 'CITY', 'required_text'),
+    ('insee_code', 'INSEE_CODE', 'int'),
+    ('latitude', 'LATITUDE', 'float'),
+    ('longitude', 'LONGITUDE', 'float'),
+    ('blur_radius', 'BLUR_RADIUS', 'int'),
+    ('marketing_type', 'MARKETING_TYPE', 'required_text'),
+    ('price', 'PRICE', 'float'),
+    ('description', 'DESCRIPTION', 'text'),
+    ('surface', 'SURFACE', 'surface'),
+    ('condominium_expenses', 'CONDOMINIUM_EXPENSES', 'float'),
+    ('caretaker', 'CARETAKER', 'bool'),
+    ('heating_mode', 'HEATING_MODE', 'required_text'),
+    ('water_heating_mode', 'WATER_HEATING_MODE', 'text'),
+    ('elevator', 'ELEVATOR', 'bool'),
+    ('floor', 'FLOOR', 'int'),
+    ('floor_count', 'FLOOR_COUNT', 'int'),
+    ('lot_count', 'LOT_COUNT', 'int'),
+    ('construction_year', 'CONSTRUCTION_YEAR', 'int'),
+    ('building_type', 'BUILDING_TYPE', 'text'),
+    ('parking', 'PARKING', 'bool'),
+    ('parking_count', 'PARKING_COUNT', 'int'),
+    ('terrace', 'TERRACE', 'bool'),
+    ('terrace_surface', 'TERRACE_SURFACE', 'float'),
+    ('swimming_pool', 'SWIMMING_POOL', 'bool'),
+    ('garden', 'GARDEN', 'bool'),
+    ('standing', 'STANDING', 'bool'),
+    ('new_build', 'NEW_BUILD', 'bool'),
+    ('small_building', 'SMALL_BUILDING', 'bool'),
+    ('corner_building', 'CORNER_BUILDING', 'bool'),
+    ('publication_start_date', 'PUBLICATION_START_DATE', 'text'),
+    ('dealer_name', 'DEALER_NAME', 'text'),
+    ('dealer_type', 'DEALER_TYPE', 'text'),
+    ('energy_classification', 'ENERGY_CLASSIFICATION', 'text'),
+)
+
+BOOLEAN_VALUES = {
+    'true': True, '1': True, '1.0': True,
+    'false': False, '0': False, '0.0': False,
+}
+
+
+def _nullable(series):
+    """List of the values of a series, missing values becoming None."""
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _text(series):
+    return _nullable(series.astype('string'))
+
+
+def _required_text(series):
+    return series.astype('string').fillna('').astype(object).tolist()
+
+
+def _property_type(series):
+    return series.astype('string').fillna('OTHER').astype(object).tolist()
+
+
+def _float(series):
+    numeric = pd.to_numeric(series, errors='coerce')
+    return _nullable(numeric.where(np.isfinite(numeric)))
+
+
+def _int(series):
+    numeric = np.trunc(pd.to_numeric(series, errors='coerce'))
+    numeric = numeric.where(np.isfinite(numeric))
+    return _nullable(numeric.astype('Int64'))
+
+
+def _bool(series):
+    return _nullable(series.astype('string').str.strip().str.lower().map(BOOLEAN_VALUES))
+
+
+def _surface(series):
+    return parse_surface_column(series.tolist()).lists
+
+
+CONVERTERS = {
+    'text': _text,
+    'required_text': _required_text,
+    'property_type': _property_type,
+    'float': _float,
+    'int': _int,
+    'bool': _bool,
+    'surface': _surface,
+}
+
+
+def convert_chunk(df):
+    """
+    Convert a chunk of the CSV dataset to a list of RealEstateListing keyword
+    arguments, content hash included. Rows without a reference are skipped.
+    """
+    if 'REFERENCE_NUMBER' in df:
+        df = df[df['REFERENCE_NUMBER'].notna()]
+
+    columns = {}
+    for field, column, conversion in LISTING_COLUMNS:
+        series = df[column] if column in df else pd.Series(None, index=df.index, dtype=object)
+        columns[field] = CONVERTERS[conversion](series)
+
+    rows = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    for row in rows:
+        row['content_hash'] = content_hash(row)
+
+    # Derived columns are left out of the content hash
+    primary_surfaces, fees_per_sqm = derived_surface_columns(columns['surface'], columns['condominium_expenses'])
+    for row, primary_surface, ratio in zip(rows, primary_surfaces, fees_per_sqm):
+        row['city_key'] = city_key(row['city'])
+        row['publication_date'] = parse_publication_date(row['publication_start_date'])
+        row['primary_surface'] = primary_surface
+        row['fees_per_sqm'] = ratio
+    return rows
+
+
+def _timed_convert_chunk(chunk):
+    """convert_chunk returning (rows, seconds), the conversion time of pool workers being reported back."""
+    start = time.perf_counter()
+    rows = convert_chunk(chunk)
+    return rows, time.perf_counter() - start
+
+
+def content_hash(row):
+    """Fingerprint of the content of a listing, used to detect changed rows between imports."""
+    values = [row[field] for field in sorted(row) if field != 'content_hash']
+    return hashlib.blake2b(json.dumps(values).encode(), digest_size=16).hexdigest()
+
+
+class _ForwardReader(io.RawIOBase):
+    """Forward-only view of a streamed tar member, which cannot tell whether it is seekable."""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._fileobj.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def read_csv_chunks(file_path, chunk_size, skip_rows=0):
+    """
+    Yield DataFrame chunks of the dataset, every column read as text, after
+    skipping the first ``skip_rows`` data rows. A .tar.gz dataset is streamed
+    from its first CSV member without being extracted to disk.
+    """
+    skiprows = range(1, skip_rows + 1) if skip_rows else None
+    if not file_path.endswith('tar.gz'):
+        yield from pd.read_csv(file_path, chunksize=chunk_size, dtype=str, skiprows=skiprows)
+        return
+
+    # Stream mode reads the archive sequentially, the gzip is decompressed once
+    with tarfile.open(file_path, 'r|gz') as tar:
+        for member in tar:
+            if member.isfile() and member.name.endswith('.csv'):
+                logger.info(f"Streaming {member.name} from {file_path}")
+                stream = io.BufferedReader(_ForwardReader(tar.extractfile(member)), buffer_size=1 << 20)
+                yield from pd.read_csv(stream, chunksize=chunk_size, dtype=str, skiprows=skiprows)
+                return
+    raise ValueError("No CSV file found in the tarball!")
+
+
+def _write_loop(pending_rows, write_rows, writer_context, errors, failed, throughput):
+    finished = False
+    try:
+        with writer_context:
+            while True:
+                converted = pending_rows.get()
+                if converted is None:
+                    finished = True
+                    break
+                with throughput.stage('write', rows=converted[1]):
+                    write_rows(*converted)
+    except Exception as e:
+        errors.append(e)
+        failed.set()
+        # Stop the producer, and keep draining so that it never blocks on a full queue
+        while not finished:
+            finished = pending_rows.get() is None
+    finally:
+        connections.close_all()
+
+
+def _timed_chunks(chunks, throughput):
+    """Iterate the chunks, recording the time spent reading each one in the 'read' stage."""
+    chunks = iter(chunks)
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        if chunk is None:
+            return
+        throughput.record('read', time.perf_counter() - start, len(chunk))
+        yield chunk
+
+
+def run_pipeline(chunks, write_rows, workers=0, writer_context=None, throughput=None):
+    """
+    Convert the chunks with ``workers`` processes (in this process when 0) and
+    pass the converted rows, in order, to ``write_rows(rows, consumed)`` from
+    a single writer thread, inside ``writer_context`` when given. ``consumed``
+    is the number of CSV rows the chunk was made of. At most ``2 * workers``
+    chunks are in flight and as many converted chunks wait for the writer,
+    which bounds memory. The busy time of the read, convert and write stages
+    is recorded in ``throughput``, a StageThroughput. A failing writer stops
+    the reading and conversion of the next chunks, then its error is raised.
+    """
+    throughput = throughput if throughput is not None else StageThroughput()
+    max_pending = max(workers, 1) * 2
+    pending_rows = queue.Queue(maxsize=max_pending)
+    errors = []
+    failed = threading.Event()
+    writer = threading.Thread(
+        target=_write_loop,
+        args=(pending_rows, write_rows, writer_context or contextlib.nullcontext(), errors, failed, throughput),
+        daemon=True,
+    )
+    writer.start()
+
+    def converted(future, consumed):
+        rows, seconds = future.result()
+        throughput.record('convert', seconds, consumed)
+        return rows, consumed
+
+    try:
+        if workers:
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                futures = deque()
+                for chunk in _timed_chunks(chunks, throughput):
+                    if failed.is_set():
+                        break
+                    futures.append((executor.submit(_timed_convert_chunk, chunk), len(chunk)))
+                    if len(futures) >= max_pending:
+                        pending_rows.put(converted(*futures.popleft()))
+                while futures and not failed.is_set():
+                    pending_rows.put(converted(*futures.popleft()))
+                for future, _ in futures:
+                    future.cancel()
+        else:
+            for chunk in _timed_chunks(chunks, throughput):
+                if failed.is_set():
+                    break
+                with throughput.stage('convert', rows=len(chunk)):
+                    rows = convert_chunk(chunk)
+                pending_rows.put((rows, len(chunk)))
+    finally:
+        pending_rows.put(None)
+        writer.join()
+
+    if errors:
+        raise errors[0]
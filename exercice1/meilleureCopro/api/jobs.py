@@ -0,0 +1,156 @@
+"""
+Background listing imports.
+
+Jobs are ImportJob rows, so any process can report their status, and are run
+by a pool of threads of the process that enqueued them. A job is claimed with
+a conditional update before running: queued jobs left by a stopped process
+are picked up by the next pool that starts, and never run twice. Running
+jobs record their progress in ``heartbeat_at``; those left running by a
+stopped process are marked failed by the next pool, to be submitted again.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .bienici import import_bienici_listings
+from .models import ImportJob
+from .utils import ImportJobKinds, ImportJobStatuses
+
+logger = logging.getLogger(__name__)
+
+# URLs fetched and upserted per step of a BienIci job
+BIENICI_JOB_BATCH_SIZE = 100
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.IMPORT_JOB_WORKERS, thread_name_prefix='import-job')
+            fail_stale_jobs()
+            for job_id in ImportJob.objects.filter(status=ImportJobStatuses.QUEUED.value).values_list('id', flat=True):
+                _executor.submit(run_job, job_id)
+        return _executor
+
+
+def fail_stale_jobs():
+    """
+    Mark as failed the running jobs without progress for
+    IMPORT_JOB_STALE_AFTER seconds, whose process was stopped or crashed.
+    Returns their number.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.IMPORT_JOB_STALE_AFTER)
+    stale = ImportJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status=ImportJobStatuses.RUNNING.value,
+    )
+    failed = 0
+    for job in stale:
+        last_progress = job.heartbeat_at or job.started_at
+        error = (
+            f"Interrupted: no progress since {last_progress.isoformat(timespec='seconds')}, submit the import again"
+        )
+        # Conditional on the heartbeat read, in case the job progressed meanwhile
+        failed += ImportJob.objects.filter(
+            id=job.id, status=ImportJobStatuses.RUNNING.value, heartbeat_at=job.heartbeat_at
+        ).update(status=ImportJobStatuses.FAILED.value, errors=[*job.errors, error], finished_at=now)
+    if failed:
+        logger.warning(f"Marked {failed} interrupted import jobs as failed")
+    return failed
+
+
+def enqueue_job(kind, params, rows_total=None):
+    """Create a queued import job, submitted to the worker pool once the transaction commits."""
+    job = ImportJob.objects.create(kind=kind.value, params=params, rows_total=rows_total)
+    transaction.on_commit(lambda: _get_executor().submit(run_job, job.id))
+    return job
+
+
+def run_job(job_id):
+    """Claim and run a queued job, recording its outcome."""
+    try:
+        now = timezone.now()
+        claimed = ImportJob.objects.filter(id=job_id, status=ImportJobStatuses.QUEUED.value).update(
+            status=ImportJobStatuses.RUNNING.value, started_at=now, heartbeat_at=now
+        )
+        if not claimed:
+            return
+        job = ImportJob.objects.get(id=job_id)
+        try:
+            JOB_RUNNERS[job.kind](job)
+            job.status = ImportJobStatuses.SUCCEEDED.value
+        except Exception as e:
+            logger.exception(f"Import job {job_id} failed")
+            job.status = ImportJobStatuses.FAILED.value
+            job.errors = [*job.errors, str(e)]
+        # Conditional, like the claim: a job marked failed as stale keeps its status
+        finished = ImportJob.objects.filter(id=job_id, status=ImportJobStatuses.RUNNING.value).update(
+            status=job.status, errors=job.errors, finished_at=timezone.now()
+        )
+        if not finished:
+            logger.warning(f"Import job {job_id} was marked failed while running, its {job.status} outcome is dropped")
+    finally:
+        connections.close_all()
+
+
+def _run_bienici_job(job):
+    urls = job.params['urls']
+    totals = {'created': 0, 'updated': 0, 'unchanged': 0}
+    for offset in range(0, len(urls), BIENICI_JOB_BATCH_SIZE):
+        summary = import_bienici_listings(urls[offset:offset + BIENICI_JOB_BATCH_SIZE])
+        for key in totals:
+            totals[key] += summary[key]
+        job.errors = [*job.errors, *(f"{error['url']}: {error['error']}" for error in summary['errors'])]
+        job.rows_done = min(offset + BIENICI_JOB_BATCH_SIZE, len(urls))
+        job.result = totals
+        job.heartbeat_at = timezone.now()
+        job.save(update_fields=['rows_done', 'result', 'errors', 'heartbeat_at'])
+
+
+def _run_csv_job(job):
+    output = io.StringIO()
+    call_command(
+        'import_listings',
+        file=job.params['file'],
+        engine=job.params.get('engine', 'orm'),
+        restart=job.params.get('restart', False),
+        workers=settings.IMPORT_JOB_CSV_WORKERS,
+        job_id=job.id,
+        stdout=output,
+    )
+    job.refresh_from_db(fields=['rows_done', 'result'])
+    job.result = {**job.result, 'output': output.getvalue().splitlines()[-20:]}
+    job.save(update_fields=['result'])
+
+
+JOB_RUNNERS = {
+    ImportJobKinds.BIENICI.value: _run_bienici_job,
+    ImportJobKinds.CSV.value: _run_csv_job,
+}
+
+
+def resolve_import_file(name):
+    """
+    Absolute path of a dataset file of IMPORT_DATA_DIR, the only directory
+    CSV import jobs may read. Raises ValueError for paths outside of it.
+    """
+    directory = os.path.realpath(settings.IMPORT_DATA_DIR)
+    path = os.path.realpath(os.path.join(directory, name))
+    if os.path.commonpath([directory, path]) != directory:
+        raise ValueError(f"{name} is not in the import data directory")
+    if not os.path.isfile(path):
+        raise ValueError(f"{name} not found in the import data directory")
+    return path
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from api.models import RealEstateListing
+from api.statistics import STATISTIC_COLUMNS
+from api.utils import city_key
+
+
+class Command(BaseCommand):
+    help = 'Compare the latency of city queries through the indexed city_key and the legacy city__iexact scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cities',
+            nargs='*',
+            help='City names to benchmark (default: the largest cities)'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Number of largest cities to benchmark when none are given (default: 10)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Number of timed runs per city, the best one is reported (default: 3)'
+        )
+
+    def handle(self, *args, **options):
+        cities = options['cities']
+        if not cities:
+            cities = list(
+                RealEstateListing.objects.values('city')
+                .annotate(total=Count('id'))
+                .order_by('-total')
+                .values_list('city', flat=True)[:options['top']]
+            )
+
+        if not cities:
+            self.stdout.write(self.style.WARNING("No listings found, import a dataset first."))
+            return
+
+        self.stdout.write(f"iexact plan: {RealEstateListing.objects.filter(city__iexact=cities[0]).explain()}")
+        self.stdout.write(f"city_key plan: {RealEstateListing.objects.filter(city_key=city_key(cities[0])).explain()}")
+
+        self.stdout.write(f"{'city':>24} {'iexact rows':>12} {'key rows':>9} {'iexact ms':>10} {'key ms':>8} {'speedup':>8}")
+        for city in cities:
+            iexact_time, iexact_rows = self._best_of(options['repeat'], lambda: list(
+                RealEstateListing.objects.filter(city__iexact=city).values_list(*STATISTIC_COLUMNS)
+            ))
+            key_time, key_rows = self._best_of(options['repeat'], lambda: list(
+                RealEstateListing.objects.filter(city_key=city_key(city)).values_list(*STATISTIC_COLUMNS)
+            ))
+
+            speedup = iexact_time / key_time if key_time else float('inf')
+            self.stdout.write(
+                f"{city[:24]:>24} {len(iexact_rows):>12} {len(key_rows):>9} {iexact_time * 1000:>10.1f} "
+                f"{key_time * 1000:>8.1f} {speedup:>7.1f}x"
+            )
+
+    def _best_of(self, repeat, func):
+        best, result = None, None
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
@@ -0,0 +1,102 @@
+import time
+
+import numpy as np
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from api.renderers import FastJSONRenderer, orjson
+from api.serializer import StatisticsResponseSerializer
+from api.statistics import STATISTIC_FIELDS, compute_statistics
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the cost of building and rendering statistics responses: validating serializer, '
+        'lean representation, orjson and compact layout'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=2000,
+            help='Responses built per timed run (default: 2000)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of timed runs per path, the best one is reported (default: 5)'
+        )
+        parser.add_argument(
+            '--areas',
+            type=int,
+            default=100,
+            help='Areas of the batch responses (default: 100)'
+        )
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed, FastJSONRenderer falls back to json."))
+
+        rng = np.random.default_rng(0)
+        stats = compute_statistics(*rng.lognormal(4, 1, size=(4, 1000)))
+        areas = [('department', str(dept), 1000 + dept, stats) for dept in range(options['areas'])]
+        json_render, fast_render = JSONRenderer().render, FastJSONRenderer().render
+
+        def single(statistics, render):
+            return lambda: render({'query_type': 'department', 'query_value': '75', 'count': 1000, 'statistics': statistics()})
+
+        def validated():
+            serializer = StatisticsResponseSerializer(data=stats)
+            serializer.is_valid(raise_exception=True)
+            return serializer.data
+
+        def batch(result, render, **extra):
+            return lambda: render({**extra, 'results': [result(*area) for area in areas], 'not_found': []})
+
+        def object_result(query_type, query_value, count, statistics, represent):
+            return {'query_type': query_type, 'query_value': query_value, 'count': count, 'statistics': represent(statistics)}
+
+        paths = [
+            ('single', 'serializer + json', single(validated, json_render)),
+            ('single', 'lean + json', single(lambda: StatisticsResponseSerializer.lean_data(stats), json_render)),
+            ('single', 'lean + fast', single(lambda: StatisticsResponseSerializer.lean_data(stats), fast_render)),
+            ('single', 'compact + fast', single(lambda: StatisticsResponseSerializer.compact_data(stats), fast_render)),
+            ('batch', 'serializer + json', batch(
+                lambda *area: object_result(*area, lambda s: StatisticsResponseSerializer(s).data), json_render
+            )),
+            ('batch', 'lean + json', batch(
+                lambda *area: object_result(*area, StatisticsResponseSerializer.lean_data), json_render
+            )),
+            ('batch', 'lean + fast', batch(
+                lambda *area: object_result(*area, StatisticsResponseSerializer.lean_data), fast_render
+            )),
+            ('batch', 'compact + fast', batch(
+                lambda query_type, query_value, count, statistics: [
+                    query_type, query_value, count, *StatisticsResponseSerializer.compact_data(statistics)
+                ],
+                fast_render,
+                fields=('query_type', 'query_value', 'count', *STATISTIC_FIELDS),
+            )),
+        ]
+
+        baseline = {}
+        self.stdout.write(f"{'response':>8} {'path':>18} {'us/response':>12} {'bytes':>7} {'speedup':>8}")
+        for response, name, build in paths:
+            elapsed = self._best_of(options['repeat'], options['iterations'], build)
+            baseline.setdefault(response, elapsed)
+            self.stdout.write(
+                f"{response:>8} {name:>18} {elapsed * 1e6:>12.1f} {len(build()):>7} {baseline[response] / elapsed:>7.1f}x"
+            )
+
+    def _best_of(self, repeat, iterations, func):
+        """Best time per call of ``func`` over ``repeat`` runs of ``iterations`` calls."""
+        best = None
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            elapsed = (time.perf_counter() - start) / iterations
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -0,0 +1,126 @@
+import time
+
+import pandas as pd
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from api.models import RealEstateListing
+from api.aggregates import sql_area_statistics
+from api.statistics import STATISTIC_COLUMNS, statistics_from_rows
+
+
+def legacy_statistics(listings_data):
+    """Row-wise pandas implementation previously used by StatisticsView, kept as the benchmark baseline."""
+    df = pd.DataFrame(listings_data)
+
+    def calculate_fees_per_sqm(row):
+        try:
+            if pd.notna(row['condominium_expenses']) and pd.notna(row['surface']):
+                surface = row['surface'][0] if isinstance(row['surface'], list) and row['surface'] else None
+                if surface and surface > 0:
+                    return row['condominium_expenses'] / surface
+            return None
+        except Exception:
+            return None
+
+    df['fees_per_sqm'] = df.apply(calculate_fees_per_sqm, axis=1)
+
+    def safe_stat(series):
+        clean_series = series.dropna()
+        if clean_series.empty:
+            return 0.0
+        value = clean_series.mean()
+        return 0.0 if pd.isna(value) else float(value)
+
+    def safe_quantile(series, q):
+        clean_series = series.dropna()
+        if clean_series.empty:
+            return 0.0
+        value = clean_series.quantile(q)
+        return 0.0 if pd.isna(value) else float(value)
+
+    first_surface = df['surface'].apply(lambda x: x[0] if isinstance(x, list) and x else None)
+
+    return {
+        'mean_price': safe_stat(df['price']),
+        'mean_surface': safe_stat(first_surface),
+        'mean_fees': safe_stat(df['condominium_expenses']),
+        'mean_fees_per_sqm': safe_stat(df['fees_per_sqm']),
+        'quantile_10_price': safe_quantile(df['price'], 0.1),
+        'quantile_90_price': safe_quantile(df['price'], 0.9),
+        'quantile_10_surface': safe_quantile(first_surface, 0.1),
+        'quantile_90_surface': safe_quantile(first_surface, 0.9),
+        'quantile_10_fees': safe_quantile(df['condominium_expenses'], 0.1),
+        'quantile_90_fees': safe_quantile(df['condominium_expenses'], 0.9),
+        'quantile_10_fees_per_sqm': safe_quantile(df['fees_per_sqm'], 0.1),
+        'quantile_90_fees_per_sqm': safe_quantile(df['fees_per_sqm'], 0.9),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compare the per-department latency of the legacy, vectorized and SQL statistics computations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--departments',
+            nargs='*',
+            type=int,
+            help='Department codes to benchmark (default: the largest departments)'
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Number of largest departments to benchmark when none are given (default: 10)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Number of timed runs per department, the best one is reported (default: 3)'
+        )
+
+    def handle(self, *args, **options):
+        departments = options['departments']
+        if not departments:
+            departments = list(
+                RealEstateListing.objects.exclude(dept_code=None)
+                .values('dept_code')
+                .annotate(total=Count('id'))
+                .order_by('-total')
+                .values_list('dept_code', flat=True)[:options['top']]
+            )
+
+        if not departments:
+            self.stdout.write(self.style.WARNING("No listings found, import a dataset first."))
+            return
+
+        self.stdout.write(
+            f"{'dept':>6} {'rows':>9} {'legacy ms':>11} {'vector ms':>11} {'sql ms':>9} {'speedup':>8}  same output"
+        )
+        for dept_code in departments:
+            listings = RealEstateListing.objects.filter(dept_code=dept_code)
+
+            legacy_time, legacy_stats = self._best_of(options['repeat'], lambda: legacy_statistics(
+                list(listings.values('condominium_expenses', 'surface', 'price'))
+            ))
+            vector_time, vector_stats = self._best_of(options['repeat'], lambda: statistics_from_rows(
+                list(listings.values_list(*STATISTIC_COLUMNS))
+            ))
+            sql_time, _ = self._best_of(options['repeat'], lambda: sql_area_statistics('department', dept_code))
+
+            rows = listings.count()
+            speedup = legacy_time / vector_time if vector_time else float('inf')
+            self.stdout.write(
+                f"{dept_code:>6} {rows:>9} {legacy_time * 1000:>11.1f} {vector_time * 1000:>11.1f} {sql_time * 1000:>9.1f} "
+                f"{speedup:>7.1f}x  {legacy_stats == vector_stats}"
+            )
+
+    def _best_of(self, repeat, func):
+        best, result = None, None
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
@@ -0,0 +1,296 @@
+import io
+import json
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import django
+import numpy as np
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from api.cache import STATISTICS_CACHE
+from api.management.commands import import_listings
+from api.models import AreaStatistics, RealEstateListing
+from api.synthetic import generate_listings_csv
+
+# Bumped when the layout of the report changes
+REPORT_VERSION = 1
+
+# Size classes of the benchmarked areas, by number of listings (upper bound excluded)
+SIZE_CLASSES = (('small', 1, 100), ('medium', 100, 1000), ('large', 1000, 10000), ('xlarge', 10000, None))
+QUERY_TYPES = ('department', 'postal_code', 'city')
+# /api/stats/ as served (precomputed statistics), and computed from the listings
+MODES = {'served': {}, 'computed': {'backend': 'numpy'}}
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak resident set size so far, of this process or of its waited-for children."""
+    peak = resource.getrusage(who).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the import and the statistics endpoint on synthetic listings in a throwaway database, '
+        'writing a JSON report to compare between versions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=100000,
+            help='Number of synthetic listings, from 10k to 10M (default: 100000)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Seed of the synthetic listings, the same seed and rows give the same data (default: 0)'
+        )
+        parser.add_argument(
+            '--workdir',
+            help='Directory of the generated CSV, reused when already generated, and of the benchmark database '
+                 '(default: a new temporary directory)'
+        )
+        parser.add_argument(
+            '--engine',
+            choices=['orm', 'sqlite-fast'],
+            default='orm',
+            help='import_listings engine (default: orm)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help='import_listings conversion processes (default: up to 4)'
+        )
+        parser.add_argument(
+            '--areas',
+            type=int,
+            default=5,
+            help='Areas benchmarked per query type and size class (default: 5)'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=20,
+            help='Requests per area and mode (default: 20)'
+        )
+        parser.add_argument(
+            '--output',
+            default='benchmark_report.json',
+            help='Path of the JSON report (default: benchmark_report.json)'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='JSON report of a previous version to compare with, failing when a metric regressed'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help='Relative change of a metric reported as a regression (default: 0.25)'
+        )
+
+    def handle(self, *args, **options):
+        workdir = options['workdir'] or tempfile.mkdtemp(prefix='meilleurecopro-benchmark-')
+        os.makedirs(workdir, exist_ok=True)
+        parameters = {
+            key: options[key] for key in ('rows', 'seed', 'engine', 'workers', 'areas', 'requests')
+        }
+        report = {
+            'version': REPORT_VERSION,
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'environment': self._environment(),
+            'parameters': parameters,
+            'peak_rss_mb': {},
+        }
+
+        csv_path = os.path.join(workdir, f"listings-{options['rows']}-{options['seed']}.csv")
+        report['generate'] = self._generate(csv_path, options['rows'], options['seed'])
+        if not report['generate']['reused']:
+            report['peak_rss_mb']['generate'] = peak_rss_mb()
+
+        with self._isolated_settings(workdir):
+            old_name = self._create_database(os.path.join(workdir, 'benchmark.sqlite3'))
+            try:
+                report['import'] = self._benchmark_import(csv_path, options)
+                report['peak_rss_mb']['import'] = peak_rss_mb()
+                report['peak_rss_mb']['import_workers'] = peak_rss_mb(resource.RUSAGE_CHILDREN)
+                report['statistics'] = self._benchmark_statistics(options['areas'], options['requests'], options['seed'])
+                report['peak_rss_mb']['statistics'] = peak_rss_mb()
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote the benchmark report to {options['output']}"))
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                regressions = self._compare(report, json.load(f), options['tolerance'])
+            if regressions:
+                raise CommandError(f"{len(regressions)} metrics regressed by more than {options['tolerance']:.0%}")
+
+    def _environment(self):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'numpy': np.__version__,
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        }
+
+    def _generate(self, csv_path, rows, seed):
+        if os.path.exists(csv_path):
+            self.stdout.write(f"Reusing {csv_path}")
+            return {'seconds': None, 'reused': True}
+        self.stdout.write(f"Generating {rows} synthetic listings in {csv_path}...")
+        start = time.perf_counter()
+        cities = generate_listings_csv(csv_path, rows, seed)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Generated {rows} listings in {cities} cities in {elapsed:.1f}s"))
+        return {'seconds': elapsed, 'reused': False}
+
+    def _create_database(self, path):
+        """Create and migrate the benchmark database in place of the default one, like the test runner does."""
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = path
+        self.stdout.write(f"Creating the benchmark database {path}...")
+        return connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    def _isolated_settings(self, workdir):
+        """
+        Point the snapshot and the shared statistics cache to the workdir, so that
+        the synthetic statistics never reach the ones served by the application.
+        """
+        snapshot_dir = os.path.join(workdir, 'snapshot') if settings.STATISTICS_SNAPSHOT_DIR else None
+        return override_settings(
+            STATISTICS_SNAPSHOT_DIR=snapshot_dir,
+            CACHES={
+                **settings.CACHES,
+                STATISTICS_CACHE: {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                    'LOCATION': os.path.join(workdir, 'cache'),
+                    'OPTIONS': {'MAX_ENTRIES': 2000},
+                },
+            },
+        )
+
+    def _benchmark_import(self, csv_path, options):
+        command = import_listings.Command()
+        output = io.StringIO()
+        start = time.perf_counter()
+        call_command(command, file=csv_path, engine=options['engine'], workers=options['workers'], stdout=output)
+        elapsed = time.perf_counter() - start
+
+        imported = RealEstateListing.objects.count()
+        if imported != options['rows']:
+            raise CommandError(f"Imported {imported} of {options['rows']} listings:\n{output.getvalue()}")
+        rate = imported / elapsed
+        self.stdout.write(self.style.SUCCESS(f"Imported {imported} listings in {elapsed:.1f}s ({rate:.0f} rows/sec)"))
+        return {
+            'seconds': elapsed,
+            'rows_per_second': rate,
+            'stages': {
+                stage: {'seconds': seconds, 'rows': rows, 'rows_per_second': stage_rate}
+                for stage, seconds, rows, stage_rate in command.throughput.summary()
+            },
+        }
+
+    def _benchmark_statistics(self, areas_per_class, requests, seed):
+        client = Client(HTTP_HOST='localhost')
+        rng = np.random.default_rng(seed)
+        results = []
+        self.stdout.write(f"{'query type':>12} {'size':>7} {'mode':>9} {'areas':>6} {'p50 ms':>8} {'p99 ms':>8}")
+        for query_type in QUERY_TYPES:
+            areas = list(AreaStatistics.objects.filter(query_type=query_type).values_list('query_value', 'count'))
+            for size, low, high in SIZE_CLASSES:
+                candidates = sorted(value for value, count in areas if count >= low and (high is None or count < high))
+                if not candidates:
+                    continue
+                picked = rng.choice(candidates, size=min(areas_per_class, len(candidates)), replace=False).tolist()
+                for mode, params in MODES.items():
+                    latencies = self._time_requests(client, query_type, picked, params, requests)
+                    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+                    results.append({
+                        'query_type': query_type,
+                        'size': size,
+                        'mode': mode,
+                        'areas': len(picked),
+                        'requests': len(latencies),
+                        'p50_ms': p50,
+                        'p99_ms': p99,
+                        'mean_ms': float(np.mean(latencies)) * 1000,
+                    })
+                    self.stdout.write(f"{query_type:>12} {size:>7} {mode:>9} {len(picked):>6} {p50:>8.2f} {p99:>8.2f}")
+        return results
+
+    def _time_requests(self, client, query_type, values, params, requests):
+        latencies = []
+        for value in values:
+            for _ in range(requests):
+                # Measure the statistics path, not the cache in front of it
+                caches[STATISTICS_CACHE].clear()
+                start = time.perf_counter()
+                response = client.get('/api/stats/', {'query_type': query_type, 'query_value': value, **params})
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise CommandError(f"/api/stats/ answered {response.status_code} for {query_type} {value}")
+        return np.array(latencies)
+
+    def _comparable_metrics(self, report):
+        """{name: (value, higher is better)} of the metrics of a report compared with a baseline."""
+        metrics = {'import.rows_per_second': (report['import']['rows_per_second'], True)}
+        for stage, values in report['import']['stages'].items():
+            metrics[f'import.{stage}.rows_per_second'] = (values['rows_per_second'], True)
+        for result in report['statistics']:
+            name = f"statistics.{result['query_type']}.{result['size']}.{result['mode']}"
+            metrics[f'{name}.p50_ms'] = (result['p50_ms'], False)
+            metrics[f'{name}.p99_ms'] = (result['p99_ms'], False)
+        for phase, value in report['peak_rss_mb'].items():
+            metrics[f'peak_rss_mb.{phase}'] = (value, False)
+        return metrics
+
+    def _compare(self, report, baseline, tolerance):
+        """Print the relative change of every metric found in both reports, returns the regressed ones."""
+        if baseline.get('parameters') != report['parameters']:
+            self.stdout.write(self.style.WARNING(
+                f"The baseline was run with other parameters ({baseline.get('parameters')}), "
+                f"its metrics may not be comparable"
+            ))
+        previous = self._comparable_metrics(baseline)
+        regressions = []
+        for name, (value, higher_is_better) in self._comparable_metrics(report).items():
+            if name not in previous or not previous[name][0]:
+                continue
+            change = value / previous[name][0] - 1
+            regressed = (-change if higher_is_better else change) > tolerance
+            line = f"{name:<48} {previous[name][0]:>12.2f} -> {value:>12.2f} ({change:+.1%})"
+            if regressed:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(f"{line} regression"))
+            else:
+                self.stdout.write(line)
+        return regressions
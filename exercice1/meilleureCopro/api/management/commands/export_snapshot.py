@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.aggregates import export_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Export the statistic columns of the listings to a memory-mappable columnar snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directory',
+            default=settings.STATISTICS_SNAPSHOT_DIR,
+            help='Snapshot directory (default: STATISTICS_SNAPSHOT_DIR)'
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not directory:
+            raise CommandError("No snapshot directory, set STATISTICS_SNAPSHOT_DIR or use --directory")
+
+        start = time.perf_counter()
+        rows = export_snapshot(directory)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Exported {rows} listings to {directory} in {elapsed:.1f}s"))
@@ -0,0 +1,74 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.bienici import import_bienici_listings
+
+
+class Command(BaseCommand):
+    help = 'Import BienIci listings from a file of listing URLs, one per line'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            required=True,
+            help='Path to the file of BienIci listing URLs'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.BIENICI_CONCURRENCY,
+            help=f'Number of concurrent requests to BienIci (default: {settings.BIENICI_CONCURRENCY})'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=settings.BIENICI_TIMEOUT,
+            help=f'Timeout of a request in seconds (default: {settings.BIENICI_TIMEOUT})'
+        )
+        parser.add_argument(
+            '--retries',
+            type=int,
+            default=settings.BIENICI_RETRIES,
+            help=f'Number of retries of a failed request (default: {settings.BIENICI_RETRIES})'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of listings fetched and upserted at once (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        file_path = options['file']
+        if not os.path.exists(file_path):
+            self.stdout.write(self.style.WARNING(f"File {file_path} not found!"))
+            return
+
+        with open(file_path) as f:
+            urls = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+        self.stdout.write(self.style.SUCCESS(f"Importing {len(urls)} BienIci listings from {file_path}"))
+
+        start = time.perf_counter()
+        totals = {'created': 0, 'updated': 0, 'unchanged': 0}
+        errors = []
+        for offset in range(0, len(urls), options['batch_size']):
+            summary = import_bienici_listings(
+                urls[offset:offset + options['batch_size']],
+                concurrency=options['concurrency'],
+                timeout=options['timeout'],
+                retries=options['retries'],
+            )
+            for key in totals:
+                totals[key] += summary[key]
+            errors += summary['errors']
+        elapsed = time.perf_counter() - start
+
+        for error in errors:
+            self.stdout.write(self.style.ERROR(f"{error['url']}: {error['error']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {len(urls)} URLs in {elapsed:.1f}s: {totals['created']} created, "
+            f"{totals['updated']} updated, {totals['unchanged']} unchanged, {len(errors)} errors."
+        ))
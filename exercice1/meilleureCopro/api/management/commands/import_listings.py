@@ -1,15 +1,28 @@
+import argparse
 import os
-import tarfile
-from django.db import IntegrityError
-import pandas as pd
+import time
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 
 from django.core.management.base import BaseCommand
-from api.models import RealEstateListing
+from api.aggregates import export_snapshot, rebuild_area_statistics, refresh_area_statistics
+from api.cache import invalidate_statistics
+from api.ingestion import read_csv_chunks, run_pipeline
+from api.metrics import StageThroughput, render_metrics
+from api.models import ImportCheckpoint, ImportJob
+from api.sketches import rebuild_area_sketches, rebuild_sketch_cells
+from api.sqlite_loader import SQLiteFastLoader
+from api.timeseries import rebuild_monthly_statistics, refresh_monthly_statistics
+from api.upsert import upsert_listing_rows
 
 from tqdm import tqdm
 
+# Above this many changed areas, rebuilding every area in one scan is cheaper
+INCREMENTAL_REFRESH_MAX_AREAS = 500
+
 class Command(BaseCommand):
-    help='Import real estate listings from the provided CSV dataset'
+    help='Import real estate listings from the provided CSV dataset, upserting only new or changed listings'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -17,6 +30,42 @@ class Command(BaseCommand):
             default='dataset_annonces.csv.tar.gz',
             help='Path to the dataset file (default: dataset_annonces.csv.tar.gz)'
         )
+        parser.add_argument(
+            '--engine',
+            choices=['orm', 'sqlite-fast'],
+            default='orm',
+            help='How listings are written: ORM bulk_create, or executemany without secondary indexes on SQLite (default: orm)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=min(4, os.cpu_count() or 1),
+            help='Number of processes converting CSV chunks, 0 to convert in the main process (default: up to 4)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=50000,
+            help='Number of CSV rows read at once (default: 50000)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of listings per bulk insert (default: 5000)'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Start over instead of resuming an interrupted import of the same file'
+        )
+        parser.add_argument(
+            '--metrics-file',
+            help='Write the stage metrics in the Prometheus text format to this file, '
+                 'e.g. for the node_exporter textfile collector'
+        )
+        # ImportJob reporting the progress of the import, set by api.jobs
+        parser.add_argument('--job-id', type=int, help=argparse.SUPPRESS)
 
     def handle(self, *args, **options):
         file_path = options['file']
@@ -31,157 +80,144 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(f"Importing data from {file_path}"))
 
         try:
-            if file_path.endswith('tar.gz'):
-                extract_dir = os.path.dirname(file_path) or '.'
-                with tarfile.open(file_path, 'r:gz') as tar:
-                    csv_members = [m for m in tar.getmembers() if m.name.endswith('.csv')]
-                    if not csv_members:
-                        self.stdout.write(self.style.ERROR("No CSV file found in the tarball!"))
-                        return
-                    
-                    csv_member = csv_members[0]
-                    tar.extract(csv_member, path=extract_dir)
-                    csv_path = os.path.join(extract_dir, csv_member.name)
-                    self.stdout.write(self.style.SUCCESS(f"Extracted {csv_member.name}"))
-            else:
-                csv_path = file_path
-
-            self.stdout.write(self.style.SUCCESS(f"Reading data from {csv_path}"))
-
-            total_rows = sum(1 for _ in open(csv_path)) - 1 
-            chunk_size = 50000
-            total_imported = 0
-
-            pbar = tqdm(total=total_rows, desc="Importing listings", unit="rows")
-
-            for chunk in pd.read_csv(csv_path, chunksize=chunk_size, low_memory=False):
-                self._process_chunk(chunk)
-                total_imported += len(chunk)
-                pbar.update(len(chunk))
-
-                import gc
-                gc.collect()
-
-            pbar.close()
-            self.stdout.write(self.style.SUCCESS(f"Successfully imported {total_imported} listings."))
+            self.batch_size = options['batch_size']
+            self.job_id = options.get('job_id')
+            self.checkpoint = self._get_checkpoint(file_path, options['restart'])
+            self.loader = SQLiteFastLoader(checkpoint=self.checkpoint) if options['engine'] == 'sqlite-fast' else None
+            self.updated_areas = set()
+            self.updated_months = set()
+            self.changed_cells = set()
+            self.total_imported = 0
+            self.created = self.updated = 0
+            self.throughput = StageThroughput()
+
+            resumed = self.checkpoint.rows_done > 0
+            if resumed:
+                self.stdout.write(self.style.WARNING(
+                    f"Resuming the interrupted import after {self.checkpoint.rows_done} rows "
+                    f"(use --restart to start over)"
+                ))
+            self.pbar = tqdm(desc="Importing listings", unit="rows")
+
+            start = time.perf_counter()
+            run_pipeline(
+                read_csv_chunks(file_path, options['chunk_size'], skip_rows=self.checkpoint.rows_done),
+                self._write_rows,
+                workers=options['workers'],
+                writer_context=self.loader,
+                throughput=self.throughput,
+            )
+            elapsed = time.perf_counter() - start
+
+            self.pbar.close()
+
+            rate = self.total_imported / elapsed if elapsed else 0
+            self.stdout.write(self.style.SUCCESS(
+                f"Successfully processed {self.total_imported} listings in {elapsed:.1f}s ({rate:.0f} rows/sec): "
+                f"{self.created} created, {self.updated} updated, "
+                f"{self.total_imported - self.created - self.updated} unchanged or skipped."
+            ))
             self.stdout.write(self.style.SUCCESS("Import completed."))
 
-            if file_path.endswith('.tar.gz') and os.path.exists(csv_path):
-                os.remove(csv_path)
-                self.stdout.write(self.style.SUCCESS(f"Cleaned up temporary file {csv_path}"))
+            # The areas changed before an interruption are unknown, rebuild them all
+            with self.throughput.stage('refresh', rows=self.created + self.updated):
+                self._refresh_statistics(rebuild=resumed)
+
+            if settings.STATISTICS_SNAPSHOT_DIR and (self.created or self.updated or resumed):
+                self._heartbeat()
+                start = time.perf_counter()
+                rows = export_snapshot(settings.STATISTICS_SNAPSHOT_DIR)
+                self.throughput.record('snapshot', time.perf_counter() - start, rows)
+                self.stdout.write(self.style.SUCCESS(f"Exported the snapshot of {rows} listings."))
+
+            # Completed only once statistics and snapshot are current: a rerun
+            # resumes after the last row and rebuilds them
+            self.checkpoint.completed = True
+            self.checkpoint.save(update_fields=['completed', 'updated_at'])
+
+            self._report_throughput(options.get('metrics_file'))
 
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Error during import: {str(e)}"))
-
-    def _process_chunk(self, df):
-        batch_size = 5000
-        listings_to_create = []
-        chunk_imported = 0
-            
-        for _, row in df.iterrows():
-            if chunk_imported == 0 and len(listings_to_create) == 0:
-                self.stdout.write(self.style.SUCCESS("Sample row data:"))
-                for col in df.columns:
-                    self.stdout.write(f"{col}: {row.get(col)}")
-
-            surface_value = self.handle_surface_value(row)
-
-            listing = RealEstateListing(
-                reference_id=str(row.get('REFERENCE_NUMBER', '')),
-                ad_url=str(row.get('AD_URLS', '')),
-                property_type=str(row.get('PROPERTY_TYPE', '')),
-                dept_code=self.safe_int(row.get('DEPT_CODE', '')),
-                postal_code=self.safe_int(row.get('ZIP_CODE', '')),
-                city=str(row.get('CITY', '')),
-                insee_code=self.safe_int(row.get('INSEE_CODE', None)),
-                latitude=self.safe_float(row.get('LATITUDE', None)),
-                longitude=self.safe_float(row.get('LONGITUDE', None)),
-                blur_radius=self.safe_int(row.get('BLUR_RADIUS', None)),
-                marketing_type=str(row.get('MARKETING_TYPE', '')),              
-                price=self.safe_float(row.get('PRICE', None)),
-                description=str(row.get('DESCRIPTION', None)),
-                surface=surface_value,
-                condominium_expenses=self.safe_float(row.get('CONDOMINIUM_EXPENSES', None)),
-                caretaker=bool(row.get('CARETAKER', None)),
-                heating_mode=str(row.get('HEATING_MODE', None)),
-                water_heating_mode=str(row.get('WATER_HEATING_MODE', '')),
-                elevator=bool(row.get('ELEVATOR', '')),
-                floor=self.safe_int(row.get('FLOOR', None)),
-                floor_count=self.safe_int(row.get('FLOOR_COUNT', None)),
-                lot_count=self.safe_int(row.get('LOT_COUNT', None)),
-                construction_year=self.safe_int(row.get('CONSTRUCTION_YEAR', None)),
-                building_type=str(row.get('BUILDING_TYPE', '')),
-                parking=bool(row.get('PARKING', None)),
-                parking_count=self.safe_int(row.get('PARKING_COUNT', None)),
-                terrace=bool(row.get('TERRACE', None)),
-                terrace_surface=self.safe_float(row.get('TERRACE_SURFACE', None)),
-                swimming_pool=bool(row.get('SWIMMING_POOL', None)),
-                garden=bool(row.get('GARDEN', None)),
-                standing=bool(row.get('STANDING', None)),
-                new_build=bool(row.get('NEW_BUILD', None)),
-                small_building=bool(row.get('SMALL_BUILDING', None)),
-                corner_building=bool(row.get('CORNER_BUILDING', None)),
-                publication_start_date=str(row.get('PUBLICATION_START_DATE', '')),
-                dealer_name=str(row.get('DEALER_NAME', '')),
-                dealer_type=str(row.get('DEALER_TYPE', '')),
-                energy_classification=str(row.get('ENERGY_CLASSIFICATION', '')),
+            if options.get('job_id'):
+                # Let the job record the failure
+                raise
+
+    def _report_throughput(self, metrics_file):
+        """Print the busy time and rows per second of each import stage, and write the metrics file if asked."""
+        self.stdout.write(self.style.SUCCESS("Stage throughput (stages overlap, the slowest bounds the import):"))
+        for stage, seconds, rows, rate in self.throughput.summary():
+            self.stdout.write(self.style.SUCCESS(
+                f"  {stage:<8} {seconds:8.1f}s {rows:>10} rows ({rate:.0f} rows/sec)"
+            ))
+        if metrics_file:
+            with open(metrics_file, 'w') as f:
+                f.write(render_metrics())
+            self.stdout.write(self.style.SUCCESS(f"Wrote the import metrics to {metrics_file}"))
+
+    def _get_checkpoint(self, file_path, restart):
+        """Return the checkpoint of an interrupted import of the same file, or start a new one."""
+        source = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        signature = f"{stat.st_size}:{int(stat.st_mtime)}"
+
+        checkpoint = ImportCheckpoint.objects.filter(
+            source=source, source_signature=signature, completed=False
+        ).order_by('-id').first()
+        if checkpoint is None or restart:
+            checkpoint = ImportCheckpoint.objects.create(source=source, source_signature=signature)
+        return checkpoint
+
+    def _write_rows(self, rows, consumed):
+        """
+        Save the new and changed listings of a converted chunk together with
+        the checkpoint, called from the pipeline writer thread.
+        """
+        with transaction.atomic():
+            result = upsert_listing_rows(
+                rows, self.batch_size, write=self.loader.write if self.loader is not None else None
             )
+            self.checkpoint.rows_done += consumed
+            self.checkpoint.save(update_fields=['rows_done', 'updated_at'])
+
+        self.changed_cells |= result.changed_cells
+        invalidate_statistics(result.areas)
+        self.updated_areas |= result.areas
+        self.updated_months |= result.area_months
+        self.created += result.created
+        self.updated += result.updated
+        self.total_imported += consumed
+        self.pbar.update(consumed)
+        self._heartbeat(rows_done=self.total_imported, result={'created': self.created, 'updated': self.updated})
+
+    def _heartbeat(self, **progress):
+        """Record the progress of the import job, if any, so that it is not taken for an interrupted one."""
+        if self.job_id:
+            ImportJob.objects.filter(id=self.job_id).update(heartbeat_at=timezone.now(), **progress)
+
+    def _refresh_statistics(self, rebuild=False):
+        """Refresh the precomputed statistics and sketches of the areas the import changed."""
+        if rebuild:
+            self.stdout.write(self.style.SUCCESS("Rebuilding area sketches..."))
+            rebuild_area_sketches()
+        elif self.changed_cells:
+            # Sketches of new listings were updated chunk by chunk, modified ones need a rebuild
+            rebuild_sketch_cells(self.changed_cells)
+        self._heartbeat()
+
+        if not self.updated_areas and not rebuild:
+            self.stdout.write(self.style.SUCCESS("No listing changed, area statistics are up to date."))
+            return
 
-            if chunk_imported == 0 and len(listings_to_create) == 0:
-                self.stdout.write(self.style.SUCCESS("Sample listing data:"))
-                self.stdout.write(f"reference_id: {listing.reference_id}")
-                self.stdout.write(f"dept_code: {listing.dept_code}")
-                self.stdout.write(f"surface: {listing.surface}")
-
-            listings_to_create.append(listing)
-
-            if len(listings_to_create) >= batch_size:
-                try:
-                    RealEstateListing.objects.bulk_create(
-                        listings_to_create,
-                        batch_size=batch_size,
-                        ignore_conflicts=True
-                    )
-                    chunk_imported += len(listings_to_create)
-                    listings_to_create = []
-                except IntegrityError as e:
-                    self.stdout.write(self.style.ERROR(f"Integrity error: {str(e)}"))
-                    listings_to_create = []
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f"Error in bulk_create: {str(e)}"))
-                    listings_to_create = []
-
-        if listings_to_create:
-            RealEstateListing.objects.bulk_create(
-                listings_to_create,
-                batch_size=batch_size,
-                ignore_conflicts=True
-            )
-            chunk_imported += len(listings_to_create)
-
-    def handle_surface_value(self, row):
-        surface_value = row.get('SURFACE', None)
-        if isinstance(surface_value, str) and surface_value.startswith('[') and surface_value.endswith(']'):
-            try:
-                # Convert string representation of list to actual list of floats
-                return [self.safe_float(x) for x in eval(surface_value)]
-            except (ValueError, SyntaxError):
-                return None
-        else:
-            try:
-                # If it's a single value, convert it to a list with one element
-                return [float(surface_value)] if pd.notna(surface_value) else None
-            except (ValueError, TypeError):
-                return None
-
-    def safe_float(self, value):
-        try:
-            return float(value) if pd.notna(value) else None
-        except (ValueError, TypeError):
-            return None
+        if not rebuild and len(self.updated_areas) <= INCREMENTAL_REFRESH_MAX_AREAS:
+            self.stdout.write(self.style.SUCCESS(f"Refreshing statistics of {len(self.updated_areas)} areas..."))
+            refresh_area_statistics(self.updated_areas)
+            refresh_monthly_statistics(self.updated_months)
+            return
 
-    def safe_int(self, value):
-        try:
-            return int(value) if pd.notna(value) else None
-        except (ValueError, TypeError):
-            return None
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS("Rebuilding area statistics..."))
+        area_count = rebuild_area_statistics()
+        invalidate_statistics(self.updated_areas)
+        self._heartbeat()
+        month_count = rebuild_monthly_statistics()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt statistics of {area_count} areas and {month_count} area months."))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+from api.aggregates import rebuild_area_statistics
+from api.cache import STATISTICS_CACHE
+from api.sketches import rebuild_area_sketches
+from api.timeseries import rebuild_monthly_statistics
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the precomputed statistics from the stored listings, '
+        'e.g. after a migration changing how they are computed or keyed'
+    )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        rebuild_area_sketches()
+        area_count = rebuild_area_statistics()
+        month_count = rebuild_monthly_statistics()
+        caches[STATISTICS_CACHE].clear()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt the sketches and the statistics of {area_count} areas and {month_count} area months in {elapsed:.1f}s."
+        ))
@@ -0,0 +1,223 @@
+"""
+In-process metrics of the statistics and import paths.
+
+Counters and histograms live in the memory of each process and are exposed
+in the Prometheus text format by /api/metrics/: with several workers, each
+one reports its own requests. ``span`` times a step of a request (ORM fetch,
+array build, compute of a metric, serialization) and also records it for the
+request being profiled, if any. This module must stay importable without the
+Django app registry, it is used by the import pipeline.
+"""
+import contextlib
+import math
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+# Functions listed in the profile of a request, by cumulative time
+PROFILE_FUNCTIONS = 25
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_local = threading.local()
+REGISTRY = []
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [*zip(labelnames, values), *extra]
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, one value per combination of label values."""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = defaultdict(float)
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with _lock:
+            self._values[key] += amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels.get(name, '')) for name in self.labelnames), 0.0)
+
+    def samples(self):
+        with _lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class Histogram:
+    """Cumulative histogram of observed values, one per combination of label values."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values: [per-bucket counts (last one +Inf), sum]
+        self._values = {}
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][index] += 1
+            counts[1] += value
+
+    def count(self, **labels):
+        counts = self._values.get(tuple(str(labels.get(name, '')) for name in self.labelnames))
+        return sum(counts[0]) if counts is not None else 0
+
+    def samples(self):
+        with _lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}'
+
+
+REQUEST_SECONDS = Histogram(
+    'meilleurecopro_request_seconds', 'Latency of the statistics endpoints, rendering included.',
+    ('endpoint', 'query_type'),
+)
+SPAN_SECONDS = Histogram(
+    'meilleurecopro_span_seconds', 'Duration of the instrumented steps of the statistics requests.',
+    ('span', 'metric'),
+)
+STATISTICS_QUERIES = Counter(
+    'meilleurecopro_statistics_queries_total', 'Statistics queries answered, by where the statistics came from.',
+    ('query_type', 'source'),
+)
+STATISTICS_ROWS = Counter(
+    'meilleurecopro_statistics_rows_total', 'Listings of the areas answered by the statistics queries, whatever the source.',
+    ('query_type', 'source'),
+)
+IMPORT_STAGE_SECONDS = Counter(
+    'meilleurecopro_import_stage_seconds_total', 'Busy time of each stage of the listing imports.', ('stage',),
+)
+IMPORT_STAGE_ROWS = Counter(
+    'meilleurecopro_import_stage_rows_total', 'Rows processed by each stage of the listing imports.', ('stage',),
+)
+
+
+@contextlib.contextmanager
+def span(name, **labels):
+    """Time a step of the current request in SPAN_SECONDS, and in the spans being collected by this thread."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        SPAN_SECONDS.observe(elapsed, span=name, **labels)
+        collected = getattr(_local, 'spans', None)
+        if collected is not None:
+            collected.append({'span': name, **labels, 'seconds': elapsed})
+
+
+@contextlib.contextmanager
+def collect_spans():
+    """Collect the spans recorded by this thread, yields the list they are appended to."""
+    previous = getattr(_local, 'spans', None)
+    _local.spans = []
+    try:
+        yield _local.spans
+    finally:
+        _local.spans = previous
+
+
+class StageThroughput:
+    """
+    Busy time and rows of the stages of one import, also added to the
+    process-wide import metrics. Stages run concurrently: each one's rows per
+    second is its own capacity, the slowest bounds the import.
+    """
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.rows = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, rows)
+
+    def record(self, name, seconds, rows):
+        with self._lock:
+            self.seconds[name] += seconds
+            self.rows[name] += rows
+        IMPORT_STAGE_SECONDS.inc(seconds, stage=name)
+        IMPORT_STAGE_ROWS.inc(rows, stage=name)
+
+    def summary(self):
+        """(stage, seconds, rows, rows per second) of every recorded stage, in first-recorded order."""
+        return [
+            (name, seconds, self.rows[name], self.rows[name] / seconds if seconds else 0.0)
+            for name, seconds in self.seconds.items()
+        ]
+
+
+def profile_summary(profiler, spans, limit=PROFILE_FUNCTIONS):
+    """Spans and most expensive functions, by cumulative time, of a request profiled with cProfile."""
+    stats = pstats.Stats(profiler)
+    functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return {
+        'total_seconds': stats.total_tt,
+        'spans': spans,
+        'functions': [
+            {
+                'function': f'{filename}:{line}({name})',
+                'calls': calls,
+                'own_seconds': own,
+                'cumulative_seconds': cumulative,
+            }
+            for (filename, line, name), (_, calls, own, cumulative, _) in functions
+        ],
+    }
+
+
+def render_metrics():
+    """Every registered metric in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_alter_realestatelisting_surface'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AreaStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query_type', models.CharField(choices=[('department', 'DEPARTMENT'), ('city', 'CITY'), ('postal_code', 'POSTAL_CODE')], max_length=20)),
+                ('query_value', models.CharField(max_length=255)),
+                ('count', models.IntegerField(default=0)),
+                ('mean_price', models.FloatField(default=0.0)),
+                ('mean_surface', models.FloatField(default=0.0)),
+                ('mean_fees', models.FloatField(default=0.0)),
+                ('mean_fees_per_sqm', models.FloatField(default=0.0)),
+                ('quantile_10_price', models.FloatField(default=0.0)),
+                ('quantile_90_price', models.FloatField(default=0.0)),
+                ('quantile_10_surface', models.FloatField(default=0.0)),
+                ('quantile_90_surface', models.FloatField(default=0.0)),
+                ('quantile_10_fees', models.FloatField(default=0.0)),
+                ('quantile_90_fees', models.FloatField(default=0.0)),
+                ('quantile_10_fees_per_sqm', models.FloatField(default=0.0)),
+                ('quantile_90_fees_per_sqm', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('query_type', 'query_value'), name='unique_area_statistics')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_areastatistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='realestatelisting',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=1024)),
+                ('source_signature', models.CharField(max_length=255)),
+                ('rows_done', models.BigIntegerField(default=0)),
+                ('completed', models.BooleanField(default=False)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['source', 'source_signature'], name='import_checkpoint_source')],
+            },
+        ),
+    ]
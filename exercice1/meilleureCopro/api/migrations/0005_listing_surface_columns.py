@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:39
+
+import math
+
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+
+# Frozen copy of the api.surface parsing and of api.statistics.compute_fees_per_sqm as of this migration
+
+def _number(value):
+    try:
+        number = float(value)
+    except (ValueError, TypeError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def parse_surface(value):
+    if isinstance(value, str):
+        value = value.strip()
+        if value[:1] == '[' and value[-1:] == ']':
+            inner = value[1:-1]
+            return [_number(item) for item in inner.split(',')] if inner.strip() else []
+        number = _number(value)
+        return None if number is None else [number]
+    if isinstance(value, (list, tuple)):
+        return [_number(item) for item in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        number = _number(value)
+        return None if number is None else [number]
+    return None
+
+
+def surface_columns(surface, fees):
+    """(primary_surface, fees_per_sqm) of a listing, fees per m² being only defined for a single positive surface."""
+    surfaces = parse_surface(surface)
+    primary = surfaces[0] if surfaces else None
+    if primary is None or len(surfaces) != 1 or primary <= 0 or fees is None or math.isnan(fees):
+        return primary, None
+    return primary, fees / primary
+
+
+def fill_surface_columns(apps, schema_editor):
+    RealEstateListing = apps.get_model('api', 'RealEstateListing')
+    listings = RealEstateListing.objects.only('id', 'surface', 'condominium_expenses').order_by('id')
+    last_id = 0
+    while True:
+        batch = list(listings.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        for listing in batch:
+            listing.primary_surface, listing.fees_per_sqm = surface_columns(
+                listing.surface, listing.condominium_expenses
+            )
+        RealEstateListing.objects.bulk_update(batch, ['primary_surface', 'fees_per_sqm'], batch_size=BATCH_SIZE)
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_import_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='realestatelisting',
+            name='fees_per_sqm',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='realestatelisting',
+            name='primary_surface',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(fill_surface_columns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_listing_surface_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AreaSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dept_code', models.CharField(blank=True, db_index=True, max_length=20)),
+                ('postal_code', models.CharField(blank=True, db_index=True, max_length=20)),
+                ('city', models.CharField(blank=True, db_index=True, max_length=255)),
+                ('count', models.IntegerField(default=0)),
+                ('sketches', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dept_code', 'postal_code', 'city'), name='unique_area_sketch')],
+            },
+        ),
+        # Sketches of the listings already imported are built by `manage.py rebuild_statistics`
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:48
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+CITY_ABBREVIATIONS = {
+    'st': 'saint',
+    'ste': 'sainte',
+}
+
+
+def city_key(city):
+    """Frozen copy of api.utils.city_key as of this migration."""
+    if city is None:
+        return ''
+    text = ''.join(
+        char for char in unicodedata.normalize('NFKD', str(city)) if not unicodedata.combining(char)
+    ).casefold()
+    return ' '.join(CITY_ABBREVIATIONS.get(word, word) for word in re.findall(r'[^\W_]+', text))
+
+
+def fill_city_keys(apps, schema_editor):
+    RealEstateListing = apps.get_model('api', 'RealEstateListing')
+    listings = RealEstateListing.objects.only('id', 'city').order_by('id')
+    last_id = 0
+    while True:
+        batch = list(listings.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        for listing in batch:
+            listing.city_key = city_key(listing.city)
+        RealEstateListing.objects.bulk_update(batch, ['city_key'], batch_size=BATCH_SIZE)
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_area_sketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='realestatelisting',
+            name='city_key',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+        # City statistics and sketches are rekeyed by `manage.py rebuild_statistics`
+        migrations.RunPython(fill_city_keys, migrations.RunPython.noop),
+    ]
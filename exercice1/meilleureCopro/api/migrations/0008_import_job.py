@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_listing_city_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('bienici', 'BIENICI'), ('csv', 'CSV')], max_length=20)),
+                ('status', models.CharField(choices=[('queued', 'QUEUED'), ('running', 'RUNNING'), ('succeeded', 'SUCCEEDED'), ('failed', 'FAILED')], db_index=True, default='queued', max_length=20)),
+                ('params', models.JSONField(default=dict)),
+                ('rows_done', models.BigIntegerField(default=0)),
+                ('rows_total', models.BigIntegerField(blank=True, null=True)),
+                ('result', models.JSONField(default=dict)),
+                ('errors', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
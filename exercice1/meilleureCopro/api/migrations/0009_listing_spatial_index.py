@@ -0,0 +1,59 @@
+from django.db import migrations
+
+
+class SQLiteRunSQL(migrations.RunSQL):
+    """RunSQL applied on SQLite only: other databases filter the coordinate columns directly."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_import_job'),
+    ]
+
+    operations = [
+        SQLiteRunSQL(
+            sql=[
+                "CREATE VIRTUAL TABLE IF NOT EXISTS api_listing_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+                """
+                CREATE TRIGGER IF NOT EXISTS api_listing_rtree_insert AFTER INSERT ON api_realestatelisting
+                WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+                BEGIN
+                    INSERT INTO api_listing_rtree VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+                END
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS api_listing_rtree_update AFTER UPDATE OF id, latitude, longitude ON api_realestatelisting
+                BEGIN
+                    DELETE FROM api_listing_rtree WHERE id = OLD.id;
+                    INSERT INTO api_listing_rtree
+                    SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+                    WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+                END
+                """,
+                """
+                CREATE TRIGGER IF NOT EXISTS api_listing_rtree_delete AFTER DELETE ON api_realestatelisting
+                BEGIN
+                    DELETE FROM api_listing_rtree WHERE id = OLD.id;
+                END
+                """,
+                "DELETE FROM api_listing_rtree",
+                "INSERT INTO api_listing_rtree SELECT id, latitude, latitude, longitude, longitude FROM api_realestatelisting "
+                "WHERE latitude IS NOT NULL AND longitude IS NOT NULL",
+            ],
+            reverse_sql=[
+                "DROP TRIGGER IF EXISTS api_listing_rtree_insert",
+                "DROP TRIGGER IF EXISTS api_listing_rtree_update",
+                "DROP TRIGGER IF EXISTS api_listing_rtree_delete",
+                "DROP TABLE IF EXISTS api_listing_rtree",
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_listing_spatial_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='realestatelisting',
+            index=models.Index(fields=['dept_code', 'property_type'], name='listing_dept_property'),
+        ),
+        migrations.AddIndex(
+            model_name='realestatelisting',
+            index=models.Index(fields=['dept_code', 'heating_mode'], name='listing_dept_heating'),
+        ),
+        migrations.AddIndex(
+            model_name='realestatelisting',
+            index=models.Index(fields=['postal_code', 'heating_mode'], name='listing_postal_heating'),
+        ),
+        migrations.AddIndex(
+            model_name='realestatelisting',
+            index=models.Index(fields=['city_key', 'property_type'], name='listing_city_property'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:02
+
+from datetime import date, datetime
+
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+
+def parse_publication_date(value):
+    """Frozen copy of api.utils.parse_publication_date as of this migration."""
+    if not value:
+        return None
+    text = str(value).strip()[:10]
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(text, '%d/%m/%Y').date()
+    except ValueError:
+        return None
+
+
+def fill_publication_dates(apps, schema_editor):
+    RealEstateListing = apps.get_model('api', 'RealEstateListing')
+    listings = RealEstateListing.objects.only('id', 'publication_start_date').order_by('id')
+    last_id = 0
+    while True:
+        batch = list(listings.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        for listing in batch:
+            listing.publication_date = parse_publication_date(listing.publication_start_date)
+        RealEstateListing.objects.bulk_update(batch, ['publication_date'], batch_size=BATCH_SIZE)
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_listing_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query_type', models.CharField(choices=[('department', 'DEPARTMENT'), ('city', 'CITY'), ('postal_code', 'POSTAL_CODE')], max_length=20)),
+                ('query_value', models.CharField(max_length=255)),
+                ('month', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('mean_price', models.FloatField(default=0.0)),
+                ('mean_surface', models.FloatField(default=0.0)),
+                ('mean_fees', models.FloatField(default=0.0)),
+                ('mean_fees_per_sqm', models.FloatField(default=0.0)),
+                ('quantile_10_price', models.FloatField(default=0.0)),
+                ('quantile_90_price', models.FloatField(default=0.0)),
+                ('quantile_10_surface', models.FloatField(default=0.0)),
+                ('quantile_90_surface', models.FloatField(default=0.0)),
+                ('quantile_10_fees', models.FloatField(default=0.0)),
+                ('quantile_90_fees', models.FloatField(default=0.0)),
+                ('quantile_10_fees_per_sqm', models.FloatField(default=0.0)),
+                ('quantile_90_fees_per_sqm', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='realestatelisting',
+            name='publication_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='realestatelisting',
+            index=models.Index(fields=['dept_code', 'publication_date'], name='listing_dept_published'),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlystatistics',
+            constraint=models.UniqueConstraint(fields=('query_type', 'query_value', 'month'), name='unique_monthly_statistics'),
+        ),
+        # The monthly statistics are built by `manage.py rebuild_statistics`
+        migrations.RunPython(fill_publication_dates, migrations.RunPython.noop),
+    ]
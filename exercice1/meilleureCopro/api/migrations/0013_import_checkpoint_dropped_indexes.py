@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_import_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importcheckpoint',
+            name='dropped_indexes',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -1,5 +1,10 @@
 from django.db import models
-from .utils import PropertyTypes, MarketingTypes, HeatingModes, BuildingTypes
+from django.utils import timezone
+from .surface import derived_surface_columns
+from .utils import (
+    PropertyTypes, MarketingTypes, HeatingModes, BuildingTypes, QueryTypes, ImportJobKinds, ImportJobStatuses, city_key,
+    parse_publication_date,
+)
 
 class RealEstateListing(models.Model):
     """Model for real estate listings data."""
@@ -11,6 +16,8 @@ class RealEstateListing(models.Model):
     dept_code = models.IntegerField(null=True, blank=True, db_index=True )
     postal_code = models.IntegerField(null=True, blank=True, db_index=True)
     city = models.CharField(max_length=255, db_index=True)
+    # utils.city_key of city, for indexed case and accent insensitive lookups
+    city_key = models.CharField(max_length=255, blank=True, default='', db_index=True)
 
     insee_code = models.IntegerField(null=True, blank=True)
 
@@ -23,6 +30,9 @@ class RealEstateListing(models.Model):
     description = models.TextField(null=True, blank=True)
 
     surface = models.JSONField(null=True, blank=True) #planned in m²
+    # Denormalized from surface and condominium_expenses for SQL aggregation and filtering
+    primary_surface = models.FloatField(null=True, blank=True, db_index=True)
+    fees_per_sqm = models.FloatField(null=True, blank=True, db_index=True)
     condominium_expenses = models.FloatField(null=True, blank=True)
     caretaker = models.BooleanField(null=True, blank=True)
     heating_mode = models.CharField(max_length=255, choices=HeatingModes.choices())
@@ -46,6 +56,156 @@ class RealEstateListing(models.Model):
     small_building = models.BooleanField(null=True, blank=True)
     corner_building = models.BooleanField(null=True, blank=True)
     publication_start_date = models.CharField(max_length=255, null=True, blank=True)
+    # Parsed publication_start_date, kept in sync on save and import
+    publication_date = models.DateField(null=True, blank=True, db_index=True)
     dealer_name = models.CharField(max_length=255, null=True, blank=True)
     dealer_type = models.CharField(max_length=255, null=True, blank=True)
-    energy_classification = models.CharField(max_length=3, null=True, blank=True)
\ No newline at end of file
+    energy_classification = models.CharField(max_length=3, null=True, blank=True)
+
+    content_hash = models.CharField(max_length=32, null=True, blank=True)
+
+    class Meta:
+        # Area + attribute pairs most often combined by the filtered statistics
+        indexes = [
+            models.Index(fields=['dept_code', 'property_type'], name='listing_dept_property'),
+            models.Index(fields=['dept_code', 'heating_mode'], name='listing_dept_heating'),
+            models.Index(fields=['postal_code', 'heating_mode'], name='listing_postal_heating'),
+            models.Index(fields=['city_key', 'property_type'], name='listing_city_property'),
+            models.Index(fields=['dept_code', 'publication_date'], name='listing_dept_published'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Keep the denormalized city key, surface and date columns in sync with their source fields."""
+        self.city_key = city_key(self.city)
+        self.publication_date = parse_publication_date(self.publication_start_date)
+        (self.primary_surface,), (self.fees_per_sqm,) = derived_surface_columns(
+            [self.surface], [self.condominium_expenses]
+        )
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'city_key', 'primary_surface', 'fees_per_sqm', 'publication_date'}
+        super().save(*args, **kwargs)
+
+
+class AreaStatistics(models.Model):
+    """Precomputed listing statistics of a department, city or postal code."""
+
+    query_type = models.CharField(max_length=20, choices=QueryTypes.choices())
+    query_value = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    mean_price = models.FloatField(default=0.0)
+    mean_surface = models.FloatField(default=0.0)
+    mean_fees = models.FloatField(default=0.0)
+    mean_fees_per_sqm = models.FloatField(default=0.0)
+    quantile_10_price = models.FloatField(default=0.0)
+    quantile_90_price = models.FloatField(default=0.0)
+    quantile_10_surface = models.FloatField(default=0.0)
+    quantile_90_surface = models.FloatField(default=0.0)
+    quantile_10_fees = models.FloatField(default=0.0)
+    quantile_90_fees = models.FloatField(default=0.0)
+    quantile_10_fees_per_sqm = models.FloatField(default=0.0)
+    quantile_90_fees_per_sqm = models.FloatField(default=0.0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['query_type', 'query_value'], name='unique_area_statistics'),
+        ]
+
+
+class MonthlyStatistics(models.Model):
+    """Precomputed listing statistics of a department, city or postal code for one publication month."""
+
+    query_type = models.CharField(max_length=20, choices=QueryTypes.choices())
+    query_value = models.CharField(max_length=255)
+    month = models.DateField()  # first day of the month
+    count = models.IntegerField(default=0)
+
+    mean_price = models.FloatField(default=0.0)
+    mean_surface = models.FloatField(default=0.0)
+    mean_fees = models.FloatField(default=0.0)
+    mean_fees_per_sqm = models.FloatField(default=0.0)
+    quantile_10_price = models.FloatField(default=0.0)
+    quantile_90_price = models.FloatField(default=0.0)
+    quantile_10_surface = models.FloatField(default=0.0)
+    quantile_90_surface = models.FloatField(default=0.0)
+    quantile_10_fees = models.FloatField(default=0.0)
+    quantile_90_fees = models.FloatField(default=0.0)
+    quantile_10_fees_per_sqm = models.FloatField(default=0.0)
+    quantile_90_fees_per_sqm = models.FloatField(default=0.0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['query_type', 'query_value', 'month'], name='unique_monthly_statistics'),
+        ]
+
+
+class AreaSketch(models.Model):
+    """
+    Quantile sketches of the listing metrics of a (department, postal code,
+    city) cell, '' standing for a missing value. The sketches of an area are
+    the merge of the sketches of its cells.
+    """
+
+    dept_code = models.CharField(max_length=20, blank=True, db_index=True)
+    postal_code = models.CharField(max_length=20, blank=True, db_index=True)
+    city = models.CharField(max_length=255, blank=True, db_index=True)
+    count = models.IntegerField(default=0)
+    sketches = models.JSONField(default=dict)  # metric -> QuantileSketch.to_dict()
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dept_code', 'postal_code', 'city'], name='unique_area_sketch'),
+        ]
+
+
+class ImportCheckpoint(models.Model):
+    """Progress of an import_listings run, used to resume an interrupted import."""
+
+    source = models.CharField(max_length=1024)
+    source_signature = models.CharField(max_length=255)
+    rows_done = models.BigIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    # [name, sql] of the listing indexes dropped by a running sqlite-fast load
+    dropped_indexes = models.JSONField(default=list, blank=True)
+
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['source', 'source_signature'], name='import_checkpoint_source'),
+        ]
+
+
+class ImportJob(models.Model):
+    """Listing import run in the background by the api.jobs worker pool."""
+
+    kind = models.CharField(max_length=20, choices=ImportJobKinds.choices())
+    status = models.CharField(
+        max_length=20, choices=ImportJobStatuses.choices(), default=ImportJobStatuses.QUEUED.value, db_index=True
+    )
+    params = models.JSONField(default=dict)
+    rows_done = models.BigIntegerField(default=0)
+    rows_total = models.BigIntegerField(null=True, blank=True)
+    result = models.JSONField(default=dict)
+    errors = models.JSONField(default=list)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Last progress of a running job, see api.jobs.fail_stale_jobs
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def rows_per_second(self):
+        """Throughput of the job, None before it starts."""
+        if self.started_at is None:
+            return None
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return self.rows_done / elapsed if elapsed > 0 else 0.0
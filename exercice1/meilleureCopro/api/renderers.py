@@ -0,0 +1,27 @@
+"""
+JSON rendering of the statistics endpoints.
+
+orjson, an optional dependency, encodes responses several times faster than
+the json module behind DRF's JSONRenderer, with the same compact UTF-8
+output. Without orjson, or for data it cannot encode (lazy translations,
+indented output requested through the Accept header), rendering falls back
+to JSONRenderer.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer encoding with orjson when it is installed."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
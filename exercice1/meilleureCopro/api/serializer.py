@@ -1,17 +1,77 @@
+import math
+
 from rest_framework import serializers
-from .models import RealEstateListing
+from .export import EXPORT_FORMATS, LISTING_FIELDS
+from .filters import ENERGY_CLASSIFICATIONS, GROUP_BY_FIELDS, LISTING_FILTERS
+from .models import ImportJob, RealEstateListing
+from .spatial import SPATIAL_QUERY_TYPES, parse_spatial_value
+from .statistics import METRICS, STATISTIC_FIELDS
+from .utils import HeatingModes, PropertyTypes
 
 class RealEstateListingSerializer(serializers.ModelSerializer):
     class Meta:
         model = RealEstateListing
         fields = '__all__'
 
+    def __init__(self, *args, fields=None, **kwargs):
+        """``fields`` restricts the serialized fields, e.g. to those of an ``.only()`` projection."""
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 class BienIciImportSerializer(serializers.Serializer):
     url = serializers.URLField(
         help_text="BienIci listing URL (e.g. https://www.bienici.com/annonce/orpi-1-099934E0KUR9)"
     )
 
-class StatisticsQuerySerializer(serializers.Serializer):
+class BienIciBulkImportSerializer(serializers.Serializer):
+    MAX_URLS = 500
+
+    urls = serializers.ListField(
+        child=serializers.URLField(),
+        allow_empty=False,
+        max_length=MAX_URLS,
+        help_text="BienIci listing URLs"
+    )
+
+class ImportJobRequestSerializer(serializers.Serializer):
+    KINDS = (
+        ('bienici', 'BienIci URLs'),
+        ('csv', 'CSV dataset'),
+    )
+
+    kind = serializers.ChoiceField(choices=KINDS)
+    urls = serializers.ListField(child=serializers.URLField(), allow_empty=False, required=False)
+    file = serializers.CharField(
+        max_length=1024,
+        required=False,
+        help_text="Dataset file name, relative to IMPORT_DATA_DIR"
+    )
+    engine = serializers.ChoiceField(choices=('orm', 'sqlite-fast'), default='orm')
+    restart = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if data['kind'] == 'bienici' and not data.get('urls'):
+            raise serializers.ValidationError("A BienIci import needs 'urls'.")
+        if data['kind'] == 'csv' and not data.get('file'):
+            raise serializers.ValidationError("A CSV import needs 'file'.")
+        return data
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    rows_per_second = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            'id', 'kind', 'status', 'params', 'rows_done', 'rows_total', 'rows_per_second',
+            'result', 'errors', 'created_at', 'started_at', 'finished_at',
+        ]
+
+# Layouts of the statistics responses: one object per area, or lists of values in STATISTIC_FIELDS order
+RESPONSE_LAYOUTS = ('object', 'compact')
+
+class AreaSerializer(serializers.Serializer):
     QUERY_TYPES = (
         ('department', 'Department'),
         ('city', 'City'),
@@ -21,6 +81,186 @@ class StatisticsQuerySerializer(serializers.Serializer):
     query_type = serializers.ChoiceField(choices=QUERY_TYPES)
     query_value = serializers.CharField(max_length=255)
 
+def validate_spatial_value(data):
+    """Check the query value of radius and bounding box queries."""
+    if data['query_type'] in SPATIAL_QUERY_TYPES:
+        try:
+            parse_spatial_value(data['query_type'], data['query_value'])
+        except ValueError as e:
+            raise serializers.ValidationError({'query_value': str(e)})
+
+class ListingFilterSerializer(serializers.Serializer):
+    """Listing filters, see api.filters.LISTING_FILTERS."""
+    property_type = serializers.ChoiceField(choices=PropertyTypes.choices(), required=False)
+    elevator = serializers.BooleanField(required=False, allow_null=True)
+    caretaker = serializers.BooleanField(required=False, allow_null=True)
+    heating_mode = serializers.ChoiceField(choices=HeatingModes.choices(), required=False)
+    energy_classification = serializers.ChoiceField(choices=ENERGY_CLASSIFICATIONS, required=False)
+    construction_year_min = serializers.IntegerField(required=False, min_value=1000, max_value=2100)
+    construction_year_max = serializers.IntegerField(required=False, min_value=1000, max_value=2100)
+    lot_count_min = serializers.IntegerField(required=False, min_value=0)
+    lot_count_max = serializers.IntegerField(required=False, min_value=0)
+
+    @staticmethod
+    def validate_ranges(data):
+        for field in ('construction_year', 'lot_count'):
+            low, high = data.get(f'{field}_min'), data.get(f'{field}_max')
+            if low is not None and high is not None and low > high:
+                raise serializers.ValidationError({f'{field}_min': f"Must not exceed {field}_max."})
+
+    @staticmethod
+    def filters(data):
+        """Listing filters of validated data."""
+        return {name: data[name] for name in LISTING_FILTERS if data.get(name) is not None}
+
+class StatisticsQuerySerializer(ListingFilterSerializer, AreaSerializer):
+    QUERY_TYPES = AreaSerializer.QUERY_TYPES + (
+        ('radius', 'Radius (lat,lng,km)'),
+        ('bbox', 'Bounding box (min_lat,min_lng,max_lat,max_lng)'),
+    )
+
+    query_type = serializers.ChoiceField(choices=QUERY_TYPES)
+    backend = serializers.ChoiceField(
+        choices=('numpy', 'sql', 'sketch', 'snapshot'),
+        required=False,
+        help_text="Compute the statistics live with this backend, bypassing the cache and precomputed statistics"
+    )
+
+    group_by = serializers.ChoiceField(
+        choices=GROUP_BY_FIELDS,
+        required=False,
+        help_text="Also return the statistics of the listings grouped by this field, numeric fields in buckets"
+    )
+    layout = serializers.ChoiceField(
+        choices=RESPONSE_LAYOUTS,
+        default='object',
+        help_text="'compact' returns the statistics as a list of values, named once by 'fields'"
+    )
+
+    def validate(self, data):
+        validate_spatial_value(data)
+        self.validate_ranges(data)
+        if data.get('backend') and (self.filters(data) or data.get('group_by')):
+            raise serializers.ValidationError("Filters and group_by are computed by a single query, without 'backend'.")
+        return data
+
+class ListingQuerySerializer(ListingFilterSerializer):
+    MAX_LIMIT = 1000
+
+    query_type = serializers.ChoiceField(choices=StatisticsQuerySerializer.QUERY_TYPES, required=False)
+    query_value = serializers.CharField(max_length=255, required=False)
+    fields = serializers.CharField(
+        required=False,
+        help_text="Comma separated listing fields to return (default: every field)"
+    )
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=MAX_LIMIT,
+        required=False,
+        help_text="Listings per page (default: 100)"
+    )
+
+    def validate_fields(self, value):
+        fields = list(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+        unknown = [field for field in fields if field not in LISTING_FIELDS]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown fields: {', '.join(unknown)}.")
+        return fields
+
+    def validate(self, data):
+        if ('query_type' in data) != ('query_value' in data):
+            raise serializers.ValidationError("Provide both 'query_type' and 'query_value', or neither.")
+        if 'query_type' in data:
+            validate_spatial_value(data)
+        self.validate_ranges(data)
+        # The primary key is the pagination cursor
+        data['fields'] = ['id', *(field for field in data.get('fields', LISTING_FIELDS) if field != 'id')]
+        return data
+
+class ListingExportQuerySerializer(ListingQuerySerializer):
+    format = serializers.ChoiceField(choices=tuple(EXPORT_FORMATS), default='ndjson')
+
+class HistogramQuerySerializer(AreaSerializer):
+    MAX_BINS = 200
+
+    query_type = serializers.ChoiceField(choices=StatisticsQuerySerializer.QUERY_TYPES)
+    metric = serializers.ChoiceField(choices=METRICS, default='fees_per_sqm')
+    bins = serializers.IntegerField(
+        min_value=1,
+        max_value=MAX_BINS,
+        required=False,
+        help_text="Number of equal-width bins spanning the values (default: 20)"
+    )
+    edges = serializers.CharField(
+        required=False,
+        help_text="Comma separated increasing bin edges, e.g. 0,10,20,40,80"
+    )
+
+    def validate_edges(self, value):
+        try:
+            edges = [float(edge) for edge in value.split(',')]
+        except ValueError:
+            raise serializers.ValidationError("Edges must be comma separated numbers.")
+        if not 2 <= len(edges) <= self.MAX_BINS + 1:
+            raise serializers.ValidationError(f"Between 2 and {self.MAX_BINS + 1} edges are expected.")
+        if not all(math.isfinite(edge) for edge in edges) or any(a >= b for a, b in zip(edges, edges[1:])):
+            raise serializers.ValidationError("Edges must be finite and strictly increasing.")
+        return tuple(edges)
+
+    def validate(self, data):
+        validate_spatial_value(data)
+        if 'bins' in data and 'edges' in data:
+            raise serializers.ValidationError("Provide either 'bins' or 'edges'.")
+        data['bins'] = data.pop('edges', None) or data.get('bins', 20)
+        return data
+
+class TimeseriesQuerySerializer(AreaSerializer):
+    metric = serializers.ChoiceField(choices=METRICS, default='fees_per_sqm')
+    start = serializers.DateField(
+        input_formats=['%Y-%m'], required=False, help_text="First month of the series, e.g. 2023-01"
+    )
+    end = serializers.DateField(
+        input_formats=['%Y-%m'], required=False, help_text="Last month of the series, e.g. 2023-12"
+    )
+
+    def validate(self, data):
+        if 'start' in data and 'end' in data and data['start'] > data['end']:
+            raise serializers.ValidationError({'start': "Must not be after end."})
+        return data
+
+class StatisticsBatchSerializer(serializers.Serializer):
+    MAX_AREAS = 1000
+
+    areas = AreaSerializer(many=True, required=False, max_length=MAX_AREAS)
+    all = serializers.ChoiceField(
+        choices=AreaSerializer.QUERY_TYPES,
+        required=False,
+        help_text="Return the statistics of every area of this type instead of a list of areas, page by page"
+    )
+    after = serializers.CharField(
+        max_length=255,
+        required=False,
+        help_text="With 'all', start after this area value, the 'next' of the previous page"
+    )
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=MAX_AREAS,
+        default=MAX_AREAS,
+        help_text="With 'all', areas per page (default and at most: 1000)"
+    )
+    layout = serializers.ChoiceField(
+        choices=RESPONSE_LAYOUTS,
+        default='object',
+        help_text="'compact' returns one list of values per area, named once by 'fields'"
+    )
+
+    def validate(self, data):
+        if ('areas' in data) == ('all' in data):
+            raise serializers.ValidationError("Provide either 'areas' or 'all'.")
+        if 'areas' in data and ('after' in data or 'limit' in self.initial_data):
+            raise serializers.ValidationError("'after' and 'limit' page through 'all' only.")
+        return data
+
 class StatisticsResponseSerializer(serializers.Serializer):
     mean_price = serializers.FloatField()
     mean_surface = serializers.FloatField()
@@ -33,4 +273,17 @@ class StatisticsResponseSerializer(serializers.Serializer):
     quantile_10_fees = serializers.FloatField()
     quantile_90_fees = serializers.FloatField()
     quantile_10_fees_per_sqm = serializers.FloatField()
-    quantile_90_fees_per_sqm = serializers.FloatField()
\ No newline at end of file
+    quantile_90_fees_per_sqm = serializers.FloatField()
+
+    @staticmethod
+    def lean_data(stats):
+        """
+        Representation of statistics computed by the app, the one ``data``
+        gives, without the cost of validating and serializing trusted floats.
+        """
+        return {field: float(stats[field]) for field in STATISTIC_FIELDS}
+
+    @staticmethod
+    def compact_data(stats):
+        """Statistic values in STATISTIC_FIELDS order, for the compact layout."""
+        return [float(stats[field]) for field in STATISTIC_FIELDS]
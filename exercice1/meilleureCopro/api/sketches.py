@@ -0,0 +1,316 @@
+"""
+Mergeable quantile sketches of the listing metrics.
+
+A sketch keeps the count of values falling in logarithmic buckets whose
+width is a fixed fraction of their value (DDSketch), so any quantile it
+returns is within ``relative_accuracy`` of the exact one, whatever the number
+of values. Sketches with the same accuracy merge by adding their buckets.
+
+Sketches are stored per (department, postal code, city) cell in AreaSketch,
+the sketches of a department, postal code or city being the merge of its cells.
+"""
+import logging
+import math
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .areas import normalize_area_value
+from .models import AreaSketch, RealEstateListing
+from .statistics import METRICS, QUANTILES, STATISTIC_COLUMNS, STATISTIC_FIELDS, interpolate, quantile_neighbours
+
+logger = logging.getLogger(__name__)
+
+CELL_FIELDS = {
+    'department': 'dept_code',
+    'postal_code': 'postal_code',
+    'city': 'city',
+}
+
+
+class QuantileSketch:
+    """Relative-error quantile sketch of a stream of numbers, missing (NaN) values being ignored."""
+
+    def __init__(self, relative_accuracy):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"The relative accuracy must be between 0 and 1, not {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.count = 0
+        self.sum = 0.0
+        self.zeros = 0
+        self.positive = Counter()
+        self.negative = Counter()
+
+    def add(self, values):
+        """Add an array of values."""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not values.size:
+            return
+        self.count += int(values.size)
+        self.sum += float(values.sum())
+        self.zeros += int(np.count_nonzero(values == 0))
+        for bins, magnitudes in ((self.positive, values[values > 0]), (self.negative, -values[values < 0])):
+            if magnitudes.size:
+                indexes, counts = np.unique(np.ceil(np.log(magnitudes) / self._log_gamma), return_counts=True)
+                bins.update(dict(zip(indexes.astype(int).tolist(), counts.tolist())))
+
+    def merge(self, other):
+        """Add the values of another sketch with the same accuracy."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracies")
+        self.count += other.count
+        self.sum += other.sum
+        self.zeros += other.zeros
+        self.positive.update(other.positive)
+        self.negative.update(other.negative)
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def quantiles(self, quantiles=QUANTILES):
+        """
+        Approximate quantiles, interpolated between ranks like ``np.quantile``,
+        0.0 when the sketch is empty.
+        """
+        if not self.count:
+            return tuple(0.0 for _ in quantiles)
+        neighbours = [quantile_neighbours(self.count, quantile) for quantile in quantiles]
+        ranks = sorted({rank for lower, upper, _ in neighbours for rank in (lower, upper)})
+
+        values, seen, wanted = {}, 0, iter(ranks)
+        rank = next(wanted)
+        for value, count in self._sorted_bins():
+            seen += count
+            while rank is not None and rank < seen:
+                values[rank] = value
+                rank = next(wanted, None)
+            if rank is None:
+                break
+        return tuple(interpolate(values[lower], values[upper], weight) for lower, upper, weight in neighbours)
+
+    def _value(self, index):
+        # Value of a bucket whose relative distance to every value of the bucket is at most the accuracy
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def _sorted_bins(self):
+        for index in sorted(self.negative, reverse=True):
+            yield -self._value(index), self.negative[index]
+        if self.zeros:
+            yield 0.0, self.zeros
+        for index in sorted(self.positive):
+            yield self._value(index), self.positive[index]
+
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'count': self.count,
+            'sum': self.sum,
+            'zeros': self.zeros,
+            'positive': {str(index): count for index, count in self.positive.items()},
+            'negative': {str(index): count for index, count in self.negative.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'])
+        sketch.count = data['count']
+        sketch.sum = data['sum']
+        sketch.zeros = data['zeros']
+        sketch.positive = Counter({int(index): count for index, count in data['positive'].items()})
+        sketch.negative = Counter({int(index): count for index, count in data['negative'].items()})
+        return sketch
+
+
+def listing_cell(dept_code, postal_code, city):
+    """Normalized (department, postal code, city) cell of a listing, '' standing for a missing value."""
+    return tuple(
+        normalize_area_value(query_type, value) or ''
+        for query_type, value in (('department', dept_code), ('postal_code', postal_code), ('city', city))
+    )
+
+
+def build_cell_sketches(rows, relative_accuracy):
+    """
+    Sketch rows of (dept_code, postal_code, city, *STATISTIC_COLUMNS) grouped
+    by cell. Returns {cell: (count, {metric: QuantileSketch})}.
+    """
+    groups = defaultdict(list)
+    for row in rows:
+        groups[row[:3]].append(row[3:])
+
+    cells = {}
+    for location, values in groups.items():
+        cell = listing_cell(*location)
+        if cell not in cells:
+            cells[cell] = (0, {metric: QuantileSketch(relative_accuracy) for metric in METRICS})
+        count, sketches = cells[cell]
+        columns = np.array(values, dtype=float).reshape(-1, len(STATISTIC_COLUMNS)).T
+        for metric, column in zip(METRICS, columns):
+            sketches[metric].add(column)
+        cells[cell] = (count + len(values), sketches)
+    return cells
+
+
+def _sketch_rows(listings):
+    return listings.values_list('dept_code', 'postal_code', 'city', *STATISTIC_COLUMNS).iterator(chunk_size=10000)
+
+
+def _area_sketch(cell, count, sketches):
+    dept_code, postal_code, city = cell
+    return AreaSketch(
+        dept_code=dept_code,
+        postal_code=postal_code,
+        city=city,
+        count=count,
+        sketches={metric: sketch.to_dict() for metric, sketch in sketches.items()},
+    )
+
+
+def _save_cells(cells):
+    AreaSketch.objects.bulk_create(
+        [_area_sketch(cell, count, sketches) for cell, (count, sketches) in cells.items()],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['dept_code', 'postal_code', 'city'],
+        update_fields=['count', 'sketches', 'updated_at'],
+    )
+
+
+def add_listings_to_sketches(rows):
+    """
+    Add new listings, as RealEstateListing keyword arguments, to the sketches
+    of their cells. Must run in a transaction. The cells written by a
+    concurrent add between the read and the write of their sketches are
+    merged again, so that no listing is lost.
+    """
+    if not rows:
+        return
+    cells = build_cell_sketches(
+        [tuple(row[field] for field in ('dept_code', 'postal_code', 'city', *STATISTIC_COLUMNS)) for row in rows],
+        settings.STATISTICS_SKETCH_RELATIVE_ACCURACY,
+    )
+    while cells:
+        cells = {cell: cells[cell] for cell in _merge_cells(cells)}
+
+
+def _merge_cells(cells):
+    """
+    Merge {cell: (count, sketches)} into the stored sketches of the cells. A
+    stored sketch is only replaced if it is still the one read, like a row
+    lock but on every database. Returns the cells written meanwhile.
+    """
+    stored = AreaSketch.objects.filter(
+        dept_code__in={dept_code for dept_code, _, _ in cells},
+        postal_code__in={postal_code for _, postal_code, _ in cells},
+    )
+    conflicts, new_cells = set(), dict(cells)
+    now = timezone.now()
+    for area_sketch in stored:
+        cell = (area_sketch.dept_code, area_sketch.postal_code, area_sketch.city)
+        if cell not in cells:
+            continue
+        count, sketches = new_cells.pop(cell)
+        merged = {metric: QuantileSketch.from_dict(data) for metric, data in area_sketch.sketches.items()}
+        for metric, sketch in sketches.items():
+            merged[metric].merge(sketch)
+        updated = AreaSketch.objects.filter(
+            id=area_sketch.id, count=area_sketch.count, updated_at=area_sketch.updated_at
+        ).update(
+            count=area_sketch.count + count,
+            sketches={metric: sketch.to_dict() for metric, sketch in merged.items()},
+            updated_at=now,
+        )
+        if not updated:
+            conflicts.add(cell)
+
+    if new_cells:
+        try:
+            with transaction.atomic():
+                AreaSketch.objects.bulk_create(
+                    [_area_sketch(cell, count, sketches) for cell, (count, sketches) in new_cells.items()],
+                    batch_size=1000,
+                )
+        except IntegrityError:
+            # Some of the cells were created meanwhile, merge them all again
+            conflicts |= new_cells.keys()
+    return conflicts
+
+
+def rebuild_sketch_cells(cells):
+    """
+    Recompute the sketches of the given cells from their listings, needed when
+    listings are modified: values cannot be removed from a sketch.
+    """
+    cells = set(cells)
+    if not cells:
+        return
+    # Select a superset of the listings of the cells, grouped exactly in Python
+    condition = Q(pk__in=[])
+    dept_codes = {int(dept_code) for dept_code, _, _ in cells if dept_code}
+    postal_codes = {int(postal_code) for _, postal_code, _ in cells if postal_code}
+    if dept_codes:
+        condition |= Q(dept_code__in=dept_codes)
+    if postal_codes:
+        condition |= Q(postal_code__in=postal_codes)
+    if any(not dept_code and not postal_code for dept_code, postal_code, _ in cells):
+        condition |= Q(dept_code__isnull=True, postal_code__isnull=True)
+
+    rebuilt = {
+        cell: value
+        for cell, value in build_cell_sketches(
+            _sketch_rows(RealEstateListing.objects.filter(condition)), settings.STATISTICS_SKETCH_RELATIVE_ACCURACY
+        ).items()
+        if cell in cells
+    }
+    with transaction.atomic():
+        for dept_code, postal_code, city in cells - rebuilt.keys():
+            AreaSketch.objects.filter(dept_code=dept_code, postal_code=postal_code, city=city).delete()
+        _save_cells(rebuilt)
+
+
+def rebuild_area_sketches():
+    """Recompute the sketches of every cell from scratch, returns the number of cells."""
+    cells = build_cell_sketches(
+        _sketch_rows(RealEstateListing.objects.all()), settings.STATISTICS_SKETCH_RELATIVE_ACCURACY
+    )
+    with transaction.atomic():
+        AreaSketch.objects.all().delete()
+        _save_cells(cells)
+    logger.info(f"Rebuilt sketches of {len(cells)} cells")
+    return len(cells)
+
+
+def sketch_area_statistics(query_type, query_value):
+    """
+    Compute (count, statistics) of an area by merging the sketches of its
+    cells: means are exact, quantiles within the sketch relative accuracy.
+    """
+    normalized = normalize_area_value(query_type, query_value)
+    if normalized is None:
+        return 0, None
+
+    count, merged = 0, {}
+    for area_sketch in AreaSketch.objects.filter(**{CELL_FIELDS[query_type]: normalized}):
+        count += area_sketch.count
+        for metric in METRICS:
+            sketch = QuantileSketch.from_dict(area_sketch.sketches[metric])
+            if metric in merged:
+                merged[metric].merge(sketch)
+            else:
+                merged[metric] = sketch
+    if not count:
+        return 0, None
+
+    stats = {}
+    for metric in METRICS:
+        stats[f'mean_{metric}'] = merged[metric].mean()
+        stats[f'quantile_10_{metric}'], stats[f'quantile_90_{metric}'] = merged[metric].quantiles()
+    return count, {field: stats[field] for field in STATISTIC_FIELDS}
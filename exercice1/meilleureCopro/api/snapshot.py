@@ -0,0 +1,199 @@
+"""
+Columnar on-disk snapshot of the listing statistic columns.
+
+The snapshot holds one ``.npy`` file per column, rows sorted by department
+then postal code, and an offset index giving the row ranges of every
+department and postal code. Readers memory-map the files: the statistics of
+an area are computed on zero-copy slices, without any database query, and
+every process serving requests shares the same page-cached copy.
+
+Each export is written to a new version directory and published by
+atomically replacing the ``CURRENT`` pointer file, so readers never see a
+partially written snapshot. Listings written after an export are not in it:
+the write paths record the time of their last write in the ``LAST_WRITE``
+file of the directory, and readers only serve from a snapshot exported after
+it, without any per-area query.
+"""
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+
+from .areas import normalize_area_value
+from .statistics import STATISTIC_COLUMNS, compute_statistics
+
+logger = logging.getLogger(__name__)
+
+AREA_COLUMNS = ('dept_code', 'postal_code')
+SNAPSHOT_COLUMNS = AREA_COLUMNS + STATISTIC_COLUMNS
+INDEXED_AREAS = {
+    'department': 'dept_code',
+    'postal_code': 'postal_code',
+}
+MISSING_CODE = -1
+
+# Previous versions kept on disk for readers still using them
+KEEP_VERSIONS = 2
+
+# Time of the last listing write, as written by record_write
+WRITE_MARKER = 'LAST_WRITE'
+
+
+def _offset_index(codes):
+    """
+    Row ranges of every department and postal code of the sorted (dept_code,
+    postal_code) codes: {query_type: {normalized code: [[start, end], ...]}}.
+    """
+    index = {'department': {}, 'postal_code': {}}
+    boundaries = np.flatnonzero((codes[1:] != codes[:-1]).any(axis=1)) + 1
+    starts = [0, *boundaries.tolist()] if len(codes) else []
+    ends = [*boundaries.tolist(), len(codes)] if len(codes) else []
+    for start, end in zip(starts, ends):
+        for query_type, code in zip(('department', 'postal_code'), codes[start].tolist()):
+            if code == MISSING_CODE:
+                continue
+            ranges = index[query_type].setdefault(str(code), [])
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+    return index
+
+
+def write_snapshot(directory, rows):
+    """
+    Write rows of SNAPSHOT_COLUMNS as a new snapshot version in ``directory``
+    and publish it. Returns the number of rows written.
+    """
+    # Taken before a lazy queryset of rows is read
+    exported_at = time.time()
+    data = np.array(rows, dtype=float).reshape(-1, len(SNAPSHOT_COLUMNS))
+    codes = np.where(np.isnan(data[:, :2]), MISSING_CODE, data[:, :2]).astype(np.int32)
+    # Stable sort: rows of an area keep their original (id) order
+    order = np.lexsort((codes[:, 1], codes[:, 0]))
+    codes, data = codes[order], data[order]
+
+    os.makedirs(directory, exist_ok=True)
+    version = str(time.time_ns())
+    version_path = os.path.join(directory, version)
+    os.makedirs(version_path)
+    for index, column in enumerate(AREA_COLUMNS):
+        np.save(os.path.join(version_path, f'{column}.npy'), codes[:, index])
+    for index, column in enumerate(STATISTIC_COLUMNS, start=len(AREA_COLUMNS)):
+        np.save(os.path.join(version_path, f'{column}.npy'), np.ascontiguousarray(data[:, index]))
+
+    index = {'rows': len(data), 'exported_at': exported_at, **_offset_index(codes)}
+    with open(os.path.join(version_path, 'index.json'), 'w') as f:
+        json.dump(index, f)
+
+    pointer = os.path.join(directory, 'CURRENT')
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(version)
+    os.replace(pointer + '.tmp', pointer)
+
+    _remove_old_versions(directory, version)
+    logger.info(f"Wrote snapshot {version} of {len(data)} listings to {directory}")
+    return len(data)
+
+
+def record_write(directory):
+    """Record that listings were written now: the snapshots of ``directory`` exported before are stale."""
+    os.makedirs(directory, exist_ok=True)
+    marker = os.path.join(directory, WRITE_MARKER)
+    with open(marker + '.tmp', 'w') as f:
+        f.write(repr(time.time()))
+    os.replace(marker + '.tmp', marker)
+
+
+def last_write(directory):
+    """Time of the last write recorded in ``directory``, 0.0 when none was."""
+    try:
+        with open(os.path.join(directory, WRITE_MARKER)) as f:
+            return float(f.read())
+    except (FileNotFoundError, ValueError):
+        return 0.0
+
+
+def _remove_old_versions(directory, current):
+    versions = sorted(
+        name for name in os.listdir(directory)
+        if name != current and os.path.isdir(os.path.join(directory, name))
+    )
+    for name in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+class Snapshot:
+    """Memory-mapped snapshot version."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'index.json')) as f:
+            self.index = json.load(f)
+        self.columns = {
+            column: np.load(os.path.join(path, f'{column}.npy'), mmap_mode='r')
+            for column in STATISTIC_COLUMNS
+        }
+        # Snapshots written before the export time was recorded are never current
+        self.exported_at = self.index.get('exported_at', 0.0)
+
+    def is_current(self):
+        """Whether the snapshot was exported after the last write recorded in its directory."""
+        return last_write(os.path.dirname(self.path)) <= self.exported_at
+
+    def has_listings(self, query_type, query_value):
+        """Whether the snapshot indexes listings of the department or postal code."""
+        normalized = normalize_area_value(query_type, query_value) if query_type in INDEXED_AREAS else None
+        return normalized is not None and bool(self.index[query_type].get(normalized))
+
+    def area_columns(self, query_type, query_value, columns=STATISTIC_COLUMNS):
+        """
+        Values of the given columns for the listings of a department or postal
+        code, as arrays, empty when it has no listing. Returns None for areas
+        the snapshot does not index.
+        """
+        if query_type not in INDEXED_AREAS:
+            return None
+        normalized = normalize_area_value(query_type, query_value)
+        ranges = self.index[query_type].get(normalized, []) if normalized is not None else []
+        if len(ranges) == 1:
+            (start, end), = ranges
+            return [self.columns[column][start:end] for column in columns]
+        return [
+            np.concatenate([self.columns[column][start:end] for start, end in ranges] or [np.empty(0)])
+            for column in columns
+        ]
+
+    def area_statistics(self, query_type, query_value):
+        """
+        (count, statistics) of a department or postal code, count being 0 when
+        it has no listing. Returns None for areas the snapshot does not index.
+        """
+        columns = self.area_columns(query_type, query_value)
+        if columns is None:
+            return None
+        if not len(columns[0]):
+            return 0, None
+        return len(columns[0]), compute_statistics(*columns)
+
+
+_loaded = {}
+
+
+def get_snapshot(directory):
+    """Current snapshot of ``directory``, reloaded when a new version is published, None when missing."""
+    pointer = os.path.join(directory, 'CURRENT')
+    try:
+        with open(pointer) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+
+    snapshot = _loaded.get(directory)
+    if snapshot is None or os.path.basename(snapshot.path) != version:
+        snapshot = Snapshot(os.path.join(directory, version))
+        _loaded[directory] = snapshot
+    return snapshot
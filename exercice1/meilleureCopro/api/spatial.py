@@ -0,0 +1,173 @@
+"""
+Radius and bounding box queries of the listings on stock SQLite.
+
+The listing coordinates are mirrored in an R*Tree virtual table kept in sync
+by triggers on the listing table. A query first selects the ids of the
+candidate listings from the R*Tree, whose boxes are stored as 32-bit floats
+rounded outward, then filters their exact coordinates: a radius keeps the
+listings within ``km`` of the center (equirectangular distance, accurate to
+well under 1% at the radii the endpoint accepts). On other databases the
+bounding box filters the coordinate columns directly.
+
+Coordinates are the published ones: listings blurred by ``blur_radius`` are
+placed where the ad shows them.
+"""
+import math
+
+from django.db import connection
+from django.db.models import ExpressionWrapper, F, FloatField
+from django.db.models.expressions import RawSQL
+
+RTREE_TABLE = 'api_listing_rtree'
+LISTING_TABLE = 'api_realestatelisting'
+RTREE_TRIGGERS = {
+    f'{RTREE_TABLE}_insert': f"""
+        CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_insert AFTER INSERT ON {LISTING_TABLE}
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT INTO {RTREE_TABLE} VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END
+    """,
+    f'{RTREE_TABLE}_update': f"""
+        CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_update AFTER UPDATE OF id, latitude, longitude ON {LISTING_TABLE}
+        BEGIN
+            DELETE FROM {RTREE_TABLE} WHERE id = OLD.id;
+            INSERT INTO {RTREE_TABLE}
+            SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END
+    """,
+    f'{RTREE_TABLE}_delete': f"""
+        CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_delete AFTER DELETE ON {LISTING_TABLE}
+        BEGIN
+            DELETE FROM {RTREE_TABLE} WHERE id = OLD.id;
+        END
+    """,
+}
+
+SPATIAL_QUERY_TYPES = ('radius', 'bbox')
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+MAX_RADIUS_KM = 100
+# Coordinate digits kept in normalized query values (about 10 cm)
+COORDINATE_DIGITS = 6
+
+
+def create_spatial_index(db):
+    """
+    Create the R*Tree of the listing coordinates and its triggers on SQLite,
+    filling it when any of them was missing (e.g. the listing table was
+    rebuilt by a migration, which drops its triggers). Does nothing on other
+    databases.
+    """
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name = %s OR (type = 'trigger' AND tbl_name = %s)",
+            [RTREE_TABLE, LISTING_TABLE],
+        )
+        existing = {name for name, in cursor.fetchall()}
+        if existing >= {RTREE_TABLE, *RTREE_TRIGGERS}:
+            return
+
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE} USING rtree(id, min_lat, max_lat, min_lng, max_lng)"
+        )
+        for sql in RTREE_TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(f"DELETE FROM {RTREE_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {RTREE_TABLE} SELECT id, latitude, latitude, longitude, longitude FROM {LISTING_TABLE} "
+            f"WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        )
+
+
+def drop_spatial_index(db):
+    """Drop the R*Tree of the listing coordinates and its triggers."""
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        for name in RTREE_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"DROP TABLE IF EXISTS {RTREE_TABLE}")
+
+
+def parse_spatial_value(query_type, value):
+    """
+    Numbers of a radius ('lat,lng,km') or bounding box
+    ('min_lat,min_lng,max_lat,max_lng') query value. Raises ValueError when
+    the value is malformed or out of range.
+    """
+    try:
+        numbers = tuple(float(part) for part in str(value).split(','))
+    except ValueError:
+        raise ValueError(f"{value!r} is not a list of numbers")
+    if not all(math.isfinite(number) for number in numbers):
+        raise ValueError(f"{value!r} is not a list of finite numbers")
+
+    if query_type == 'radius':
+        if len(numbers) != 3:
+            raise ValueError("A radius is 'lat,lng,km'")
+        lat, lng, km = numbers
+        latitudes, longitudes = (lat,), (lng,)
+        if not 0 < km <= MAX_RADIUS_KM:
+            raise ValueError(f"The radius must be between 0 and {MAX_RADIUS_KM} km")
+    elif query_type == 'bbox':
+        if len(numbers) != 4:
+            raise ValueError("A bounding box is 'min_lat,min_lng,max_lat,max_lng'")
+        min_lat, min_lng, max_lat, max_lng = numbers
+        latitudes, longitudes = (min_lat, max_lat), (min_lng, max_lng)
+        if min_lat > max_lat or min_lng > max_lng:
+            raise ValueError("The minimum coordinates of a bounding box must not exceed its maximum ones")
+    else:
+        raise ValueError(f"Unknown spatial query type: {query_type}")
+
+    if not all(-90 <= lat <= 90 for lat in latitudes) or not all(-180 <= lng <= 180 for lng in longitudes):
+        raise ValueError("Latitudes must be within [-90, 90] and longitudes within [-180, 180]")
+    return numbers
+
+
+def normalize_spatial_value(query_type, value):
+    """Canonical form of a radius or bounding box query value, None when invalid."""
+    try:
+        numbers = parse_spatial_value(query_type, value)
+    except ValueError:
+        return None
+    return ','.join(repr(round(number, COORDINATE_DIGITS)) for number in numbers)
+
+
+def bounding_box(query_type, numbers):
+    """(min_lat, min_lng, max_lat, max_lng) enclosing a parsed radius or bounding box."""
+    if query_type == 'bbox':
+        return numbers
+    lat, lng, km = numbers
+    delta_lat = km / KM_PER_DEGREE
+    delta_lng = km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-9))
+    return (
+        max(lat - delta_lat, -90.0), max(lng - delta_lng, -180.0),
+        min(lat + delta_lat, 90.0), min(lng + delta_lng, 180.0),
+    )
+
+
+def filter_spatial(query_type, value, queryset):
+    """Listings of ``queryset`` within a radius or bounding box query value."""
+    numbers = parse_spatial_value(query_type, value)
+    min_lat, min_lng, max_lat, max_lng = bounding_box(query_type, numbers)
+
+    if connection.vendor == 'sqlite':
+        queryset = queryset.filter(id__in=RawSQL(
+            f"SELECT id FROM {RTREE_TABLE} WHERE max_lat >= %s AND min_lat <= %s AND max_lng >= %s AND min_lng <= %s",
+            [min_lat, max_lat, min_lng, max_lng],
+        ))
+    queryset = queryset.filter(latitude__range=(min_lat, max_lat), longitude__range=(min_lng, max_lng))
+
+    if query_type == 'radius':
+        lat, lng, km = numbers
+        scale = math.cos(math.radians(lat))
+        delta_lat = F('latitude') - lat
+        delta_lng = (F('longitude') - lng) * scale
+        queryset = queryset.alias(
+            squared_distance=ExpressionWrapper(delta_lat * delta_lat + delta_lng * delta_lng, output_field=FloatField())
+        ).filter(squared_distance__lte=(km / KM_PER_DEGREE) ** 2)
+    return queryset
@@ -0,0 +1,149 @@
+import json
+import logging
+
+from django.db import connection, models, transaction
+
+from .models import ImportCheckpoint, RealEstateListing
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteFastLoader:
+    """
+    Bulk loader writing listings with ``executemany`` on SQLite, bypassing
+    model instances. Used as a context manager around the whole load: the
+    pragmas are tuned and the secondary indexes dropped on enter; the indexes
+    are rebuilt and the pragmas restored on exit. Writes are committed by the
+    caller, chunk by chunk with its checkpoint, so that an interrupted load
+    resumes after the last committed chunk.
+
+    The dropped indexes are recorded on ``checkpoint``, an ImportCheckpoint,
+    until they are rebuilt: the indexes of a load killed before its exit are
+    rebuilt at the end of the next one.
+
+    Rows conflicting with an existing ``reference_id`` update it, like
+    ``bulk_create(update_conflicts=True, unique_fields=['reference_id'])``.
+    """
+
+    # The journal stays on disk: a load killed mid-chunk must roll back to the
+    # last committed chunk, which an in-memory journal cannot guarantee
+    PRAGMAS = {
+        'synchronous': 'OFF',
+        'cache_size': -262144,  # KiB
+        'temp_store': 'MEMORY',
+    }
+
+    def __init__(self, model=RealEstateListing, checkpoint=None):
+        self.model = model
+        self.table = model._meta.db_table
+        self.checkpoint = checkpoint
+        self._statements = {}
+        self._saved_pragmas = {}
+        self._dropped_indexes = []
+
+    def __enter__(self):
+        if connection.vendor != 'sqlite':
+            raise ValueError(f"The sqlite-fast engine requires SQLite, not {connection.vendor}")
+
+        with connection.cursor() as cursor:
+            for pragma, value in self.PRAGMAS.items():
+                cursor.execute(f"PRAGMA {pragma}")
+                self._saved_pragmas[pragma] = cursor.fetchone()[0]
+                cursor.execute(f"PRAGMA {pragma} = {value}")
+
+        try:
+            self._drop_secondary_indexes()
+        except BaseException:
+            self._restore_pragmas()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The chunks committed before an error are kept, rebuild the indexes either way
+        try:
+            self._create_indexes()
+        finally:
+            self._restore_pragmas()
+        return False
+
+    def write(self, rows):
+        """Upsert RealEstateListing keyword arguments rows, returns the number of rows given."""
+        if not rows:
+            return 0
+        fields = tuple(rows[0])
+        statement, converters = self._statement(fields)
+        values = (
+            tuple(convert(row[name]) if convert else row[name] for name, convert in zip(fields, converters))
+            for row in rows
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(statement, values)
+        return len(rows)
+
+    def _statement(self, fields):
+        if fields not in self._statements:
+            model_fields = [self.model._meta.get_field(name) for name in fields]
+            columns = ', '.join(connection.ops.quote_name(field.column) for field in model_fields)
+            placeholders = ', '.join('%s' for _ in model_fields)
+            updates = ', '.join(
+                f"{connection.ops.quote_name(field.column)} = excluded.{connection.ops.quote_name(field.column)}"
+                for field in model_fields if field.name != 'reference_id'
+            )
+            converters = [self._json if isinstance(field, models.JSONField) else None for field in model_fields]
+            self._statements[fields] = (
+                f"INSERT INTO {connection.ops.quote_name(self.table)} ({columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT ({connection.ops.quote_name('reference_id')}) DO UPDATE SET {updates}",
+                converters,
+            )
+        return self._statements[fields]
+
+    @staticmethod
+    def _json(value):
+        return None if value is None else json.dumps(value)
+
+    def _drop_secondary_indexes(self):
+        """
+        Drop the non-unique indexes of the table, recording on the checkpoint
+        how to create them again along with those of killed loads.
+        """
+        table = connection.ops.quote_name(self.table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA index_list({table})")
+            unique = {row[1]: row[2] for row in cursor.fetchall()}
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL",
+                [self.table]
+            )
+            for name, sql in cursor.fetchall():
+                if unique.get(name):
+                    continue
+                cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+                self._dropped_indexes.append((name, sql))
+            logger.info(f"Dropped {len(self._dropped_indexes)} indexes of {self.table} for the load")
+
+            if self.checkpoint is not None:
+                # Indexes left dropped by killed loads, whose checkpoints are never completed
+                killed = ImportCheckpoint.objects.filter(completed=False).exclude(id=self.checkpoint.id)
+                for checkpoint in [self.checkpoint, *killed]:
+                    self._dropped_indexes.extend(tuple(index) for index in checkpoint.dropped_indexes)
+                killed.update(dropped_indexes=[])
+                # One statement per index
+                self._dropped_indexes = list(dict(self._dropped_indexes).items())
+                self._save_dropped_indexes()
+
+    def _create_indexes(self):
+        with transaction.atomic(), connection.cursor() as cursor:
+            for name, sql in self._dropped_indexes:
+                cursor.execute(sql)
+            self._dropped_indexes = []
+            if self.checkpoint is not None:
+                self._save_dropped_indexes()
+
+    def _save_dropped_indexes(self):
+        self.checkpoint.dropped_indexes = [list(index) for index in self._dropped_indexes]
+        self.checkpoint.save(update_fields=['dropped_indexes', 'updated_at'])
+
+    def _restore_pragmas(self):
+        with connection.cursor() as cursor:
+            for pragma, value in self._saved_pragmas.items():
+                cursor.execute(f"PRAGMA {pragma} = {value}")
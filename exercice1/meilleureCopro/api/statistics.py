@@ -0,0 +1,121 @@
+import math
+
+import numpy as np
+
+from .metrics import span
+
+QUANTILES = (0.1, 0.9)
+
+STATISTIC_FIELDS = (
+    'mean_price',
+    'mean_surface',
+    'mean_fees',
+    'mean_fees_per_sqm',
+    'quantile_10_price',
+    'quantile_90_price',
+    'quantile_10_surface',
+    'quantile_90_surface',
+    'quantile_10_fees',
+    'quantile_90_fees',
+    'quantile_10_fees_per_sqm',
+    'quantile_90_fees_per_sqm',
+)
+
+METRICS = ('price', 'surface', 'fees', 'fees_per_sqm')
+
+# RealEstateListing columns holding each metric, in METRICS order
+STATISTIC_COLUMNS = ('price', 'primary_surface', 'condominium_expenses', 'fees_per_sqm')
+
+
+def to_float_array(values):
+    """Convert a sequence of numbers (None allowed) to a float array, None becoming NaN."""
+    return np.asarray(values, dtype=float)
+
+
+def compute_fees_per_sqm(fees, primary_surface, single_surface):
+    """
+    Yearly condominium fees per m². The ratio is only defined for listings with
+    a single strictly positive surface: listings with several lots have no
+    unambiguous surface to divide by.
+    """
+    result = np.full(len(fees), np.nan)
+    valid = single_surface & ~np.isnan(fees) & (primary_surface > 0)
+    np.divide(fees, primary_surface, out=result, where=valid)
+    return result
+
+
+def quantile_neighbours(count, quantile):
+    """
+    Ranks, in the sorted non-missing values, of the two values the linear
+    ``quantile`` of ``count`` values interpolates, and the interpolation
+    weight. The arithmetic is the one of ``np.quantile`` so that results match.
+    """
+    position = (count - 1) * quantile
+    if position >= count - 1:
+        return count - 1, count - 1, 0.0
+    lower = math.floor(position)
+    return lower, lower + 1, position - lower
+
+
+def interpolate(low, high, weight):
+    """Linear interpolation between two sorted values, as done by ``np.quantile``."""
+    difference = high - low
+    if weight >= 0.5:
+        return high - difference * (1 - weight)
+    return low + difference * weight
+
+
+def _describe(values):
+    """Mean, 10% and 90% quantiles of the non-missing values, 0.0 when there are none."""
+    values = values[~np.isnan(values)]
+    if not values.size:
+        return 0.0, 0.0, 0.0
+    low, high = np.quantile(values, QUANTILES)
+    return float(values.mean()), float(low), float(high)
+
+
+def compute_statistics(prices, surfaces, fees, fees_per_sqm, timed=False):
+    """
+    Compute every statistic of the API response from the per-listing float
+    arrays. ``timed`` records the compute of each metric as a span: it is
+    meant for single-area requests, not for the loops over every area.
+    """
+    described = {}
+    for metric, values in zip(METRICS, (prices, surfaces, fees, fees_per_sqm)):
+        if timed:
+            with span('compute', metric=metric):
+                described[metric] = _describe(values)
+        else:
+            described[metric] = _describe(values)
+    stats = {f'mean_{metric}': described[metric][0] for metric in METRICS}
+    for metric in METRICS:
+        stats[f'quantile_10_{metric}'] = described[metric][1]
+        stats[f'quantile_90_{metric}'] = described[metric][2]
+    return {field: stats[field] for field in STATISTIC_FIELDS}
+
+
+def statistics_from_rows(rows):
+    """Compute the statistics from rows of the STATISTIC_COLUMNS, as returned by ``values_list``."""
+    with span('arrays'):
+        columns = np.array(rows, dtype=float).reshape(-1, len(STATISTIC_COLUMNS)).T
+    return compute_statistics(*columns, timed=True)
+
+
+def compute_histogram(values, bins):
+    """
+    Histogram of the non-missing values, ``bins`` being a number of equal-width
+    bins spanning the values or a sequence of increasing edges, binned like
+    ``np.histogram`` (half-open bins, the last one closed). Returns a dict of
+    compact lists: edges and counts, with the missing, underflow and overflow
+    value counts.
+    """
+    missing = np.isnan(values)
+    values = values[~missing]
+    counts, edges = np.histogram(values, bins=bins)
+    return {
+        'edges': edges.tolist(),
+        'counts': counts.tolist(),
+        'missing': int(missing.sum()),
+        'underflow': int(np.count_nonzero(values < edges[0])),
+        'overflow': int(np.count_nonzero(values > edges[-1])),
+    }
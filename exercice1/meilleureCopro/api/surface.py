@@ -0,0 +1,75 @@
+"""
+Parsing of listing surfaces.
+
+A surface is either a single number or a list of numbers written like
+``[45.5, 12.0]`` (one per lot). Values are parsed as plain numbers, never
+evaluated, so the parser is safe for untrusted input.
+"""
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from .statistics import compute_fees_per_sqm
+
+# primary: first surface of each listing, NaN when missing
+# counts: number of surfaces of each listing
+# lists: surfaces of each listing as stored in RealEstateListing.surface
+Surfaces = namedtuple('Surfaces', ['primary', 'counts', 'lists'])
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (ValueError, TypeError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def parse_surface(value):
+    """Parse a single surface (number, list or text) to the stored list form, None when missing."""
+    if isinstance(value, str):
+        value = value.strip()
+        if value[:1] == '[' and value[-1:] == ']':
+            inner = value[1:-1]
+            return [_number(item) for item in inner.split(',')] if inner.strip() else []
+        number = _number(value)
+        return None if number is None else [number]
+    if isinstance(value, (list, tuple)):
+        return [_number(item) for item in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        number = _number(value)
+        return None if number is None else [number]
+    return None
+
+
+def parse_surface_column(values):
+    """
+    Parse a whole column of raw surfaces (text, numbers or missing values) in
+    a single pass. Tokenizing with plain string methods is faster than the
+    pandas ``.str``/``explode`` equivalent for these short values, the numeric
+    columns are then built with NumPy.
+    """
+    lists = [parse_surface(value) for value in values]
+    primary = np.array([surfaces[0] if surfaces else None for surfaces in lists], dtype=float)
+    counts = np.fromiter(
+        (len(surfaces) if surfaces else 0 for surfaces in lists),
+        dtype=np.int64,
+        count=len(lists),
+    )
+    return Surfaces(primary, counts, lists)
+
+
+def _nullable_floats(values):
+    return [None if math.isnan(value) else value for value in values.tolist()]
+
+
+def derived_surface_columns(surfaces, fees):
+    """
+    Denormalized RealEstateListing columns computed from raw surfaces and
+    condominium expenses: (primary_surface values, fees_per_sqm values),
+    missing values being None.
+    """
+    parsed = parse_surface_column(surfaces)
+    fees_per_sqm = compute_fees_per_sqm(np.array(fees, dtype=float), parsed.primary, parsed.counts == 1)
+    return _nullable_floats(parsed.primary), _nullable_floats(fees_per_sqm)
@@ -0,0 +1,164 @@
+"""
+Synthetic listings in the format of the CSV dataset, for benchmarks.
+
+Listings are drawn from a seeded generator, so the same scale and seed always
+give the same file. Volumes are skewed like real listings at every level: a
+few departments (Paris and the large metropolitan areas first) hold most of
+the listings, and within a department a few cities hold most of them, the
+largest cities spanning several postal codes while villages share one. City
+names repeat across departments and carry accents, hyphens and "Saint"
+prefixes. Surfaces use the list format of the dataset, some listings having
+several lots or none.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from .ingestion import LISTING_COLUMNS
+
+# Rows generated and written at once, part of the definition of the data of a seed
+GENERATION_CHUNK_SIZE = 100000
+
+# Departments by decreasing listing volume, then the other metropolitan ones
+LARGE_DEPARTMENTS = (75, 92, 13, 69, 6, 33, 31, 93, 94, 78, 44, 34, 59, 83, 91, 95, 77, 67, 35, 38, 74, 64, 17, 30)
+DEPARTMENTS = LARGE_DEPARTMENTS + tuple(
+    dept for dept in range(1, 96) if dept != 20 and dept not in LARGE_DEPARTMENTS
+)
+# Price level of a department relative to the national one
+PRICE_FACTORS = {75: 3.0, 92: 2.0, 6: 1.5, 94: 1.4, 78: 1.4, 69: 1.3, 33: 1.3, 74: 1.3, 13: 1.1}
+# Main city of a department and its number of postal codes
+MAIN_CITIES = {
+    75: ('Paris', 20), 13: ('Marseille', 16), 69: ('Lyon', 9), 31: ('Toulouse', 6), 6: ('Nice', 6),
+    44: ('Nantes', 4), 33: ('Bordeaux', 4), 59: ('Lille', 3), 34: ('Montpellier', 4), 67: ('Strasbourg', 4),
+    35: ('Rennes', 3), 38: ('Grenoble', 3), 92: ('Boulogne-Billancourt', 2), 93: ('Saint-Denis', 2),
+    94: ('Créteil', 1), 78: ('Versailles', 1), 83: ('Toulon', 3), 91: ('Évry-Courcouronnes', 1),
+}
+CITY_PREFIXES = (
+    'Saint-Martin', 'Sainte-Marie', 'Villeneuve', 'Beaumont', 'Montreuil', 'Châteauneuf', 'Bourg',
+    'Fontaine', 'La Roche', 'Saint-Étienne', 'Le Mesnil', 'Neuville',
+)
+CITY_SUFFIXES = (
+    '', '-sur-Loire', '-les-Bains', '-en-Bresse', '-de-Provence', '-le-Château', '-sur-Mer', '-la-Forêt',
+    '-d\'Azur', '-sous-Bois', '-en-Vexin', '-lès-Nancy',
+)
+CITY_NAMES = tuple(prefix + suffix for suffix in CITY_SUFFIXES for prefix in CITY_PREFIXES)
+MAX_CITIES_PER_DEPARTMENT = 120
+ENERGY_CLASSIFICATIONS = ('A', 'B', 'C', 'D', 'E', 'F', 'G')
+PUBLICATION_START = date(2023, 1, 1).toordinal()
+PUBLICATION_DAYS = 730
+
+
+def _city_table(rng):
+    """
+    Every city of the synthetic territory, as (department, name, INSEE code,
+    postal codes, share of the listings, latitude, longitude) tuples.
+    """
+    dept_weights = 1 / np.arange(1, len(DEPARTMENTS) + 1)
+    dept_weights /= dept_weights.sum()
+
+    cities = []
+    for dept, dept_weight in zip(DEPARTMENTS, dept_weights):
+        count = int(np.clip(MAX_CITIES_PER_DEPARTMENT * dept_weight / dept_weights[1], 8, MAX_CITIES_PER_DEPARTMENT))
+        if dept == 75:
+            # Paris is a department of its own
+            count = 1
+        city_weights = 1 / np.arange(1, count + 1) ** 1.2
+        city_weights *= dept_weight / city_weights.sum()
+        center = (48.8566, 2.3522) if dept == 75 else (rng.uniform(43.0, 50.5), rng.uniform(-1.5, 7.0))
+        for index, weight in enumerate(city_weights):
+            if index == 0 and dept in MAIN_CITIES:
+                name, postal_count = MAIN_CITIES[dept]
+                postal_codes = [dept * 1000 + number for number in range(1, postal_count + 1)]
+            else:
+                name = CITY_NAMES[(index + dept * 7) % len(CITY_NAMES)]
+                # Villages share their postal code with their neighbours
+                postal_codes = [dept * 1000 + 100 + (index // 3) * 10]
+            offset = (0.0, 0.0) if index == 0 else rng.normal(0, 0.25, size=2)
+            cities.append((dept, name, dept * 1000 + index, postal_codes, weight, center[0] + offset[0], center[1] + offset[1]))
+    return cities
+
+
+def _format_surfaces(first, second, missing, multiple):
+    return np.array([
+        '' if is_missing else f'[{a:.1f}, {b:.1f}]' if is_multiple else f'[{a:.1f}]'
+        for a, b, is_missing, is_multiple in zip(first.tolist(), second.tolist(), missing.tolist(), multiple.tolist())
+    ], dtype=object)
+
+
+def _optional(rng, values, missing_rate):
+    """Values as an object array, a ``missing_rate`` share of them being blank."""
+    values = np.asarray(values, dtype=object)
+    values[rng.random(len(values)) < missing_rate] = ''
+    return values
+
+
+def _choice(rng, options, probabilities, size):
+    return np.array(options, dtype=object)[rng.choice(len(options), size=size, p=probabilities)]
+
+
+def _generate_chunk(rng, cities, start, size, seed):
+    """DataFrame of ``size`` listings, numbered from ``start``, with the CSV columns of the dataset."""
+    weights = np.array([city[4] for city in cities])
+    picked = rng.choice(len(cities), size=size, p=weights / weights.sum())
+    dept = np.array([city[0] for city in cities])[picked]
+    postal_codes = [cities[index][3] for index in picked.tolist()]
+    postal = np.array([codes[rng.integers(len(codes))] if len(codes) > 1 else codes[0] for codes in postal_codes])
+    price_factor = np.array([PRICE_FACTORS.get(dept_code, 1.0) for dept_code in dept.tolist()])
+
+    first_surface = np.round(rng.lognormal(np.log(55), 0.45, size), 1)
+    second_surface = np.round(rng.lognormal(np.log(12), 0.5, size), 1)
+    surface_missing = rng.random(size) < 0.04
+    multiple = rng.random(size) < 0.06
+    price = np.round(first_surface * rng.lognormal(np.log(3500), 0.35, size) * price_factor, -2)
+    expenses = np.round(first_surface * rng.lognormal(np.log(35), 0.5, size))
+    publication = PUBLICATION_START + rng.integers(0, PUBLICATION_DAYS, size)
+
+    columns = {
+        'REFERENCE_NUMBER': [f'SYN-{seed}-{number}' for number in range(start, start + size)],
+        'AD_URLS': [f'https://example.com/annonce/{seed}-{number}' for number in range(start, start + size)],
+        'PROPERTY_TYPE': _choice(rng, ('APARTMENT', 'OTHER'), (0.9, 0.1), size),
+        'DEPT_CODE': dept,
+        'ZIP_CODE': postal,
+        'CITY': np.array([city[1] for city in cities], dtype=object)[picked],
+        'INSEE_CODE': np.array([city[2] for city in cities])[picked],
+        'LATITUDE': np.array([city[5] for city in cities])[picked] + rng.normal(0, 0.02, size),
+        'LONGITUDE': np.array([city[6] for city in cities])[picked] + rng.normal(0, 0.02, size),
+        'BLUR_RADIUS': _optional(rng, np.full(size, 100), 0.5),
+        'MARKETING_TYPE': _choice(rng, ('SALE', 'LIFE_ANNUITY'), (0.97, 0.03), size),
+        'PRICE': _optional(rng, price, 0.02),
+        'DESCRIPTION': 'Appartement lumineux, proche des transports',
+        'SURFACE': _format_surfaces(first_surface, second_surface, surface_missing, multiple),
+        'CONDOMINIUM_EXPENSES': _optional(rng, expenses, 0.2),
+        'CARETAKER': _choice(rng, ('True', 'False', ''), (0.25, 0.55, 0.2), size),
+        'HEATING_MODE': _choice(rng, ('COLLECTIVE', 'INDIVIDUAL', ''), (0.4, 0.45, 0.15), size),
+        'ELEVATOR': _choice(rng, ('True', 'False', ''), (0.45, 0.4, 0.15), size),
+        'FLOOR': _optional(rng, rng.integers(0, 12, size), 0.2),
+        'FLOOR_COUNT': _optional(rng, rng.integers(1, 15, size), 0.3),
+        'LOT_COUNT': _optional(rng, np.ceil(rng.lognormal(np.log(30), 1.0, size)).astype(int), 0.3),
+        'CONSTRUCTION_YEAR': _optional(rng, rng.integers(1850, 2025, size), 0.25),
+        'PARKING': _choice(rng, ('True', 'False'), (0.3, 0.7), size),
+        'TERRACE': _choice(rng, ('True', 'False'), (0.25, 0.75), size),
+        'PUBLICATION_START_DATE': [
+            f'{date.fromordinal(day).isoformat()}T08:00:00.000Z' for day in publication.tolist()
+        ],
+        'ENERGY_CLASSIFICATION': _choice(
+            rng, ENERGY_CLASSIFICATIONS + ('',), (0.03, 0.07, 0.2, 0.25, 0.15, 0.07, 0.03, 0.2), size
+        ),
+    }
+    # Columns of the dataset left blank, like in most of its rows
+    for _, column, _ in LISTING_COLUMNS:
+        columns.setdefault(column, '')
+    return pd.DataFrame({column: columns[column] for _, column, _ in LISTING_COLUMNS})
+
+
+def generate_listings_csv(path, rows, seed=0):
+    """Write ``rows`` synthetic listings to the CSV file ``path``, chunk by chunk. Returns the number of cities."""
+    rng = np.random.default_rng(seed)
+    cities = _city_table(rng)
+    for start in range(0, rows, GENERATION_CHUNK_SIZE):
+        chunk = _generate_chunk(rng, cities, start, min(GENERATION_CHUNK_SIZE, rows - start), seed)
+        chunk.to_csv(path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+    if not rows:
+        pd.DataFrame(columns=[column for _, column, _ in LISTING_COLUMNS]).to_csv(path, index=False)
+    return len(cities)
@@ -1,3 +1,1088 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tarfile
+import tempfile
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .aggregates import compute_area_statistics, export_snapshot, rebuild_area_statistics, refresh_area_statistics, sql_area_statistics
+from .areas import filter_listings, listing_areas
+from .cache import STATISTICS_CACHE, get_cached_statistics, statistics_cache_key
+from .bienici import fetch_listing, import_bienici_listings, listing_row
+from .ingestion import convert_chunk, read_csv_chunks, run_pipeline
+from .filters import filter_attributes
+from .jobs import fail_stale_jobs, run_job
+from .management.commands.benchmark_statistics import legacy_statistics
+from .metrics import REQUEST_SECONDS, STATISTICS_QUERIES
+from .models import AreaSketch, AreaStatistics, ImportCheckpoint, ImportJob, MonthlyStatistics, RealEstateListing
+from .renderers import FastJSONRenderer
+from .serializer import StatisticsBatchSerializer, StatisticsResponseSerializer
+from .sketches import QuantileSketch, add_listings_to_sketches, sketch_area_statistics
+from .snapshot import Snapshot, get_snapshot, record_write, write_snapshot
+from .spatial import KM_PER_DEGREE
+from .sqlite_loader import SQLiteFastLoader
+from .statistics import STATISTIC_FIELDS, compute_statistics
+from .surface import parse_surface, parse_surface_column
+from .synthetic import generate_listings_csv
+from .timeseries import listing_area_months, rebuild_monthly_statistics, refresh_monthly_statistics
+from .upsert import changed_fields, upsert_listing_rows
+from .utils import city_key
+
+
+class AreaListingsTestCase(TestCase):
+    """Listings of departments 75 and 92 with missing values and multi-lot surfaces, without cached statistics."""
+
+    @classmethod
+    def setUpTestData(cls):
+        surfaces = [[45.0], [72.5], [30.0, 12.0], None, [0.0], [110.0], [58.3], [64.0], [21.0], [95.5]]
+        expenses = [1200, 800, 950, None, 400, 3100, None, 1500, 600, 2200]
+        for index in range(60):
+            RealEstateListing.objects.create(
+                reference_id=f'ref-{index}',
+                dept_code=75 if index % 3 else 92,
+                postal_code=75001 + index % 4 if index % 3 else 92100,
+                city='Paris' if index % 3 else 'Boulogne-Billancourt',
+                price=None if index % 7 == 0 else 150000 + 13750.5 * (index % 11),
+                surface=surfaces[index % len(surfaces)],
+                condominium_expenses=expenses[(index * 3) % len(expenses)],
+            )
+
+    def setUp(self):
+        # Statistics cached by other tests are not rolled back with their listings
+        caches[STATISTICS_CACHE].clear()
+
+
+class StatisticsBackendTests(AreaListingsTestCase):
+    """The NumPy and SQL statistics backends must agree on the same listings."""
+
+    def assertSameStatistics(self, query_type, query_value):
+        count, stats = compute_area_statistics(query_type, query_value)
+        sql_count, sql_stats = sql_area_statistics(query_type, query_value)
+        self.assertGreater(count, 0)
+        self.assertEqual(count, sql_count)
+        for field in STATISTIC_FIELDS:
+            self.assertAlmostEqual(stats[field], sql_stats[field], places=6, msg=field)
+
+    def test_department(self):
+        self.assertSameStatistics('department', '75')
+        self.assertSameStatistics('department', '92')
+
+    def test_city(self):
+        self.assertSameStatistics('city', 'paris')
+
+    def test_postal_code(self):
+        for postal_code in ('75001', '75002', '92100'):
+            self.assertSameStatistics('postal_code', postal_code)
+
+    def test_unknown_area(self):
+        self.assertEqual(compute_area_statistics('department', '13'), (0, None))
+        self.assertEqual(sql_area_statistics('department', '13'), (0, None))
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def test_endpoint_backend(self):
+        responses = [
+            self.client.get('/api/stats/', {'query_type': 'department', 'query_value': '75', 'backend': backend})
+            for backend in ('numpy', 'sql')
+        ]
+        for response in responses:
+            self.assertEqual(response.status_code, 200)
+        numpy_data, sql_data = (response.json() for response in responses)
+        self.assertEqual(numpy_data['count'], sql_data['count'])
+        for field in STATISTIC_FIELDS:
+            self.assertAlmostEqual(numpy_data['statistics'][field], sql_data['statistics'][field], places=6, msg=field)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class HistogramTests(AreaListingsTestCase):
+    def test_histogram(self):
+        fees = np.array(
+            RealEstateListing.objects.filter(dept_code=75).values_list('condominium_expenses', flat=True), dtype=float
+        )
+        response = self.client.get(
+            '/api/stats/histogram/', {'query_type': 'department', 'query_value': '75', 'metric': 'fees', 'edges': '500,1000,2000'}
+        )
+        data = response.json()
+        self.assertEqual(data['count'], len(fees))
+        self.assertEqual(data['counts'], np.histogram(fees[~np.isnan(fees)], bins=[500, 1000, 2000])[0].tolist())
+        self.assertEqual(data['missing'], np.isnan(fees).sum())
+        self.assertEqual(sum(data['counts']) + data['missing'] + data['underflow'] + data['overflow'], len(fees))
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], PROFILE_REQUESTS=True)
+class MetricsTests(AreaListingsTestCase):
+    def test_metrics_and_profile(self):
+        requests = REQUEST_SECONDS.count(endpoint='stats', query_type='postal_code')
+        params = {'query_type': 'postal_code', 'query_value': '75002', 'backend': 'numpy', 'profile': '1'}
+        profile = self.client.get('/api/stats/', params).json()['profile']
+        self.assertEqual(
+            [span['span'] for span in profile['spans']],
+            ['precomputed', 'fetch', 'arrays', 'compute', 'compute', 'compute', 'compute', 'serialize'],
+        )
+        self.assertTrue(any('compute_area_statistics' in row['function'] for row in profile['functions']))
+
+        metrics = self.client.get('/api/metrics/').content.decode()
+        self.assertEqual(REQUEST_SECONDS.count(endpoint='stats', query_type='postal_code'), requests + 1)
+        self.assertIn(f'meilleurecopro_request_seconds_count{{endpoint="stats",query_type="postal_code"}} {requests + 1}', metrics)
+        self.assertIn('meilleurecopro_span_seconds_bucket{span="compute",metric="fees_per_sqm",le="+Inf"}', metrics)
+
+        with self.settings(PROFILE_REQUESTS=False):
+            self.assertNotIn('profile', self.client.get('/api/stats/', params).json())
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class ResponseLayoutTests(AreaListingsTestCase):
+    def test_lean_and_compact_layouts(self):
+        count, stats = compute_area_statistics('department', '75')
+        params = {'query_type': 'department', 'query_value': '75'}
+        data = self.client.get('/api/stats/', params).json()
+        self.assertEqual(data['statistics'], StatisticsResponseSerializer(stats).data)
+        compact = self.client.get('/api/stats/', {**params, 'layout': 'compact'}).json()
+        self.assertEqual(compact['statistics'], [data['statistics'][field] for field in compact['fields']])
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+        response = self.client.post(
+            '/api/stats/batch/',
+            {'areas': [params, {'query_type': 'department', 'query_value': '13'}], 'layout': 'compact'},
+            content_type='application/json',
+        )
+        batch = response.json()
+        self.assertEqual(batch['fields'][:3], ['query_type', 'query_value', 'count'])
+        self.assertEqual(batch['results'], [['department', '75', count, *compact['statistics']]])
+        self.assertEqual(batch['not_found'], [{'query_type': 'department', 'query_value': '13'}])
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], STATISTICS_HTTP_MAX_AGE=60)
+class ConditionalRequestTests(AreaListingsTestCase):
+    def test_conditional_requests(self):
+        rebuild_area_statistics()
+        params = {'query_type': 'department', 'query_value': '75'}
+        response = self.client.get('/api/stats/', params)
+        etag = response['ETag']
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        self.assertNotEqual(self.client.get('/api/stats/', {**params, 'layout': 'compact'})['ETag'], etag)
+
+        # Answered from the version of the area alone
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/stats/', params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(
+            self.client.get('/api/stats/', params, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+        )
+
+        RealEstateListing.objects.create(reference_id='ref-new', dept_code=75, city='Paris', price=99000)
+        refresh_area_statistics({('department', '75')})
+        response = self.client.get('/api/stats/', params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        other = self.client.get('/api/stats/', {'query_type': 'department', 'query_value': '92'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(other.status_code, 200)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class LegacyParityTests(TestCase):
+    """compute_statistics must give the statistics of the former pandas implementation of /api/stats/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        listings = [
+            # Department 75: missing values, multi-lot and zero surfaces
+            (75, 75011, 250000.0, [45.0], 1200.0),
+            (75, 75011, None, [30.0, 12.0], 900.0),
+            (75, 75011, 410000.0, None, 1500.0),
+            (75, 75012, 180000.0, [0.0], 600.0),
+            (75, 75012, 320000.0, [62.5], None),
+            (75, 75012, 275000.0, [], 800.0),
+            (75, 75012, 199000.0, [28.0, 9.5, 4.0], None),
+            (75, 75012, 505000.0, [95.0], 2100.0),
+            # Department 13: no price, surface nor expenses at all
+            (13, 13001, None, None, None),
+            (13, 13001, None, [], None),
+            # Department 69: a single listing
+            (69, 69003, 150000.0, [38.0], 700.0),
+        ]
+        for index, (dept_code, postal_code, price, surface, expenses) in enumerate(listings):
+            RealEstateListing.objects.create(
+                reference_id=f'legacy-{index}', dept_code=dept_code, postal_code=postal_code, city='Ville',
+                price=price, surface=surface, condominium_expenses=expenses,
+            )
+
+    def assertLegacyStatistics(self, query_type, query_value, listings):
+        legacy = legacy_statistics(list(listings.values('condominium_expenses', 'surface', 'price')))
+        count, stats = compute_area_statistics(query_type, query_value)
+        self.assertEqual(count, listings.count())
+        for field in STATISTIC_FIELDS:
+            self.assertAlmostEqual(stats[field], legacy[field], places=6, msg=f'{query_type} {query_value} {field}')
+
+    def test_areas_match_legacy(self):
+        for dept_code in (75, 13, 69):
+            self.assertLegacyStatistics('department', str(dept_code), RealEstateListing.objects.filter(dept_code=dept_code))
+        for postal_code in (75011, 75012):
+            self.assertLegacyStatistics(
+                'postal_code', str(postal_code), RealEstateListing.objects.filter(postal_code=postal_code)
+            )
+
+    def test_missing_values_and_lots(self):
+        count, stats = compute_area_statistics('department', '75')
+        # Only the single positive surfaces with expenses have fees per m²: 1200 / 45 and 2100 / 95
+        self.assertAlmostEqual(stats['mean_fees_per_sqm'], (1200 / 45 + 2100 / 95) / 2)
+        self.assertAlmostEqual(stats['mean_surface'], np.mean([45.0, 30.0, 0.0, 62.5, 28.0, 95.0]))
+        self.assertEqual(compute_area_statistics('department', '13'), (2, dict.fromkeys(STATISTIC_FIELDS, 0.0)))
+
+    def test_empty_area(self):
+        self.assertEqual(compute_area_statistics('department', '01')[0], 0)
+        self.assertEqual(
+            self.client.get('/api/stats/', {'query_type': 'department', 'query_value': '01'}).status_code, 404
+        )
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class StatisticsBatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for index, (dept_code, city) in enumerate([(75, 'Paris'), (92, 'Boulogne-Billancourt'), (13, 'Marseille')] * 4):
+            RealEstateListing.objects.create(
+                reference_id=f'batch-{index}',
+                dept_code=dept_code,
+                postal_code=dept_code * 1000 + 1,
+                city=city,
+                price=100000 + 10000 * index,
+                surface=[30 + index],
+                condominium_expenses=1000 + 100 * index,
+            )
+        rebuild_area_statistics()
+
+    def setUp(self):
+        # Statistics cached by other tests are not rolled back with their listings
+        caches[STATISTICS_CACHE].clear()
+
+    def post(self, body):
+        return self.client.post('/api/stats/batch/', body, content_type='application/json')
+
+    def test_areas(self):
+        response = self.post({'areas': [
+            {'query_type': 'department', 'query_value': '75'},
+            {'query_type': 'city', 'query_value': 'BOULOGNE BILLANCOURT'},
+            {'query_type': 'department', 'query_value': '99'},
+            {'query_type': 'postal_code', 'query_value': 'abc'},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([(result['query_type'], result['query_value'], result['count']) for result in data['results']], [
+            ('department', '75', 4), ('city', 'BOULOGNE BILLANCOURT', 4),
+        ])
+        count, stats = compute_area_statistics('department', '75')
+        for field in STATISTIC_FIELDS:
+            self.assertAlmostEqual(data['results'][0]['statistics'][field], stats[field], msg=field)
+        self.assertEqual(data['not_found'], [
+            {'query_type': 'department', 'query_value': '99'}, {'query_type': 'postal_code', 'query_value': 'abc'},
+        ])
+        self.assertNotIn('next', data)
+
+    def test_all_areas_page_by_page(self):
+        data = self.post({'all': 'department', 'limit': 2}).json()
+        self.assertEqual([result['query_value'] for result in data['results']], ['13', '75'])
+        self.assertEqual(data['next'], '75')
+
+        data = self.post({'all': 'department', 'limit': 2, 'after': data['next']}).json()
+        self.assertEqual([result['query_value'] for result in data['results']], ['92'])
+        self.assertIsNone(data['next'])
+
+        data = self.post({'all': 'city', 'layout': 'compact'}).json()
+        self.assertEqual([row[1] for row in data['results']], ['boulogne billancourt', 'marseille', 'paris'])
+        self.assertEqual((data['not_found'], data['next']), ([], None))
+
+    def test_invalid_requests(self):
+        too_many = [{'query_type': 'department', 'query_value': str(dept)} for dept in range(StatisticsBatchSerializer.MAX_AREAS + 1)]
+        for body in (
+            {'areas': too_many},
+            {'all': 'department', 'limit': StatisticsBatchSerializer.MAX_AREAS + 1},
+            {'all': 'department', 'limit': 0},
+            {'areas': [{'query_type': 'department', 'query_value': '75'}], 'after': '13'},
+            {'areas': [{'query_type': 'department', 'query_value': '75'}], 'limit': 5},
+            {'areas': [{'query_type': 'department', 'query_value': '75'}], 'all': 'department'},
+            {},
+        ):
+            self.assertEqual(self.post(body).status_code, 400, body)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class FilteredStatisticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(30):
+            RealEstateListing.objects.create(
+                reference_id=f'filter-{index}',
+                dept_code=75,
+                postal_code=75012,
+                city='Paris',
+                price=100000 + 1000 * index,
+                surface=[40 + index],
+                condominium_expenses=1000 + 10 * index,
+                heating_mode='COLLECTIVE' if index % 2 else 'INDIVIDUAL',
+                elevator=index % 3 == 0,
+                lot_count=None if index % 5 == 0 else 8 * index,
+                property_type='APARTMENT',
+            )
+
+    def get(self, **params):
+        return self.client.get('/api/stats/', {'query_type': 'department', 'query_value': '75', **params})
+
+    def test_filters_and_group_by(self):
+        data = self.get(heating_mode='COLLECTIVE', elevator='true', group_by='lot_count').json()
+        listings = RealEstateListing.objects.filter(heating_mode='COLLECTIVE', elevator=True)
+        self.assertEqual(data['count'], listings.count())
+        self.assertEqual(data['filters'], {'elevator': True, 'heating_mode': 'COLLECTIVE'})
+        self.assertEqual(sum(group['count'] for group in data['groups']), data['count'])
+        self.assertEqual([group['value'] for group in data['groups']], ['10-49', '50-99', '100-199', '200+', 'unknown'])
+
+        expected = compute_area_statistics('department', '75')[1]
+        self.assertAlmostEqual(self.get(group_by='elevator').json()['statistics']['mean_fees'], expected['mean_fees'])
+
+    def test_invalid_combinations(self):
+        self.assertEqual(self.get(lot_count_min=50, lot_count_max=10).status_code, 400)
+        self.assertEqual(self.get(heating_mode='COLLECTIVE', backend='sql').status_code, 400)
+
+    def test_query_plans_use_composite_indexes(self):
+        for query_type, query_value, filters, index in (
+            ('department', '75', {'property_type': 'APARTMENT'}, 'listing_dept_property'),
+            ('department', '75', {'heating_mode': 'COLLECTIVE', 'elevator': True}, 'listing_dept_heating'),
+            ('postal_code', '75012', {'heating_mode': 'COLLECTIVE'}, 'listing_postal_heating'),
+            ('city', 'Paris', {'property_type': 'APARTMENT'}, 'listing_city_property'),
+        ):
+            plan = filter_attributes(filter_listings(query_type, query_value), filters).values_list('price').explain()
+            self.assertIn(f'USING INDEX {index}', plan)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class ListingExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(25):
+            RealEstateListing.objects.create(
+                reference_id=f'export-{index}',
+                dept_code=75 if index % 5 else 13,
+                city='Paris' if index % 5 else 'Marseille',
+                price=100000 + index,
+                surface=[30.5, 12.0] if index == 1 else [40.0 + index],
+                heating_mode='COLLECTIVE' if index % 2 else 'INDIVIDUAL',
+            )
+        cls.paris_ids = list(RealEstateListing.objects.filter(dept_code=75).order_by('id').values_list('id', flat=True))
+
+    def test_keyset_pages(self):
+        ids, url = [], '/api/listings/?query_type=department&query_value=75&fields=price,surface&limit=8'
+        while url:
+            with self.assertNumQueries(1):
+                data = self.client.get(url).json()
+            self.assertTrue(all(set(listing) == {'id', 'price', 'surface'} for listing in data['results']))
+            ids += [listing['id'] for listing in data['results']]
+            url = data['next']
+        self.assertEqual(ids, self.paris_ids)
+        self.assertEqual(self.client.get('/api/listings/', {'fields': 'price,content_hash'}).status_code, 400)
+
+    def test_streaming_export(self):
+        response = self.client.get(
+            '/api/listings/export/', {'query_type': 'city', 'query_value': 'paris', 'heating_mode': 'COLLECTIVE'}
+        )
+        listings = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        expected = RealEstateListing.objects.filter(dept_code=75, heating_mode='COLLECTIVE').order_by('id')
+        self.assertEqual([listing['reference_id'] for listing in listings], [listing.reference_id for listing in expected])
+
+        response = self.client.get('/api/listings/export/', {'format': 'csv', 'fields': 'reference_id,surface'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[:3], ['id,reference_id,surface', f'{self.paris_ids[0] - 1},export-0,[40.0]', f'{self.paris_ids[0]},export-1,"[30.5, 12.0]"'])
+        self.assertEqual(len(lines), 26)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class SpatialStatisticsTests(TestCase):
+    """Radius and bounding box statistics, served from the R*Tree kept in sync with the listings."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Listings 0.5, 1.5, 3 and 6 km north of the center
+        for index, km in enumerate((0.5, 1.5, 3, 6)):
+            RealEstateListing.objects.create(
+                reference_id=f'geo-{index}',
+                city='Paris',
+                price=100000 * (index + 1),
+                latitude=48.8566 + km / KM_PER_DEGREE,
+                longitude=2.3522,
+            )
+
+    def count(self, query_type, query_value):
+        response = self.client.get('/api/stats/', {'query_type': query_type, 'query_value': query_value})
+        return response.json()['count'] if response.status_code == 200 else response.status_code
+
+    def test_radius(self):
+        self.assertEqual(self.count('radius', '48.8566,2.3522,2'), 2)
+        self.assertEqual(self.count('radius', '48.8566,2.3522,4'), 3)
+        self.assertEqual(self.count('radius', '48.8566,2.3522,0.1'), 404)
+        self.assertEqual(sql_area_statistics('radius', '48.8566,2.3522,4')[0], 3)
+
+    def test_bbox(self):
+        self.assertEqual(self.count('bbox', '48.85,2.35,48.90,2.36'), 3)
+        self.assertEqual(self.count('bbox', '48.90,2.35,48.85,2.36'), 400)
+
+    def test_index_follows_listing_changes(self):
+        listing = RealEstateListing.objects.get(reference_id='geo-0')
+        listing.latitude += 5 / KM_PER_DEGREE
+        listing.save()
+        self.assertEqual(self.count('radius', '48.8566,2.3522,2'), 1)
+        RealEstateListing.objects.filter(reference_id='geo-1').delete()
+        self.assertEqual(self.count('radius', '48.8566,2.3522,2'), 404)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class TimeseriesTests(TestCase):
+    """Monthly rollups must match the statistics of the listings published in each month."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(12):
+            RealEstateListing.objects.create(
+                reference_id=f'month-{index}',
+                dept_code=75,
+                postal_code=75011,
+                city='Paris',
+                price=200000 + 5000 * index,
+                surface=[30 + index],
+                condominium_expenses=900 + 50 * index,
+                publication_start_date=f'2023-{1 + index % 3:02d}-15T08:00:00.000Z',
+            )
+        RealEstateListing.objects.create(reference_id='month-undated', dept_code=75, price=1)
+        rebuild_monthly_statistics()
+
+    def get(self, **params):
+        return self.client.get('/api/stats/timeseries/', {'query_type': 'department', 'query_value': '75', **params})
+
+    def test_months_match_listings(self):
+        data = self.get(metric='price').json()
+        self.assertEqual(data['months'], ['2023-01', '2023-02', '2023-03'])
+        self.assertEqual(data['counts'], [4, 4, 4])
+        for position, month in enumerate(range(1, 4)):
+            prices = RealEstateListing.objects.filter(publication_date__month=month).values_list('price', flat=True)
+            self.assertAlmostEqual(data['mean'][position], np.mean(prices))
+            self.assertAlmostEqual(data['quantile_90'][position], np.quantile(prices, 0.9))
+        self.assertEqual(self.get(start='2023-02', end='2023-02').json()['months'], ['2023-02'])
+        self.assertEqual(self.get(query_value='13').status_code, 404)
+
+    def test_incremental_refresh(self):
+        listing = RealEstateListing.objects.get(reference_id='month-0')
+        previous = listing_area_months(listing.dept_code, listing.postal_code, listing.city, listing.publication_date)
+        listing.publication_start_date = '2023-04-02T08:00:00.000Z'
+        listing.save()
+        refresh_monthly_statistics(previous | listing_area_months(
+            listing.dept_code, listing.postal_code, listing.city, listing.publication_date
+        ))
+        data = self.get(query_type='postal_code', query_value='75011').json()
+        self.assertEqual(data['months'], ['2023-01', '2023-02', '2023-03', '2023-04'])
+        self.assertEqual(data['counts'], [3, 4, 4, 1])
+
+    def test_rebuild_statistics_command(self):
+        MonthlyStatistics.objects.all().delete()
+        call_command('rebuild_statistics', stdout=io.StringIO())
+        self.assertEqual(self.get(metric='price').json()['counts'], [4, 4, 4])
+        self.assertEqual(AreaStatistics.objects.get(query_type='department', query_value='75').count, 13)
+
+
+class SnapshotTests(SimpleTestCase):
+    rows = [
+        (75, 75001, 300000.0, 40.0, 1200.0, 30.0),
+        (13, 13001, 150000.0, 55.0, None, None),
+        (75, 75002, 500000.0, 80.0, 2400.0, 30.0),
+        (75, 75001, 250000.0, None, 900.0, None),
+        (None, None, 100000.0, 20.0, 300.0, 15.0),
+    ]
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory = temporary.name
+        self.assertEqual(write_snapshot(self.directory, self.rows), len(self.rows))
+        self.snapshot = get_snapshot(self.directory)
+
+    def test_area_columns(self):
+        prices, surfaces, _, _ = self.snapshot.area_columns('department', '75')
+        # Sorted by postal code, listings of a postal code in their original order
+        self.assertEqual(prices.tolist(), [300000.0, 250000.0, 500000.0])
+        np.testing.assert_array_equal(surfaces, [40.0, np.nan, 80.0])
+        self.assertEqual(self.snapshot.area_columns('postal_code', '75002', ('price',))[0].tolist(), [500000.0])
+        self.assertEqual(self.snapshot.area_columns('department', '69')[0].size, 0)
+        self.assertIsNone(self.snapshot.area_columns('city', 'Paris'))
+        self.assertEqual(self.snapshot.index['rows'], len(self.rows))
+
+    def test_area_statistics(self):
+        count, stats = self.snapshot.area_statistics('department', '75')
+        self.assertEqual(count, 3)
+        self.assertEqual(stats, compute_statistics(*self.snapshot.area_columns('department', '75')))
+        self.assertEqual(self.snapshot.area_statistics('postal_code', '13001')[0], 1)
+        self.assertEqual(self.snapshot.area_statistics('department', '69'), (0, None))
+        self.assertIsNone(self.snapshot.area_statistics('city', 'Paris'))
+
+    def test_new_version_is_published(self):
+        write_snapshot(self.directory, self.rows[:2])
+        snapshot = get_snapshot(self.directory)
+        self.assertNotEqual(snapshot.path, self.snapshot.path)
+        self.assertEqual(snapshot.area_statistics('department', '75')[0], 1)
+        self.assertGreaterEqual(snapshot.exported_at, self.snapshot.exported_at)
+        self.assertTrue(snapshot.is_current())
+        record_write(self.directory)
+        self.assertFalse(snapshot.is_current())
+        # Versions without an export time are never current
+        write_snapshot(self.directory, self.rows)
+        snapshot = get_snapshot(self.directory)
+        self.assertTrue(snapshot.is_current())
+        with open(os.path.join(snapshot.path, 'index.json'), 'w') as f:
+            json.dump({'rows': 0, 'department': {}, 'postal_code': {}}, f)
+        self.assertFalse(Snapshot(snapshot.path).is_current())
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class SnapshotFreshnessTests(TestCase):
+    params = {'query_type': 'department', 'query_value': '75'}
+
+    def setUp(self):
+        caches[STATISTICS_CACHE].clear()
+        for index in range(3):
+            RealEstateListing.objects.create(reference_id=f'snap-{index}', dept_code=75, city='Paris', price=200000 + index)
+        rebuild_area_statistics()
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory = temporary.name
+        snapshot_settings = self.settings(STATISTICS_SNAPSHOT_DIR=self.directory)
+        snapshot_settings.enable()
+        self.addCleanup(snapshot_settings.disable)
+        export_snapshot(self.directory)
+
+    def write_listing(self, **fields):
+        """Write a listing the way BienIci and incremental imports do, after the export."""
+        with self.captureOnCommitCallbacks(execute=True):
+            listing = RealEstateListing.objects.create(city='Paris', price=100000, **fields)
+            refresh_area_statistics(listing_areas(listing.dept_code, listing.postal_code, listing.city))
+
+    def test_current_snapshot_is_served_without_queries(self):
+        served = STATISTICS_QUERIES.value(query_type='department', source='snapshot')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/stats/', self.params)
+        self.assertEqual(response.json()['count'], 3)
+        self.assertEqual(STATISTICS_QUERIES.value(query_type='department', source='snapshot'), served + 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/stats/', self.params, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_areas_written_after_the_export_are_read_from_the_database(self):
+        served = STATISTICS_QUERIES.value(query_type='department', source='snapshot')
+        self.write_listing(reference_id='snap-new', dept_code=75)
+        self.assertEqual(self.client.get('/api/stats/', self.params).json()['count'], 4)
+        self.assertEqual(STATISTICS_QUERIES.value(query_type='department', source='snapshot'), served)
+        histogram = self.client.get('/api/stats/histogram/', {**self.params, 'metric': 'price'}).json()
+        self.assertEqual(histogram['count'], 4)
+        self.assertEqual(self.client.get('/api/stats/', {**self.params, 'backend': 'snapshot'}).json()['count'], 4)
+
+    def test_snapshot_backend_falls_back_for_areas_created_after_the_export(self):
+        params = {'query_type': 'postal_code', 'query_value': '69001', 'backend': 'snapshot'}
+        # Current snapshot without the area
+        RealEstateListing.objects.create(reference_id='snap-later', dept_code=69, postal_code=69001, price=1000)
+        self.assertEqual(self.client.get('/api/stats/', params).json()['count'], 1)
+        self.write_listing(reference_id='snap-new', dept_code=13, postal_code=13001)
+        self.assertEqual(self.client.get('/api/stats/', {**params, 'query_value': '13001'}).json()['count'], 1)
+
+
+class QuantileSketchTests(SimpleTestCase):
+    def setUp(self):
+        self.values = np.random.default_rng(7).lognormal(12, 0.8, 5000)
+        self.values[::50] = 0.0
+        self.values[::97] = np.nan
+
+    def test_relative_accuracy(self):
+        sketch = QuantileSketch(0.01)
+        sketch.add(self.values)
+        exact = np.quantile(self.values[~np.isnan(self.values)], (0.1, 0.5, 0.9))
+        for approximate, value in zip(sketch.quantiles((0.1, 0.5, 0.9)), exact):
+            self.assertLessEqual(abs(approximate - value), 0.01 * value)
+
+    def test_merge(self):
+        whole, first, second = QuantileSketch(0.01), QuantileSketch(0.01), QuantileSketch(0.01)
+        whole.add(self.values)
+        first.add(self.values[:1234])
+        second.add(self.values[1234:])
+        first.merge(QuantileSketch.from_dict(second.to_dict()))
+        self.assertEqual(first.count, whole.count)
+        self.assertEqual(first.positive, whole.positive)
+        self.assertEqual(first.quantiles(), whole.quantiles())
+        self.assertAlmostEqual(first.mean(), whole.mean())
+
+
+class ParseSurfaceTests(SimpleTestCase):
+    def test_valid_surfaces(self):
+        self.assertEqual(parse_surface('45.5'), [45.5])
+        self.assertEqual(parse_surface(' 45 '), [45.0])
+        self.assertEqual(parse_surface('[45.5, 12.0]'), [45.5, 12.0])
+        self.assertEqual(parse_surface(' [ 45 ,12 ] '), [45.0, 12.0])
+        self.assertEqual(parse_surface(45), [45.0])
+        self.assertEqual(parse_surface([45.5, '12']), [45.5, 12.0])
+
+    def test_empty_surfaces(self):
+        for value in (None, '', '   ', float('nan')):
+            self.assertIsNone(parse_surface(value), value)
+        self.assertEqual(parse_surface('[]'), [])
+        self.assertEqual(parse_surface('[ ]'), [])
+
+    def test_malformed_surfaces(self):
+        for value in ('abc', '[45', '45]', 'nan', 'inf', '1e999', True, {'surface': 45}):
+            self.assertIsNone(parse_surface(value), value)
+        self.assertEqual(parse_surface('[45, abc]'), [45.0, None])
+        self.assertEqual(parse_surface('[45,, 12]'), [45.0, None, 12.0])
+
+    def test_nested_surfaces(self):
+        self.assertEqual(parse_surface('[[45, 12]]'), [None, None])
+        self.assertEqual(parse_surface([[45.0], 12.0]), [None, 12.0])
+
+    def test_malicious_surfaces_are_never_evaluated(self):
+        with mock.patch('os.system') as system, mock.patch('builtins.__import__', wraps=__import__) as import_:
+            self.assertEqual(parse_surface("[__import__('os').system('id')]"), [None])
+            self.assertIsNone(parse_surface("__import__('os').system('id')"))
+            self.assertEqual(parse_surface("[1, (lambda: 2)()]"), [1.0, None])
+        system.assert_not_called()
+        import_.assert_not_called()
+
+    def test_surface_column(self):
+        parsed = parse_surface_column(['[45.5, 12.0]', '30', None, '[]', '[abc]'])
+        np.testing.assert_array_equal(parsed.primary, [45.5, 30.0, np.nan, np.nan, np.nan])
+        self.assertEqual(parsed.counts.tolist(), [2, 1, 0, 0, 1])
+        self.assertEqual(parsed.lists, [[45.5, 12.0], [30.0], None, [], [None]])
+
+
+class CityKeyTests(SimpleTestCase):
+    def test_spellings_of_a_city_share_a_key(self):
+        for city in ('Saint-Étienne', 'St Etienne', 'ST-ÉTIENNE', 'saint  étienne ', 'St.-Étienne'):
+            self.assertEqual(city_key(city), 'saint etienne', city)
+        self.assertEqual(city_key("L'Haÿ-les-Roses"), 'l hay les roses')
+        self.assertEqual(city_key('Ste-Foy-lès-Lyon'), 'sainte foy les lyon')
+        # Only whole words are abbreviations
+        self.assertEqual(city_key('Stains'), 'stains')
+        self.assertEqual(city_key('Paris 11e Arrondissement'), 'paris 11e arrondissement')
+
+    def test_empty_city(self):
+        self.assertEqual(city_key(None), '')
+        self.assertEqual(city_key(''), '')
+        self.assertEqual(city_key(' - '), '')
+
+
+class SketchUpdateTests(TestCase):
+    def listing(self, index, price):
+        return {
+            'reference_id': f'sketch-{index}', 'dept_code': 75, 'postal_code': 75011, 'city': 'Paris',
+            'price': price, 'primary_surface': 40.0, 'condominium_expenses': 1200.0, 'fees_per_sqm': 30.0,
+        }
+
+    def concurrent_adds(self, first, second):
+        """Add ``first``, with ``second`` added and committed between the read and the write of its sketches."""
+        filter_sketches = AreaSketch.objects.filter
+        reads = []
+
+        def concurrent_filter(*args, **kwargs):
+            if reads or 'dept_code__in' not in kwargs:
+                return filter_sketches(*args, **kwargs)
+            reads.append(list(filter_sketches(*args, **kwargs)))
+            add_listings_to_sketches(second)
+            return reads[0]
+
+        with mock.patch.object(AreaSketch.objects, 'filter', concurrent_filter):
+            add_listings_to_sketches(first)
+
+    def test_concurrent_adds_keep_every_listing(self):
+        add_listings_to_sketches([self.listing(0, 100000.0)])
+        self.concurrent_adds([self.listing(1, 200000.0), self.listing(2, 300000.0)], [self.listing(3, 400000.0)])
+        self.assertEqual(AreaSketch.objects.get().count, 4)
+        count, stats = sketch_area_statistics('department', '75')
+        self.assertEqual(count, 4)
+        self.assertAlmostEqual(stats['mean_price'], 250000.0)
+
+    def test_concurrent_adds_creating_a_cell(self):
+        self.concurrent_adds([self.listing(1, 200000.0)], [self.listing(2, 300000.0)])
+        self.assertEqual(AreaSketch.objects.get().count, 2)
+        self.assertAlmostEqual(sketch_area_statistics('department', '75')[1]['mean_price'], 250000.0)
+
+
+class SyntheticListingsTests(SimpleTestCase):
+    def test_generated_listings(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, f'{name}.csv') for name in ('a', 'b', 'c')]
+            generate_listings_csv(paths[0], 3000, seed=1)
+            generate_listings_csv(paths[1], 3000, seed=1)
+            generate_listings_csv(paths[2], 3000, seed=2)
+            contents = []
+            for path in paths:
+                with open(path, 'rb') as f:
+                    contents.append(f.read())
+            rows = convert_chunk(next(read_csv_chunks(paths[0], 3000)))
+
+        self.assertEqual(contents[0], contents[1])
+        self.assertNotEqual(contents[0], contents[2])
+        self.assertEqual(len({row['reference_id'] for row in rows}), 3000)
+        departments = np.unique([row['dept_code'] for row in rows], return_counts=True)
+        self.assertEqual(departments[0][np.argmax(departments[1])], 75)
+        self.assertTrue(any(row['surface'] and len(row['surface']) > 1 for row in rows))
+        self.assertTrue(any(row['fees_per_sqm'] for row in rows))
+
+
+class IngestionPipelineTests(SimpleTestCase):
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.directory = temporary.name
+        self.csv_path = os.path.join(self.directory, 'listings.csv')
+        generate_listings_csv(self.csv_path, 200, seed=4)
+
+    def test_tarball_is_streamed(self):
+        tar_path = os.path.join(self.directory, 'listings.csv.tar.gz')
+        with tarfile.open(tar_path, 'w:gz') as tar:
+            tar.add(self.csv_path, arcname='dataset/listings.csv')
+        for skip_rows in (0, 30):
+            expected = list(read_csv_chunks(self.csv_path, 50, skip_rows=skip_rows))
+            streamed = list(read_csv_chunks(tar_path, 50, skip_rows=skip_rows))
+            self.assertEqual([len(chunk) for chunk in streamed], [len(chunk) for chunk in expected])
+            for chunk, expected_chunk in zip(streamed, expected):
+                self.assertTrue(chunk.reset_index(drop=True).equals(expected_chunk.reset_index(drop=True)))
+
+        empty_path = os.path.join(self.directory, 'empty.tar.gz')
+        with tarfile.open(empty_path, 'w:gz'):
+            pass
+        with self.assertRaisesMessage(ValueError, "No CSV file found in the tarball!"):
+            list(read_csv_chunks(empty_path, 50))
+
+    def test_writer_failure_stops_the_producer(self):
+        read = []
+
+        def chunks():
+            for chunk in read_csv_chunks(self.csv_path, 10):
+                read.append(len(chunk))
+                yield chunk
+
+        def write_rows(rows, consumed):
+            raise RuntimeError("Write failed")
+
+        with self.assertRaisesMessage(RuntimeError, "Write failed"):
+            run_pipeline(chunks(), write_rows)
+        # At most the queued chunks and the one being converted, out of 20
+        self.assertLessEqual(len(read), 6)
+
+
+class ImportListingsTests(TransactionTestCase):
+    """import_listings end to end on synthetic listings, its writer thread needing real transactions."""
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.csv_path = os.path.join(temporary.name, 'listings.csv')
+        generate_listings_csv(self.csv_path, 400, seed=3)
+
+    def import_listings(self, **options):
+        stdout = io.StringIO()
+        call_command('import_listings', file=self.csv_path, workers=0, chunk_size=100, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def listing_indexes(self):
+        """Names of the indexes and triggers of the listing table."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = %s",
+                [RealEstateListing._meta.db_table]
+            )
+            return {name for name, in cursor.fetchall()}
+
+    def interrupted_import(self, **options):
+        """Run an import failing on its second chunk, once the first one is written."""
+        calls = []
+
+        def upsert(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError("Interrupted")
+            return upsert_listing_rows(*args, **kwargs)
+
+        with mock.patch('api.management.commands.import_listings.upsert_listing_rows', upsert):
+            return self.import_listings(**options)
+
+    def assert_resumes(self, engine):
+        indexes = self.listing_indexes()
+        self.assertIn("Error during import: Interrupted", self.interrupted_import(engine=engine))
+        checkpoint = ImportCheckpoint.objects.get()
+        self.assertEqual((checkpoint.rows_done, checkpoint.completed), (100, False))
+        self.assertEqual(RealEstateListing.objects.count(), 100)
+        self.assertEqual(self.listing_indexes(), indexes)
+
+        self.assertIn("Resuming the interrupted import after 100 rows", self.import_listings(engine=engine))
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.rows_done, checkpoint.completed, checkpoint.dropped_indexes), (400, True, []))
+        self.assertEqual(RealEstateListing.objects.count(), 400)
+        self.assertEqual(AreaStatistics.objects.get(query_type='department', query_value='75').count,
+                         RealEstateListing.objects.filter(dept_code=75).count())
+        self.assertEqual(self.listing_indexes(), indexes)
+
+    def test_interrupted_import_resumes(self):
+        self.assert_resumes('orm')
+
+    def test_interrupted_fast_import_resumes(self):
+        self.assert_resumes('sqlite-fast')
+
+    def test_csv_job_heartbeat_covers_the_refresh_and_export(self):
+        job = ImportJob.objects.create(kind='csv', params={'file': self.csv_path}, status='queued')
+        heartbeats = []
+
+        def record_heartbeat(*args):
+            heartbeats.append(ImportJob.objects.get(id=job.id).heartbeat_at)
+            return 0
+
+        with tempfile.TemporaryDirectory() as directory, self.settings(STATISTICS_SNAPSHOT_DIR=directory), \
+                mock.patch('api.management.commands.import_listings.rebuild_monthly_statistics', record_heartbeat), \
+                mock.patch('api.management.commands.import_listings.refresh_monthly_statistics', record_heartbeat), \
+                mock.patch('api.management.commands.import_listings.export_snapshot', record_heartbeat), \
+                mock.patch('api.management.commands.import_listings.run_pipeline', wraps=run_pipeline) as pipeline:
+            run_job(job.id)
+        self.assertEqual(pipeline.call_args.kwargs['workers'], settings.IMPORT_JOB_CSV_WORKERS)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_done), ('succeeded', 400))
+        # Updated after the last chunk, before the statistics and before the export
+        self.assertEqual(len(heartbeats), 2)
+        self.assertLess(heartbeats[0], heartbeats[1])
+
+    def test_failed_refresh_is_rebuilt_on_rerun(self):
+        with mock.patch(
+            'api.management.commands.import_listings.refresh_area_statistics', side_effect=RuntimeError("Refresh failed")
+        ), mock.patch(
+            'api.management.commands.import_listings.rebuild_area_statistics', side_effect=RuntimeError("Refresh failed")
+        ):
+            self.assertIn("Error during import: Refresh failed", self.import_listings())
+        checkpoint = ImportCheckpoint.objects.get()
+        self.assertEqual((checkpoint.rows_done, checkpoint.completed), (400, False))
+        self.assertFalse(AreaStatistics.objects.exists())
+
+        self.assertIn("Rebuilt statistics of", self.import_listings())
+        checkpoint.refresh_from_db()
+        self.assertTrue(checkpoint.completed)
+        self.assertEqual(AreaStatistics.objects.get(query_type='department', query_value='75').count,
+                         RealEstateListing.objects.filter(dept_code=75).count())
+
+    def test_fast_engine_matches_orm(self):
+        indexes = self.listing_indexes()
+        # Filter indexes of migrations 0010 and 0011, R*Tree triggers of 0009
+        self.assertTrue({
+            'listing_dept_property', 'listing_dept_heating', 'listing_postal_heating', 'listing_city_property',
+            'listing_dept_published', 'api_listing_rtree_insert', 'api_listing_rtree_update', 'api_listing_rtree_delete',
+        } <= indexes)
+        self.assertTrue(any(name.startswith('api_realestatelisting_publication_date_') for name in indexes))
+        fields = [field.name for field in RealEstateListing._meta.concrete_fields if field.name != 'id']
+
+        self.import_listings(engine='orm')
+        orm_rows = list(RealEstateListing.objects.order_by('reference_id').values_list(*fields))
+        RealEstateListing.objects.all().delete()
+
+        self.import_listings(engine='sqlite-fast')
+        self.assertEqual(list(RealEstateListing.objects.order_by('reference_id').values_list(*fields)), orm_rows)
+        self.assertEqual(self.listing_indexes(), indexes)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM api_listing_rtree")
+            self.assertEqual(
+                cursor.fetchone()[0],
+                RealEstateListing.objects.filter(latitude__isnull=False, longitude__isnull=False).count()
+            )
+
+    def test_fast_import_rebuilds_indexes_of_killed_load(self):
+        indexes = self.listing_indexes()
+        killed = ImportCheckpoint.objects.create(source='killed.csv', source_signature='0:0')
+        # Killed before its exit
+        SQLiteFastLoader(checkpoint=killed).__enter__()
+        killed.refresh_from_db()
+        self.assertTrue(killed.dropped_indexes)
+        self.assertEqual(self.listing_indexes(), indexes - {name for name, sql in killed.dropped_indexes})
+
+        self.import_listings(engine='sqlite-fast')
+        killed.refresh_from_db()
+        self.assertEqual(killed.dropped_indexes, [])
+        self.assertEqual(self.listing_indexes(), indexes)
+
+    def test_reimport_writes_only_changed_listings(self):
+        self.import_listings()
+        with open(self.csv_path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        rows[0]['PRICE'] = str(float(rows[0]['PRICE']) + 1000)
+        with open(self.csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+        self.assertIn("0 created, 1 updated, 399 unchanged or skipped.", self.import_listings())
+        self.assertEqual(
+            RealEstateListing.objects.get(reference_id=rows[0]['REFERENCE_NUMBER']).price, float(rows[0]['PRICE'])
+        )
+        self.assertIn("0 created, 0 updated, 400 unchanged or skipped.", self.import_listings(restart=True))
+
+    def test_import_evicts_cached_areas_of_other_processes(self):
+        # The statistics cache of a web worker, a process of its own
+        worker_cache = FileBasedCache(settings.CACHES['statistics']['LOCATION'], {})
+        key = statistics_cache_key('department', '75')
+        worker_cache.set(key, (1, {'mean_price': 1.0}))
+        self.assertEqual(get_cached_statistics('department', '75'), (1, {'mean_price': 1.0}))
+
+        self.import_listings()
+        self.assertIsNone(worker_cache.get(key))
+        self.assertIsNone(get_cached_statistics('department', '75'))
+
+
+class StubBienIciHandler(BaseHTTPRequestHandler):
+    """Mimics the BienIci realEstateAd.json endpoint, failing once for ids listed in ``flaky``."""
+
+    listings = {}
+    flaky = set()
+
+    def do_GET(self):
+        listing_id = parse_qs(urlparse(self.path).query).get('id', [''])[0]
+        if listing_id in self.flaky:
+            self.flaky.discard(listing_id)
+            self.send_response(503)
+            self.end_headers()
+            return
+        if listing_id not in self.listings:
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = json.dumps(self.listings[listing_id]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BienIciImportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubBienIciHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.api_url = f'http://127.0.0.1:{cls.server.server_port}/realEstateAd.json'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StubBienIciHandler.listings = {
+            f'ad-{index}': {
+                'reference': f'ad-{index}',
+                'postalCode': '75011' if index % 2 else '69003',
+                'city': 'Paris' if index % 2 else 'Lyon',
+                'price': 200000 + 1000 * index,
+                'surfaceArea': 40 + index,
+                'fees': {'yearly': 1200},
+                'propertyType': 'APARTMENT',
+                'coordinates': {'lat': 48.85, 'lng': 2.37},
+            }
+            for index in range(20)
+        }
+        StubBienIciHandler.flaky = {'ad-3', 'ad-7'}
+
+    def import_ids(self, ids):
+        with self.settings(BIENICI_API_URL=self.api_url, BIENICI_BACKOFF=0):
+            return import_bienici_listings([f'https://www.bienici.com/annonce/{listing_id}' for listing_id in ids])
+
+    def test_bulk_import(self):
+        summary = self.import_ids([f'ad-{index}' for index in range(20)] + ['missing'])
+        self.assertEqual((summary['created'], summary['updated'], summary['unchanged']), (20, 0, 0))
+        self.assertEqual([error['url'] for error in summary['errors']], ['https://www.bienici.com/annonce/missing'])
+
+        listing = RealEstateListing.objects.get(reference_id='ad-3')
+        self.assertEqual((listing.dept_code, listing.postal_code, listing.city_key), (75, 75011, 'paris'))
+        self.assertEqual(listing.fees_per_sqm, 1200 / 43)
+        self.assertEqual(AreaStatistics.objects.get(query_type='department', query_value='69').count, 10)
+
+    def test_reimport_updates_changed_listings(self):
+        self.import_ids(['ad-1', 'ad-2'])
+        StubBienIciHandler.listings['ad-2']['postalCode'] = '75011'
+        summary = self.import_ids(['ad-1', 'ad-2'])
+        self.assertEqual((summary['created'], summary['updated'], summary['unchanged']), (0, 1, 1))
+        self.assertFalse(AreaStatistics.objects.filter(query_type='department', query_value='69').exists())
+        self.assertEqual(AreaStatistics.objects.get(query_type='postal_code', query_value='75011').count, 2)
+
+    def test_only_changed_fields_are_written(self):
+        self.import_ids(['ad-1'])
+        url = 'https://www.bienici.com/annonce/ad-1'
+        StubBienIciHandler.listings['ad-1']['price'] = 150000
+        with self.settings(BIENICI_API_URL=self.api_url):
+            row = listing_row(fetch_listing(url), url)
+        self.assertEqual(changed_fields([row]), ['price', 'content_hash'])
+
+    def test_import_job(self):
+        urls = ['https://www.bienici.com/annonce/ad-1', 'https://www.bienici.com/annonce/missing']
+        request = {'kind': 'csv', 'file': 'dataset_annonces.csv.tar.gz'}
+        self.assertEqual(self.client.post('/api/imports/', request, content_type='application/json').status_code, 403)
+        self.assertEqual(self.client.get('/api/imports/', HTTP_ACCEPT='application/json').status_code, 403)
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/imports/', {'kind': 'bienici', 'urls': urls}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['job']['status'], 'queued')
+        self.assertEqual(len(callbacks), 1)
+
+        job_id = response.json()['job']['id']
+        with self.settings(BIENICI_API_URL=self.api_url, BIENICI_BACKOFF=0):
+            run_job(job_id)
+        job = self.client.get(f'/api/imports/{job_id}/', HTTP_ACCEPT='application/json').json()
+        self.assertEqual((job['status'], job['rows_done'], job['rows_total']), ('succeeded', 2, 2))
+        self.assertEqual(job['result'], {'created': 1, 'updated': 0, 'unchanged': 0})
+        self.assertEqual(len(job['errors']), 1)
+        # A job runs once
+        run_job(job_id)
+        self.assertEqual(ImportJob.objects.get(id=job_id).result['created'], 1)
+
+    def test_job_marked_failed_while_running_keeps_its_status(self):
+        job = ImportJob.objects.create(kind='bienici', params={'urls': []})
+
+        def marked_stale(job):
+            ImportJob.objects.filter(id=job.id).update(status='failed', errors=['Interrupted'])
+
+        with mock.patch.dict('api.jobs.JOB_RUNNERS', {'bienici': marked_stale}):
+            run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.errors), ('failed', ['Interrupted']))
+
+    @override_settings(IMPORT_JOB_STALE_AFTER=600)
+    def test_stale_running_jobs_fail(self):
+        long_ago = timezone.now() - timedelta(hours=1)
+        stale = ImportJob.objects.create(kind='csv', status='running', started_at=long_ago, heartbeat_at=long_ago)
+        legacy = ImportJob.objects.create(kind='csv', status='running', started_at=long_ago)
+        alive = ImportJob.objects.create(kind='csv', status='running', started_at=long_ago, heartbeat_at=timezone.now())
+        self.assertEqual(fail_stale_jobs(), 2)
+        for job in (stale, legacy):
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'failed')
+            self.assertIsNotNone(job.finished_at)
+            self.assertIn('Interrupted', job.errors[-1])
+        alive.refresh_from_db()
+        self.assertEqual(alive.status, 'running')
@@ -0,0 +1,133 @@
+"""
+Monthly statistics of the areas, by listing publication month.
+
+MonthlyStatistics holds one row per department, postal code or city and
+publication month, so that a time series is read from precomputed rows
+without scanning the listings. Imports refresh the (area, month) pairs their
+listings changed; rebuild_monthly_statistics recomputes every row.
+"""
+import logging
+from collections import defaultdict
+from datetime import date
+
+from django.db import transaction
+from django.db.models import Q
+
+from .aggregates import AREA_COLUMNS, group_statistics
+from .areas import filter_listings, listing_areas, normalize_area_value
+from .models import MonthlyStatistics, RealEstateListing
+from .statistics import STATISTIC_COLUMNS, STATISTIC_FIELDS, to_float_array
+
+logger = logging.getLogger(__name__)
+
+# Fields written when refreshing a monthly statistics row
+UPDATE_FIELDS = ['count', *STATISTIC_FIELDS, 'updated_at']
+
+
+def month_start(day):
+    """First day of the month of a date, None when missing."""
+    return day.replace(day=1) if day is not None else None
+
+
+def _next_month(month):
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+
+def listing_area_months(dept_code, postal_code, city, publication_date):
+    """Normalized (query_type, query_value, month) rollups a listing belongs to, none without publication date."""
+    month = month_start(publication_date)
+    if month is None:
+        return set()
+    return {(query_type, query_value, month) for query_type, query_value in listing_areas(dept_code, postal_code, city)}
+
+
+def monthly_statistics(query_type, area_keys, publication_dates, prices, surfaces, fees, fees_per_sqm):
+    """
+    Compute the statistics of every (area, month) group of listings, area keys
+    being normalized like query values. Yields (query_value, month, count,
+    statistics).
+    """
+    months = [month_start(day) for day in publication_dates]
+    keys = [
+        f'{month.isoformat()}|{key}' if key and month is not None else ''
+        for key, month in zip(
+            (normalize_area_value(query_type, key) or '' for key in area_keys), months
+        )
+    ]
+    for key, count, stats in group_statistics(keys, prices, surfaces, fees, fees_per_sqm):
+        month, query_value = key.split('|', 1)
+        yield query_value, date.fromisoformat(month), count, stats
+
+
+def _load_columns(queryset):
+    rows = list(queryset.order_by('id').values_list(
+        'dept_code', 'postal_code', 'city_key', 'publication_date', *STATISTIC_COLUMNS
+    ))
+    columns = list(zip(*rows)) if rows else [()] * (4 + len(STATISTIC_COLUMNS))
+    areas = dict(zip(AREA_COLUMNS, columns[:3]))
+    return areas, columns[3], [to_float_array(column) for column in columns[4:]]
+
+
+def rebuild_monthly_statistics():
+    """Recompute the monthly statistics of every area from scratch, returns the number of rows."""
+    areas, publication_dates, metrics = _load_columns(
+        RealEstateListing.objects.filter(publication_date__isnull=False)
+    )
+    rows = [
+        MonthlyStatistics(query_type=query_type, query_value=query_value, month=month, count=count, **stats)
+        for query_type in AREA_COLUMNS
+        for query_value, month, count, stats in monthly_statistics(
+            query_type, areas[query_type], publication_dates, *metrics
+        )
+    ]
+    with transaction.atomic():
+        MonthlyStatistics.objects.all().delete()
+        MonthlyStatistics.objects.bulk_create(rows, batch_size=5000)
+    logger.info(f"Rebuilt {len(rows)} monthly statistics")
+    return len(rows)
+
+
+def refresh_monthly_statistics(area_months):
+    """
+    Recompute the monthly statistics of the given normalized (query_type,
+    query_value, month) triples, with one query per area.
+    """
+    months_by_area = defaultdict(set)
+    for query_type, query_value, month in area_months:
+        months_by_area[(query_type, query_value)].add(month)
+
+    for (query_type, query_value), months in months_by_area.items():
+        listings = filter_listings(query_type, query_value).filter(
+            publication_date__gte=min(months), publication_date__lt=_next_month(max(months))
+        )
+        areas, publication_dates, metrics = _load_columns(listings)
+        computed = {
+            month: (count, stats)
+            for _, month, count, stats in monthly_statistics(
+                query_type, areas[query_type], publication_dates, *metrics
+            )
+            if month in months
+        }
+        with transaction.atomic():
+            MonthlyStatistics.objects.filter(
+                query_type=query_type, query_value=query_value, month__in=months - computed.keys()
+            ).delete()
+            MonthlyStatistics.objects.bulk_create(
+                [
+                    MonthlyStatistics(query_type=query_type, query_value=query_value, month=month, count=count, **stats)
+                    for month, (count, stats) in computed.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['query_type', 'query_value', 'month'],
+                update_fields=UPDATE_FIELDS,
+            )
+
+
+def area_timeseries(query_type, query_value, start=None, end=None):
+    """Precomputed MonthlyStatistics of a normalized area, in month order, between the optional start and end months."""
+    condition = Q(query_type=query_type, query_value=query_value)
+    if start is not None:
+        condition &= Q(month__gte=month_start(start))
+    if end is not None:
+        condition &= Q(month__lte=month_start(end))
+    return list(MonthlyStatistics.objects.filter(condition).order_by('month'))
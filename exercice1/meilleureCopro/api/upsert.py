@@ -0,0 +1,142 @@
+"""
+Shared write path of the listing imports.
+
+Rows are RealEstateListing keyword arguments with a ``content_hash``. They are
+compared with the stored listings by reference_id and content hash, new
+listings are inserted and changed ones updated in bulk, one statement per
+batch, only the fields whose value changed being written. The sketches of
+new listings are updated in the same transaction; the cells, areas and
+months whose listings changed are returned so that the caller refreshes
+them once.
+"""
+from collections import namedtuple
+
+from .aggregates import refresh_area_statistics
+from .areas import listing_areas
+from .models import RealEstateListing
+from .sketches import add_listings_to_sketches, listing_cell, rebuild_sketch_cells
+from .timeseries import listing_area_months, refresh_monthly_statistics
+
+UPSERT_BATCH_SIZE = 5000
+
+# Fields identifying a listing, never updated
+KEY_FIELDS = ('reference_id',)
+
+UpsertResult = namedtuple(
+    'UpsertResult', ['created', 'updated', 'unchanged', 'changed_cells', 'areas', 'area_months']
+)
+
+
+def split_changes(rows, batch_size=UPSERT_BATCH_SIZE):
+    """
+    Compare listing rows with the stored listings.
+    Returns (new rows, changed rows, previous (dept_code, postal_code, city,
+    publication_date) of the changed listings).
+    """
+    existing = {}
+    reference_ids = [row['reference_id'] for row in rows]
+    for start in range(0, len(reference_ids), batch_size):
+        existing.update(
+            (reference_id, stored)
+            for reference_id, *stored in RealEstateListing.objects.filter(
+                reference_id__in=reference_ids[start:start + batch_size]
+            ).values_list('reference_id', 'content_hash', 'dept_code', 'postal_code', 'city', 'publication_date')
+        )
+
+    new_rows, changed_rows, previous_locations = [], [], set()
+    for row in rows:
+        stored = existing.get(row['reference_id'])
+        if stored is None:
+            new_rows.append(row)
+        elif stored[0] != row['content_hash']:
+            changed_rows.append(row)
+            previous_locations.add(tuple(stored[1:]))
+    return new_rows, changed_rows, previous_locations
+
+
+def changed_fields(rows, batch_size=UPSERT_BATCH_SIZE):
+    """Fields of the rows whose value differs from the stored listing with the same reference_id."""
+    fields = [field for field in rows[0] if field not in KEY_FIELDS] if rows else []
+    rows_by_reference = {row['reference_id']: row for row in rows}
+    reference_ids = list(rows_by_reference)
+    changed = set()
+    for start in range(0, len(reference_ids), batch_size):
+        for stored in RealEstateListing.objects.filter(
+            reference_id__in=reference_ids[start:start + batch_size]
+        ).values('reference_id', *fields):
+            row = rows_by_reference[stored['reference_id']]
+            changed.update(field for field in fields if field not in changed and row[field] != stored[field])
+    # Keep the model field order, for stable statements
+    return [field for field in fields if field in changed]
+
+
+def upsert_listings(rows, batch_size=UPSERT_BATCH_SIZE, update_fields=None):
+    """
+    Insert the listing rows, updating the ``update_fields`` (every field by
+    default) of the listings whose reference_id already exists.
+    """
+    if not rows:
+        return
+    if update_fields is None:
+        update_fields = [field for field in rows[0] if field not in KEY_FIELDS]
+    if not update_fields:
+        # Nothing to update: existing listings are left untouched
+        RealEstateListing.objects.bulk_create(
+            [RealEstateListing(**row) for row in rows], batch_size=batch_size, ignore_conflicts=True
+        )
+        return
+    RealEstateListing.objects.bulk_create(
+        [RealEstateListing(**row) for row in rows],
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=list(KEY_FIELDS),
+        update_fields=update_fields,
+    )
+
+
+def _location(row):
+    return row['dept_code'], row['postal_code'], row['city'], row.get('publication_date')
+
+
+def upsert_listing_rows(rows, batch_size=UPSERT_BATCH_SIZE, write=None):
+    """
+    Write the new and changed listing rows, and add the new listings to the
+    sketches. Must run in a transaction. ``write(rows)`` replaces the ORM
+    bulk upsert when given, e.g. by the SQLite fast loader.
+    Returns an UpsertResult; its changed cells and areas are refreshed by
+    refresh_upserted_areas.
+    """
+    new_rows, changed_rows, previous_locations = split_changes(rows, batch_size)
+    if write is not None:
+        write(new_rows + changed_rows)
+    else:
+        upsert_listings(new_rows, batch_size)
+        for start in range(0, len(changed_rows), batch_size):
+            batch = changed_rows[start:start + batch_size]
+            upsert_listings(batch, batch_size, update_fields=changed_fields(batch, batch_size))
+    add_listings_to_sketches(new_rows)
+
+    changed_locations = previous_locations | {_location(row) for row in changed_rows}
+    areas, area_months = set(), set()
+    for location in changed_locations | {_location(row) for row in new_rows}:
+        areas |= listing_areas(*location[:3])
+        area_months |= listing_area_months(*location)
+    return UpsertResult(
+        created=len(new_rows),
+        updated=len(changed_rows),
+        unchanged=len(rows) - len(new_rows) - len(changed_rows),
+        changed_cells={listing_cell(*location[:3]) for location in changed_locations},
+        areas=areas,
+        area_months=area_months,
+    )
+
+
+def refresh_upserted_areas(changed_cells, areas, area_months):
+    """
+    Rebuild the sketches of the cells whose listings were modified (values
+    cannot be removed from a sketch) and refresh the statistics of the areas
+    and of their changed months.
+    """
+    rebuild_sketch_cells(changed_cells)
+    refresh_area_statistics(areas)
+    refresh_monthly_statistics(area_months)
@@ -7,5 +7,14 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('stats/form/', views.form_view, name='stats_form'),
     path('api/stats/', views.StatisticsView.as_view(), name='api_stats'),
+    path('api/stats/histogram/', views.HistogramView.as_view(), name='api_stats_histogram'),
+    path('api/stats/timeseries/', views.TimeseriesView.as_view(), name='api_stats_timeseries'),
+    path('api/stats/batch/', views.StatisticsBatchView.as_view(), name='api_stats_batch'),
+    path('api/listings/', views.ListingsView.as_view(), name='api_listings'),
+    path('api/listings/export/', views.export_listings_view, name='api_listings_export'),
+    path('api/metrics/', views.metrics_view, name='api_metrics'),
     path('api/add/', views.AddBienIciListingView.as_view(), name='api_add_listing'),
+    path('api/add/bulk/', views.AddBienIciListingsView.as_view(), name='api_add_listings'),
+    path('api/imports/', views.ImportJobsView.as_view(), name='api_import_jobs'),
+    path('api/imports/<int:job_id>/', views.ImportJobView.as_view(), name='api_import_job'),
 ]
\ No newline at end of file
@@ -1,5 +1,14 @@
+import re
+import unicodedata
+from datetime import date, datetime
 from enum import Enum
 
+# Abbreviations written out in city keys
+CITY_ABBREVIATIONS = {
+    'st': 'saint',
+    'ste': 'sainte',
+}
+
 class Choices(Enum):
     @classmethod
     def choices(cls):
@@ -18,4 +27,50 @@ class HeatingModes(Choices, Enum):
     COLLECTIVE = 'COLLECTIVE'
 
 class BuildingTypes(Choices, Enum):
-    RECENT = 'RECENT'
\ No newline at end of file
+    RECENT = 'RECENT'
+
+class QueryTypes(Choices, Enum):
+    DEPARTMENT = 'department'
+    CITY = 'city'
+    POSTAL_CODE = 'postal_code'
+
+class ImportJobKinds(Choices, Enum):
+    BIENICI = 'bienici'
+    CSV = 'csv'
+
+class ImportJobStatuses(Choices, Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+
+def city_key(city):
+    """
+    Accent, case and punctuation insensitive key of a city name, '' when
+    empty: 'St-Étienne' and 'saint etienne' both give 'saint etienne'.
+    """
+    if city is None:
+        return ''
+    text = ''.join(
+        char for char in unicodedata.normalize('NFKD', str(city)) if not unicodedata.combining(char)
+    ).casefold()
+    return ' '.join(CITY_ABBREVIATIONS.get(word, word) for word in re.findall(r'[^\W_]+', text))
+
+
+def parse_publication_date(value):
+    """
+    Date of a publication date string, ISO 8601 ('2023-01-12T10:00:00') or
+    French ('12/01/2023'), None when it cannot be parsed.
+    """
+    if not value:
+        return None
+    text = str(value).strip()[:10]
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(text, '%d/%m/%Y').date()
+    except ValueError:
+        return None
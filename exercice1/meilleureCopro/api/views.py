@@ -1,28 +1,100 @@
+import bisect
+import cProfile
 import logging
-import requests
-import pandas as pd
+import time
 
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.urls import reverse
 from django.contrib import messages
+from django.conf import settings
+from django.db.models import Q
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.renderers import JSONRenderer, TemplateHTMLRenderer
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer, TemplateHTMLRenderer
 
-from .models import RealEstateListing
-from .serializer import StatisticsQuerySerializer, StatisticsResponseSerializer, RealEstateListingSerializer, BienIciImportSerializer
+from .aggregates import (
+    AREA_COLUMNS, area_histogram, area_statistics, batch_area_statistics, current_snapshot, filtered_statistics,
+)
+from .areas import filter_listings, normalize_area_value
+from .conditional import area_validators, snapshot_validators, statistics_etag
+from .cache import (
+    cache_histogram, cache_many_statistics, cache_statistics, get_cached_histogram, get_cached_statistics,
+    get_many_cached_statistics,
+)
+from .export import EXPORT_FORMATS, export_listings
+from .filters import filter_attributes
+from .jobs import enqueue_job, resolve_import_file
+from .metrics import (
+    REQUEST_SECONDS, STATISTICS_QUERIES, STATISTICS_ROWS, collect_spans, profile_summary, render_metrics, span,
+)
+from .models import AreaStatistics, ImportJob, RealEstateListing
+from .renderers import FastJSONRenderer
+from .serializer import StatisticsQuerySerializer, StatisticsBatchSerializer, HistogramQuerySerializer, TimeseriesQuerySerializer, StatisticsResponseSerializer, RealEstateListingSerializer, BienIciImportSerializer, BienIciBulkImportSerializer, ImportJobRequestSerializer, ImportJobSerializer, ListingFilterSerializer, ListingQuerySerializer, ListingExportQuerySerializer
+from .spatial import SPATIAL_QUERY_TYPES
+from .statistics import STATISTIC_FIELDS
+from .timeseries import area_timeseries
+from .utils import ImportJobKinds
 
 logger = logging.getLogger(__name__)
 
+# Jobs listed by GET /api/imports/
+RECENT_IMPORT_JOBS = 50
+
+# Values of a row of the compact batch layout
+BATCH_COMPACT_FIELDS = ('query_type', 'query_value', 'count', *STATISTIC_FIELDS)
+
 def index(request):
     return redirect(reverse('api:stats_form'))
 
 def form_view(request):
     return render(request, 'listings/form.html')
 
-class StatisticsView(APIView):
+def metrics_view(request):
+    """Metrics of this process in the Prometheus text format."""
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+class InstrumentedView(APIView):
+    """
+    APIView recording its latency, rendering included, by query_type. With
+    PROFILE_REQUESTS, ``?profile=1`` runs the request under cProfile and adds
+    its spans and most expensive functions to the response.
+    """
+    endpoint = None
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def dispatch(self, request, *args, **kwargs):
+        start = time.perf_counter()
+        profiler = cProfile.Profile() if settings.PROFILE_REQUESTS and request.GET.get('profile') == '1' else None
+        with collect_spans() as spans:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = super().dispatch(request, *args, **kwargs)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+            if profiler is not None and isinstance(response.data, dict):
+                response.data['profile'] = profile_summary(profiler, spans)
+            with span('render'):
+                response.render()
+
+        query_type = request.GET.get('query_type', '')
+        if query_type and query_type not in dict(StatisticsQuerySerializer.QUERY_TYPES):
+            # Unvalidated values would make the label set unbounded
+            query_type = 'invalid'
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=self.endpoint, query_type=query_type)
+        return response
+
+class StatisticsView(InstrumentedView):
+    endpoint = 'stats'
+
     def get(self, request):
         serializer = StatisticsQuerySerializer(data=request.query_params)
         
@@ -31,102 +103,343 @@ class StatisticsView(APIView):
         
         query_type = serializer.validated_data['query_type']
         query_value = serializer.validated_data['query_value']
+        backend = serializer.validated_data.get('backend')
+        filters = StatisticsQuerySerializer.filters(serializer.validated_data)
+        group_by = serializer.validated_data.get('group_by')
 
-        if query_type == 'department':
-            listings = RealEstateListing.objects.filter(dept_code=query_value)
-        elif query_type == 'city':
-            listings = RealEstateListing.objects.filter(city__iexact=query_value)
-        elif query_type == 'postal_code':
-            listings = RealEstateListing.objects.filter(postal_code=query_value)
+        # A current snapshot serves the area without any query
+        snapshot = None if filters or group_by or backend else current_snapshot(query_type, query_value)
+        area = self._get_area(query_type, query_value) if snapshot is None else None
+        etag = last_modified = None
+        if snapshot is not None or area is not None:
+            version, last_modified = snapshot_validators(snapshot) if snapshot is not None else area_validators(area)
+            etag = statistics_etag(version, sorted(serializer.validated_data.items()), request.accepted_media_type)
+            if get_conditional_response(request, etag=etag, last_modified=int(last_modified)):
+                # The client's copy is current: nothing is read or computed
+                STATISTICS_QUERIES.inc(query_type=query_type, source='not_modified')
+                return self._cacheable(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
 
-        listings_data = list(listings.values('condominium_expenses', 'surface', 'price'))
+        groups = None
+        if filters or group_by:
+            count, stats, groups = filtered_statistics(query_type, query_value, filters, group_by)
+            source = 'filtered'
+        elif backend:
+            # Explicit backend: computed live, used to cross-check the backends
+            count, stats = area_statistics(query_type, query_value, backend)
+            source = backend
+        else:
+            count, stats, source = self._get_statistics(query_type, query_value, area, snapshot)
+        STATISTICS_QUERIES.inc(query_type=query_type, source=source)
+        STATISTICS_ROWS.inc(count, query_type=query_type, source=source)
 
-        if not listings_data:
+        if not count:
             return Response(
                 {"error": f"No data found for {query_type}: {query_value}"},
                 status=status.HTTP_404_NOT_FOUND
             )
-        
-        df = pd.DataFrame(listings_data)
 
-        def calculate_fees_per_sqm(row):
-            try:
-                if pd.notna(row['condominium_expenses']) and pd.notna(row['surface']):
-                    # Get the first surface value from the list if it exists
-                    surface = row['surface'][0] if isinstance(row['surface'], list) and row['surface'] else None
-                    if surface and surface > 0:
-                        return row['condominium_expenses'] / surface
-                return None
-            except Exception as e:
-                logger.error(f"Error calculating fees per sqm: {str(e)}")
-                return None
-
-        df['fees_per_sqm'] = df.apply(calculate_fees_per_sqm, axis=1)
-
-        def safe_stat(series):
-            try:
-                if series.empty:
-                    return 0.0
-
-                clean_series = series.dropna()
-                if clean_series.empty:
-                    return 0.0
-                
-                value = clean_series.mean()
-                return 0.0 if pd.isna(value) else float(value)
-            except Exception as e:
-                logger.error(f"Error in safe_stat: {str(e)}")
-                return 0.0
-
-        def safe_quantile(series, q):
-            try:
-                if series.empty:
-                    return 0.0
-
-                clean_series = series.dropna()
-                if clean_series.empty:
-                    return 0.0
-                value = clean_series.quantile(q)
-                return 0.0 if pd.isna(value) else float(value)
-            except Exception as e:
-                logger.error(f"Error in safe_quantile: {str(e)}")
-                return 0.0
-
-        df['surface_float'] = df['surface'].apply(
-            lambda x: float(x[0]) if isinstance(x, list) and x and not pd.isna(x[0]) else None
-        )
+        logger.debug(f"Statistics of {query_type} {query_value} from {source}: {count} listings")
 
-        stats = {
-            'mean_price': safe_stat(df['price']),
-            'mean_surface': safe_stat(df['surface'].apply(lambda x: x[0] if isinstance(x, list) and x else None)),
-            'mean_fees': safe_stat(df['condominium_expenses']),
-            'mean_fees_per_sqm': safe_stat(df['fees_per_sqm']),
-            'quantile_10_price': safe_quantile(df['price'], 0.1),
-            'quantile_90_price': safe_quantile(df['price'], 0.9),
-            'quantile_10_surface': safe_quantile(df['surface'].apply(lambda x: x[0] if isinstance(x, list) and x else None), 0.1),
-            'quantile_90_surface': safe_quantile(df['surface'].apply(lambda x: x[0] if isinstance(x, list) and x else None), 0.9),
-            'quantile_10_fees': safe_quantile(df['condominium_expenses'], 0.1),
-            'quantile_90_fees': safe_quantile(df['condominium_expenses'], 0.9),
-            'quantile_10_fees_per_sqm': safe_quantile(df['fees_per_sqm'], 0.1),
-            'quantile_90_fees_per_sqm': safe_quantile(df['fees_per_sqm'], 0.9),
-        }
+        with span('serialize'):
+            # Statistics computed by the app are trusted floats: no validation round trip
+            compact = serializer.validated_data['layout'] == 'compact'
+            represent = StatisticsResponseSerializer.compact_data if compact else StatisticsResponseSerializer.lean_data
+            data = {
+                'query_type': query_type,
+                'query_value': query_value,
+                'count': count,
+                'statistics': represent(stats)
+            }
+            if compact:
+                data['fields'] = STATISTIC_FIELDS
+            if filters:
+                data['filters'] = filters
+            if group_by:
+                data['group_by'] = group_by
+                data['groups'] = [
+                    {'value': value, 'count': group_count, 'statistics': represent(group_stats)}
+                    for value, group_count, group_stats in groups
+                ]
+        return self._cacheable(Response(data), etag, last_modified)
 
-        stats = {k: float(v) if not pd.isna(v) else 0.0 for k, v in stats.items()}
-        logger.info(f"Calculated stats: {stats}")
+    def _get_area(self, query_type, query_value):
+        """AreaStatistics of the area, whose version validates every response about it, or None."""
+        normalized = normalize_area_value(query_type, query_value)
+        if normalized is None or query_type in SPATIAL_QUERY_TYPES:
+            return None
+        with span('precomputed'):
+            return AreaStatistics.objects.filter(query_type=query_type, query_value=normalized).first()
+
+    def _cacheable(self, response, etag, last_modified):
+        """Add the validators of the statistics, when versioned, and the Cache-Control of the statistics."""
+        if etag is not None:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, public=True, max_age=settings.STATISTICS_HTTP_MAX_AGE)
+        # JSON and the browsable API share the URL
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    def _get_statistics(self, query_type, query_value, area=None, snapshot=None):
+        """
+        Read the statistics of the area from ``snapshot``, the current snapshot
+        holding it, else from ``area``, its precomputed statistics. Areas not
+        precomputed are read from the cache, computed from the listings when
+        missing. Returns (count, statistics, source).
+        """
+        normalized = normalize_area_value(query_type, query_value)
+        if normalized is None:
+            return 0, None, 'invalid'
+        if query_type in SPATIAL_QUERY_TYPES:
+            # Unbounded set of areas served from the spatial index, neither cached nor precomputed
+            return *area_statistics(query_type, normalized), 'spatial'
+
+        if snapshot is not None:
+            return *snapshot.area_statistics(query_type, query_value), 'snapshot'
+
+        if area is None:
+            # The cache is bypassed for precomputed areas, whose row was read
+            # anyway: statistics then always match the version of their ETag
+            cached = get_cached_statistics(query_type, normalized)
+            if cached is not None:
+                return *cached, 'cache'
+
+        if area is not None:
+            return area.count, {field: getattr(area, field) for field in STATISTIC_FIELDS}, 'table'
+
+        count, stats = area_statistics(query_type, query_value)
+        if count:
+            cache_statistics(query_type, normalized, count, stats)
+        return count, stats, 'computed'
+
+class HistogramView(InstrumentedView):
+    """API view returning the distribution of a metric over the listings of an area."""
+    endpoint = 'histogram'
+
+    def get(self, request):
+        serializer = HistogramQuerySerializer(data=request.query_params)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        query_type = serializer.validated_data['query_type']
+        query_value = serializer.validated_data['query_value']
+        metric = serializer.validated_data['metric']
+        bins = serializer.validated_data['bins']
+
+        count, histogram = self._get_histogram(query_type, query_value, metric, bins)
+        if not count:
+            return Response(
+                {"error": f"No data found for {query_type}: {query_value}"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response({
+            'query_type': query_type,
+            'query_value': query_value,
+            'metric': metric,
+            'count': count,
+            **histogram,
+        })
+
+    def _get_histogram(self, query_type, query_value, metric, bins):
+        """Read the histogram from the cache, computing it from the snapshot or listings when missing."""
+        normalized = normalize_area_value(query_type, query_value)
+        if normalized is None:
+            return 0, None
+        if query_type in SPATIAL_QUERY_TYPES:
+            return area_histogram(query_type, normalized, metric, bins)
+
+        params = (metric, bins)
+        cached = get_cached_histogram(query_type, normalized, params)
+        if cached is not None:
+            return cached
+
+        count, histogram = area_histogram(query_type, normalized, metric, bins)
+        if count:
+            cache_histogram(query_type, normalized, params, count, histogram)
+        return count, histogram
+
+class TimeseriesView(InstrumentedView):
+    """API view returning the monthly statistics of a metric for an area, read from MonthlyStatistics."""
+    endpoint = 'timeseries'
+
+    def get(self, request):
+        serializer = TimeseriesQuerySerializer(data=request.query_params)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        query_type = serializer.validated_data['query_type']
+        query_value = serializer.validated_data['query_value']
+        metric = serializer.validated_data['metric']
+
+        normalized = normalize_area_value(query_type, query_value)
+        months = area_timeseries(
+            query_type, normalized, serializer.validated_data.get('start'), serializer.validated_data.get('end')
+        ) if normalized is not None else []
+        if not months:
+            return Response(
+                {"error": f"No dated listing found for {query_type}: {query_value}"},
+                status=status.HTTP_404_NOT_FOUND
+            )
 
-        response_serializer = StatisticsResponseSerializer(data=stats)
-        if not response_serializer.is_valid():
-            logger.error(f"Serializer validation errors: {response_serializer.errors}")
-            return Response(response_serializer.errors, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        print(f"Response data: {response_serializer.data}")
         return Response({
             'query_type': query_type,
             'query_value': query_value,
-            'count': len(listings_data),
-            'statistics': response_serializer.data
+            'metric': metric,
+            'months': [row.month.strftime('%Y-%m') for row in months],
+            'counts': [row.count for row in months],
+            'mean': [getattr(row, f'mean_{metric}') for row in months],
+            'quantile_10': [getattr(row, f'quantile_10_{metric}') for row in months],
+            'quantile_90': [getattr(row, f'quantile_90_{metric}') for row in months],
+        })
+
+class StatisticsBatchView(InstrumentedView):
+    """API view returning the statistics of many areas in one request."""
+    endpoint = 'batch'
+
+    def post(self, request):
+        serializer = StatisticsBatchSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        page = {}
+        if 'all' in serializer.validated_data:
+            requested, page['next'] = self._all_areas(
+                serializer.validated_data['all'], serializer.validated_data.get('after'), serializer.validated_data['limit']
+            )
+        else:
+            requested = [(area['query_type'], area['query_value']) for area in serializer.validated_data['areas']]
+
+        normalized = {
+            (query_type, query_value): normalize_area_value(query_type, query_value)
+            for query_type, query_value in requested
+        }
+        statistics = self._get_statistics({
+            (query_type, value) for (query_type, _), value in normalized.items() if value is not None
         })
+
+        compact = serializer.validated_data['layout'] == 'compact'
+        results, not_found = [], []
+        with span('serialize'):
+            for query_type, query_value in requested:
+                count, stats = statistics.get((query_type, normalized[(query_type, query_value)]), (0, None))
+                if not count:
+                    not_found.append({'query_type': query_type, 'query_value': query_value})
+                elif compact:
+                    results.append([query_type, query_value, count, *StatisticsResponseSerializer.compact_data(stats)])
+                else:
+                    results.append({
+                        'query_type': query_type,
+                        'query_value': query_value,
+                        'count': count,
+                        'statistics': StatisticsResponseSerializer.lean_data(stats)
+                    })
+
+        logger.info(f"Calculated stats of {len(results)} areas, {len(not_found)} not found")
+        if compact:
+            return Response({'fields': BATCH_COMPACT_FIELDS, 'results': results, 'not_found': not_found, **page})
+        return Response({'results': results, 'not_found': not_found, **page})
+
+    def _all_areas(self, query_type, after, limit):
+        """
+        Page of the normalized values of the areas of the given type having
+        listings, in order: (at most ``limit`` areas after the ``after`` value,
+        the value to start the next page after, None on the last page).
+        """
+        values = RealEstateListing.objects.values_list(AREA_COLUMNS[query_type], flat=True).distinct()
+        normalized = sorted({normalize_area_value(query_type, value) for value in values} - {None})
+        start = bisect.bisect_right(normalized, after) if after is not None else 0
+        page = normalized[start:start + limit]
+        next_value = page[-1] if start + limit < len(normalized) else None
+        return [(query_type, value) for value in page], next_value
+
+    def _get_statistics(self, areas):
+        """
+        Read the statistics of the normalized areas from the cache, then from
+        the precomputed table, computing the missing ones with a single
+        grouped scan of their listings.
+        """
+        statistics = get_many_cached_statistics(areas)
+
+        missing = areas - statistics.keys()
+        found = {}
+        if missing:
+            condition = Q(pk__in=[])
+            for query_type in {query_type for query_type, _ in missing}:
+                condition |= Q(
+                    query_type=query_type,
+                    query_value__in=[value for area_type, value in missing if area_type == query_type]
+                )
+            for area in AreaStatistics.objects.filter(condition):
+                found[(area.query_type, area.query_value)] = (
+                    area.count, {field: getattr(area, field) for field in STATISTIC_FIELDS}
+                )
+
+        missing -= found.keys()
+        if missing:
+            computed = batch_area_statistics(missing)
+            # Precomputed areas are one indexed query away, only computed ones are worth caching
+            cache_many_statistics(computed)
+            found.update(computed)
+
+        statistics.update(found)
+        return statistics
     
+def _listing_queryset(data):
+    """Listings matching the validated area and attribute filters of a listing query."""
+    queryset = RealEstateListing.objects.all()
+    if 'query_type' in data:
+        queryset = filter_listings(data['query_type'], data['query_value'], queryset)
+    return filter_attributes(queryset, ListingFilterSerializer.filters(data))
+
+class ListingCursorPagination(CursorPagination):
+    """Keyset pagination on the primary key: any page is one indexed range query, however deep."""
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'limit'
+    max_page_size = ListingQuerySerializer.MAX_LIMIT
+
+class ListingsView(APIView):
+    """API view returning the listings of an area page by page, with only the requested fields."""
+
+    def get(self, request):
+        serializer = ListingQuerySerializer(data=request.query_params)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        fields = serializer.validated_data['fields']
+        paginator = ListingCursorPagination()
+        page = paginator.paginate_queryset(
+            _listing_queryset(serializer.validated_data).only(*fields), request, view=self
+        )
+        return paginator.get_paginated_response(RealEstateListingSerializer(page, many=True, fields=fields).data)
+
+def export_listings_view(request):
+    """Stream the listings of an area as NDJSON or CSV, whatever their number."""
+    serializer = ListingExportQuerySerializer(data=request.GET)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    data = serializer.validated_data
+    export_format = data['format']
+    response = StreamingHttpResponse(
+        export_listings(_listing_queryset(data), data['fields'], export_format),
+        content_type=EXPORT_FORMATS[export_format],
+    )
+    response['Content-Disposition'] = f'attachment; filename="listings.{export_format}"'
+    return response
+
+def _job_response(job):
+    return {
+        'job': ImportJobSerializer(job).data,
+        'status_url': reverse('api:api_import_job', args=[job.id]),
+    }
+
+
 class AddBienIciListingView(APIView):
     """API view for adding a new listing from BienIci."""
     renderer_classes = [JSONRenderer, TemplateHTMLRenderer]
@@ -146,101 +459,66 @@ class AddBienIciListingView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         url = serializer.validated_data['url']
-        
-        try:
-            listing_id = url.split('/')[-1]
-            
-            api_url = f"https://www.bienici.com/realEstateAd.json?id={listing_id}"
-            response = requests.get(api_url)
-            response.raise_for_status()
-            
-            listing_data = response.json()
-            
-            listing = self._process_bienici_data(listing_data, url)
-            
-            if request.accepted_renderer.format == 'html':
-                messages.success(request, f"Successfully added listing: {listing.reference_id}")
-                return redirect(reverse('api:stats_form'))
-            
-            return Response({
-                'message': 'Listing added successfully',
-                'listing': RealEstateListingSerializer(listing).data
-            }, status=status.HTTP_201_CREATED)
-            
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Error fetching data from BienIci: {str(e)}"
-            if request.accepted_renderer.format == 'html':
-                messages.error(request, error_msg)
-                return redirect(reverse('api:stats_form'))
-            return Response({'error': error_msg}, status=status.HTTP_400_BAD_REQUEST)
-        
-        except Exception as e:
-            error_msg = f"Error processing listing: {str(e)}"
-            if request.accepted_renderer.format == 'html':
-                messages.error(request, error_msg)
-                return redirect(reverse('api:stats_form'))
-            return Response({'error': error_msg}, status=status.HTTP_400_BAD_REQUEST)
-    
-    def _process_bienici_data(self, data, url):
-        """Process the data from BienIci API and save it to the database."""
-        postal_code = data.get('postalCode', '')
-        dept_code = None
-        
-        try:
-            postal_code = int(postal_code)
-            dept_code = postal_code // 1000
-        except (ValueError, TypeError):
-            postal_code = None
-        
-        print(data.get('reference'))
-        existing = RealEstateListing.objects.filter(reference_id=data.get('reference', '')).first()
-        if existing:
-            existing.ad_url = url
-            existing.postal_code = postal_code
-            existing.DEPT_CODE = dept_code
-            existing.city = data.get('city', '')
-            existing.price = data.get('price', 0)
-            existing.surface = data.get('surfaceArea', 0)
-            existing.condominium_expenses = data.get('fees', {}).get('yearly', 0)
-            existing.description = data.get('description', '')
-            
-            existing.floor = data.get('floor', None)
-            existing.construction_year = data.get('constructionYear', None)
-            existing.property_type = self._map_property_type(data.get('propertyType', ''))
-            
-            if 'coordinates' in data:
-                existing.latitude = data['coordinates'].get('lat', None)
-                existing.longitude = data['coordinates'].get('lng', None)
-            
-            existing.save()
-            return existing
-        
-        listing = RealEstateListing(
-            reference_id=data.get('reference', ''),
-            ad_url=url,
-            postal_code=postal_code,
-            dept_code=dept_code,
-            city=data.get('city', ''),
-            price=data.get('price', 0),
-            surface=data.get('surfaceArea', 0),
-            condominium_expenses=data.get('fees', {}).get('yearly', 0),
-            description=data.get('description', ''),
-            floor=data.get('floor', None),
-            construction_year=data.get('constructionYear', None),
-            property_type=self._map_property_type(data.get('propertyType', '')),
+        job = enqueue_job(ImportJobKinds.BIENICI, {'urls': [url]}, rows_total=1)
+
+        if request.accepted_renderer.format == 'html':
+            messages.success(request, f"Import of the listing queued (job {job.id})")
+            return redirect(reverse('api:stats_form'))
+
+        return Response(
+            {'message': 'Listing import queued', **_job_response(job)}, status=status.HTTP_202_ACCEPTED
         )
-        
-        if 'coordinates' in data:
-            listing.latitude = data['coordinates'].get('lat', None)
-            listing.longitude = data['coordinates'].get('lng', None)
-            
-        listing.save()
-        return listing
-    
-    def _map_property_type(self, bienici_type):
-        """Map BienIci property type to our model choices."""
-        # This is a simplified mapping
-        mapping = {
-            'APARTMENT': 'APARTMENT',
-        }
-        return mapping.get(bienici_type, 'OTHER')
\ No newline at end of file
+
+
+class AddBienIciListingsView(APIView):
+    """API view importing many BienIci listings at once."""
+
+    def post(self, request):
+        serializer = BienIciBulkImportSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        urls = serializer.validated_data['urls']
+        job = enqueue_job(ImportJobKinds.BIENICI, {'urls': urls}, rows_total=len(urls))
+        return Response(_job_response(job), status=status.HTTP_202_ACCEPTED)
+
+
+class ImportJobsView(APIView):
+    """API view starting a background import of BienIci URLs or of a CSV dataset, for staff users."""
+    # CSV imports rewrite the live database (sqlite-fast drops its indexes)
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        jobs = ImportJob.objects.order_by('-id')[:RECENT_IMPORT_JOBS]
+        return Response(ImportJobSerializer(jobs, many=True).data)
+
+    def post(self, request):
+        serializer = ImportJobRequestSerializer(data=request.data)
+
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        if data['kind'] == ImportJobKinds.BIENICI.value:
+            job = enqueue_job(ImportJobKinds.BIENICI, {'urls': data['urls']}, rows_total=len(data['urls']))
+        else:
+            try:
+                file_path = resolve_import_file(data['file'])
+            except ValueError as e:
+                return Response({'file': [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+            job = enqueue_job(
+                ImportJobKinds.CSV, {'file': file_path, 'engine': data['engine'], 'restart': data['restart']}
+            )
+        return Response(_job_response(job), status=status.HTTP_202_ACCEPTED)
+
+
+class ImportJobView(APIView):
+    """API view reporting the status, progress and errors of an import job, for staff users."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, job_id):
+        job = ImportJob.objects.filter(id=job_id).first()
+        if job is None:
+            return Response({"error": f"No import job {job_id}"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ImportJobSerializer(job).data)
\ No newline at end of file
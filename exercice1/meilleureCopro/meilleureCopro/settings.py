@@ -83,6 +83,86 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The statistics cache is shared by every process (web workers,
+# import_listings, import jobs), so that the areas a write evicts are evicted
+# everywhere: Redis when STATISTICS_CACHE_REDIS_URL is set (needs the redis
+# package), files in STATISTICS_CACHE_DIR otherwise.
+# The file cache is bounded by MAX_ENTRIES but is not an LRU: once full, each
+# set deletes a random third of the entries, and every set lists the cache
+# directory to count them. Use Redis in production, with maxmemory and
+# maxmemory-policy allkeys-lru, for a size-bounded LRU.
+
+STATISTICS_CACHE_TIMEOUT = 300
+STATISTICS_CACHE_REDIS_URL = os.environ.get('STATISTICS_CACHE_REDIS_URL')
+STATISTICS_CACHE_DIR = BASE_DIR / 'cache' / 'statistics'
+
+# max-age (seconds) of the Cache-Control of /api/stats/ responses: shared
+# caches (nginx, Varnish) and clients reuse them for this long, then
+# revalidate them with their ETag, answered by a 304 until the area changes.
+STATISTICS_HTTP_MAX_AGE = 60
+
+# Backend computing the statistics of areas missing from AreaStatistics:
+# 'numpy' (listings loaded and aggregated in Python), 'sql' (aggregated by the
+# database), 'sketch' (merged per-area quantile sketches, approximate quantiles)
+# or 'snapshot' (memory-mapped columnar snapshot, see STATISTICS_SNAPSHOT_DIR)
+STATISTICS_BACKEND = 'numpy'
+
+# Relative error bound of the quantiles of the 'sketch' statistics backend.
+# Changing it requires rebuilding the stored sketches (api.sketches.rebuild_area_sketches).
+STATISTICS_SKETCH_RELATIVE_ACCURACY = 0.01
+
+# Directory of the columnar snapshot written by export_snapshot. When set,
+# /api/stats/ serves departments and postal codes from the memory-mapped
+# snapshot, which only reflects the listings as of its last export.
+STATISTICS_SNAPSHOT_DIR = None
+
+# BienIci ingestion: endpoint of the listing data, concurrent requests,
+# timeout of a request (seconds), retries and first retry delay (seconds,
+# doubled at each retry)
+BIENICI_API_URL = 'https://www.bienici.com/realEstateAd.json'
+BIENICI_CONCURRENCY = 8
+BIENICI_TIMEOUT = 10
+BIENICI_RETRIES = 3
+BIENICI_BACKOFF = 0.5
+
+# Requests of the statistics endpoints with ?profile=1 run under cProfile and
+# return its summary. Profiling exposes code paths and slows the request down.
+PROFILE_REQUESTS = DEBUG
+
+# Background imports (api.jobs): threads running import jobs in each process,
+# and the only directory CSV import jobs may read datasets from
+IMPORT_JOB_WORKERS = 2
+# Processes converting the CSV chunks of each CSV import job, taken from the
+# web process: 0 converts them in the job thread
+IMPORT_JOB_CSV_WORKERS = 0
+# Running jobs without progress for this many seconds are considered
+# interrupted, and marked failed when the next worker pool starts
+IMPORT_JOB_STALE_AFTER = 1800
+IMPORT_DATA_DIR = BASE_DIR.parent / 'data'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'statistics': {
+        'BACKEND': (
+            'django.core.cache.backends.redis.RedisCache' if STATISTICS_CACHE_REDIS_URL
+            else 'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': STATISTICS_CACHE_REDIS_URL or STATISTICS_CACHE_DIR,
+        'TIMEOUT': STATISTICS_CACHE_TIMEOUT,
+        'OPTIONS': {} if STATISTICS_CACHE_REDIS_URL else {
+            'MAX_ENTRIES': 2000,
+        },
+    },
+}
+
+# Runs the tests with a statistics cache of their own
+TEST_RUNNER = 'meilleureCopro.test_runner.TestRunner'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
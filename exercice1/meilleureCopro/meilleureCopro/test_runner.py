@@ -0,0 +1,32 @@
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test runner pointing the shared statistics cache to a temporary
+    directory, so that tests neither read nor evict the entries of the
+    development server.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_directory = tempfile.TemporaryDirectory()
+        self._cache_settings = override_settings(CACHES={
+            **settings.CACHES,
+            'statistics': {
+                **settings.CACHES['statistics'],
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': self._cache_directory.name,
+                'OPTIONS': {'MAX_ENTRIES': 2000},
+            },
+        })
+        self._cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_settings.disable()
+        self._cache_directory.cleanup()
+        super().teardown_test_environment(**kwargs)